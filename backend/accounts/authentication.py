@@ -0,0 +1,114 @@
+"""JWT authentication from signed claims, without reading ``accounts_user``.
+
+``CustomTokenObtainPairSerializer`` signs the user's id, email, role, staff
+flag and ``token_version`` into every token, and ``ClaimsJWTAuthentication``
+builds the request user from those claims. The user is a ``User`` instance
+whose other fields are deferred, so it can still be assigned to foreign keys
+and loads anything else on first access.
+
+Revocation works by bumping ``token_version``: logout does it, and so does
+any save that changes a signed field, the password or the active flag.
+Tokens carrying an older version are rejected. Versions are checked against
+the ``ACCOUNTS_TOKEN_CACHE`` cache, falling back to one query of the primary
+on a miss. ``revoke_tokens`` writes the new version to the cache when it
+commits. With a shared cache backend that reaches every worker at once; with
+the per-process default, and for changes written around ``revoke_tokens``
+(``QuerySet.update``, the admin shell), it takes up to
+``ACCOUNTS_TOKEN_VERSION_TIMEOUT`` seconds.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import F
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from backend import replicas
+from .models import User
+
+# Signed user fields (claim name = field name) besides the id
+CLAIM_FIELDS = ('email', 'role', 'is_staff')
+VERSION_CLAIM = 'ver'
+
+
+def get_cache():
+    return caches[getattr(settings, 'ACCOUNTS_TOKEN_CACHE', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'ACCOUNTS_TOKEN_VERSION_TIMEOUT', 30)
+
+
+def _version_key(user_id):
+    return f'token-version:{user_id}'
+
+
+def user_claims(user):
+    """The claims ``ClaimsJWTAuthentication`` needs, for embedding in a token"""
+    claims = {field: getattr(user, field) for field in CLAIM_FIELDS}
+    claims[VERSION_CLAIM] = user.token_version
+    return claims
+
+
+def token_version(user_id):
+    """Current token version of ``user_id``; None for deleted or inactive users"""
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # The primary: a replica may not have the latest revocation yet
+        row = (
+            User.objects.using(DEFAULT_DB_ALIAS).filter(pk=user_id)
+            .values_list('token_version', 'is_active').first()
+        )
+        # -1: cacheable "no valid version" for missing and inactive users
+        version = row[0] if row and row[1] else -1
+        if not cache.add(key, version, get_timeout()):
+            version = cache.get(key, version)
+    return None if version < 0 else version
+
+
+def publish_version(user_id, version):
+    """Share ``user_id``'s new version once the current transaction commits"""
+    transaction.on_commit(lambda: get_cache().set(_version_key(user_id), version, get_timeout()))
+
+
+def revoke_tokens(user):
+    """Invalidate every token issued to ``user`` so far"""
+    User.objects.filter(pk=user.pk).update(token_version=F('token_version') + 1)
+    version = User.objects.filter(pk=user.pk).values_list('token_version', flat=True).get()
+    user.token_version = version
+    publish_version(user.pk, version)
+
+
+def token_user(user_id, claims):
+    """A ``User`` with the signed fields set and every other field deferred"""
+    values = {'id': user_id, 'is_active': True, **{field: claims[field] for field in CLAIM_FIELDS}}
+    values['token_version'] = claims[VERSION_CLAIM]
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(router.db_for_read(User), fields, [values[field] for field in fields])
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that trusts the token's signed claims instead of loading the user"""
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            # Replica routing pins this user's reads after a write
+            replicas.authenticated(result[0].pk)
+        return result
+
+    def get_user(self, validated_token):
+        if VERSION_CLAIM not in validated_token or any(field not in validated_token for field in CLAIM_FIELDS):
+            # Issued before claims were embedded: load the user as simplejwt does
+            return super().get_user(validated_token)
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken('Token contained no recognizable user identification')
+        if token_version(user_id) != validated_token[VERSION_CLAIM]:
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        return token_user(user_id, validated_token)
@@ -13,6 +13,8 @@ class User(AbstractUser):
     company = models.CharField(max_length=255, blank=True)
     address = models.TextField(blank=True)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='client')
+    # Signed into JWTs; bumping it revokes every token issued before (see accounts.authentication)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']  # username is still required by AbstractUser
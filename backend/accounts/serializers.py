@@ -2,6 +2,7 @@ from rest_framework import serializers
 from .models import User
 from django.contrib.auth import authenticate
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .authentication import user_claims
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -38,6 +39,14 @@ class LoginSerializer(serializers.Serializer):
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     username_field = 'email'
+
+    @classmethod
+    def get_token(cls, user):
+        # Signed claims let ClaimsJWTAuthentication skip loading the user
+        token = super().get_token(user)
+        for claim, value in user_claims(user).items():
+            token[claim] = value
+        return token
     
     def validate(self, attrs):
         # Use email instead of username for authentication
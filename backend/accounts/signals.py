@@ -0,0 +1,25 @@
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+from .authentication import CLAIM_FIELDS, revoke_tokens
+from .models import User
+
+# Changing any of these invalidates the user's tokens
+TOKEN_FIELDS = CLAIM_FIELDS + ('password', 'is_active')
+
+
+def _token_fields(instance):
+    # Loaded values only, so deferred fields stay unloaded
+    return {field: instance.__dict__[field] for field in TOKEN_FIELDS if field in instance.__dict__}
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    instance._token_fields = _token_fields(instance) if instance.pk else {}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    before, after = instance._token_fields, _token_fields(instance)
+    if not created and any(before.get(field, value) != value for field, value in after.items()):
+        revoke_tokens(instance)
+    instance._token_fields = after
@@ -1,3 +1,50 @@
+from django.core.cache import caches
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .authentication import token_version
+from .models import User
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = User.objects.create_user(
+            username='client', email='client@example.com', password='pass', role='client')
+        self.api = APIClient()
+
+    def bearer(self, access):
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def login(self):
+        response = self.api.post('/api/auth/jwt/create/', {'email': 'client@example.com', 'password': 'pass'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_logout_revokes_issued_tokens(self):
+        tokens = self.login()
+        self.bearer(tokens['access'])
+        self.assertEqual(self.api.get('/api/auth/me/').status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.api.post('/api/auth/logout/').status_code, 200)
+        self.assertEqual(self.api.get('/api/auth/me/').status_code, 401)
+        # Without the cached version the primary still has the revocation
+        caches['default'].clear()
+        self.assertEqual(self.api.get('/api/auth/me/').status_code, 401)
+        # A refresh token carries the revoked version into the access tokens it issues
+        self.api.credentials()
+        refreshed = self.api.post('/api/auth/jwt/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.bearer(refreshed.data['access'])
+        self.assertEqual(self.api.get('/api/auth/me/').status_code, 401)
+
+        self.bearer(self.login()['access'])
+        self.assertEqual(self.api.get('/api/auth/me/').status_code, 200)
+
+    def test_inactive_users_have_no_valid_version(self):
+        self.assertEqual(token_version(self.user.pk), 0)
+        caches['default'].clear()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(token_version(self.user.pk))
+        self.assertIsNone(token_version(self.user.pk + 1000))
@@ -6,6 +6,7 @@ from django.contrib.auth import login, logout
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .models import User
 from .serializers import RegisterSerializer, LoginSerializer, UserSerializer, CustomTokenObtainPairSerializer
+from .authentication import revoke_tokens
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 
@@ -28,6 +29,8 @@ class LoginView(APIView):
 class LogoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def post(self, request):
+        # Also invalidates the user's JWTs (on every device)
+        revoke_tokens(request.user)
         logout(request)
         return Response({'detail': 'Logged out successfully.'})
 
@@ -35,7 +38,8 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
     def get_object(self):
-        return self.request.user
+        # request.user only carries the token's claims
+        return User.objects.get(pk=self.request.user.pk)
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
@@ -0,0 +1,230 @@
+"""Opt-in request profiling.
+
+For a sampled fraction of requests ``RequestProfilingMiddleware`` records the
+resolved view/action, DB query count and time, DRF authentication time,
+serializer time and response size. The breakdown is returned in a
+``Server-Timing`` header and folded into in-process histograms that
+``metrics_view`` exposes in Prometheus text format.
+
+Enable with ``REQUEST_PROFILING['ENABLED']``; when disabled the middleware
+removes itself at startup and nothing is patched. The middleware serves both
+WSGI and ASGI: the profile travels in a context variable, which
+``sync_to_async`` copies into the threads running the ORM.
+"""
+import contextvars
+import random
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from rest_framework import permissions, serializers, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+BYTES_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+class Profile:
+    def __init__(self):
+        self.view = 'unresolved'
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.auth_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self._depth = 0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+
+def _timed(attribute, func):
+    """Add the call's duration to the current profile's ``attribute``; nested calls count once."""
+    @wraps(func)
+    def inner(*args, **kwargs):
+        profile = _current.get()
+        if profile is None or profile._depth:
+            return func(*args, **kwargs)
+        profile._depth += 1
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile._depth -= 1
+            setattr(profile, attribute, getattr(profile, attribute) + time.perf_counter() - started)
+    inner._profiled = True
+    return inner
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.db_wrapper(execute, sql, params, many, context)
+
+
+def _add_db_wrapper(connection, **kwargs):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+def _install_hooks():
+    if getattr(APIView.perform_authentication, '_profiled', False):
+        return
+    # Connections are per thread, so count queries on every connection of every thread
+    for connection in connections.all(initialized_only=True):
+        _add_db_wrapper(connection)
+    connection_created.connect(_add_db_wrapper, dispatch_uid='request_profiling')
+    APIView.perform_authentication = _timed('auth_seconds', APIView.perform_authentication)
+    # Serializer.data and ListSerializer.data both end up in BaseSerializer.data
+    serializers.BaseSerializer.data = property(_timed('serializer_seconds', serializers.BaseSerializer.data.fget))
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        bucket_counts, total, count = self.series.get(labels, ([0] * len(self.buckets), 0.0, 0))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                bucket_counts[index] += 1
+        self.series[labels] = (bucket_counts, total + value, count + 1)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (bucket_counts, total, count) in sorted(self.series.items()):
+            base = ','.join(f'{key}="{value}"' for key, value in labels)
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{base}}} {total}')
+            lines.append(f'{self.name}_count{{{base}}} {count}')
+        return lines
+
+
+class Metrics:
+    """Per-view histograms since process start; Prometheus derives rolling windows with rate()."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = Histogram('emesa_request_duration_seconds', 'Sampled request time by component.', DURATION_BUCKETS)
+        self.queries = Histogram('emesa_request_db_queries', 'DB queries per sampled request.', QUERY_BUCKETS)
+        self.response_bytes = Histogram('emesa_response_bytes', 'Response body size of sampled requests.', BYTES_BUCKETS)
+
+    def record(self, profile, total_seconds, response_bytes):
+        view = (('view', profile.view),)
+        with self.lock:
+            for component, seconds in (
+                ('total', total_seconds),
+                ('db', profile.db_seconds),
+                ('auth', profile.auth_seconds),
+                ('serializer', profile.serializer_seconds),
+            ):
+                self.durations.observe(view + (('component', component),), seconds)
+            self.queries.observe(view, profile.db_queries)
+            if response_bytes is not None:
+                self.response_bytes.observe(view, response_bytes)
+
+    def render(self):
+        with self.lock:
+            lines = self.durations.render() + self.queries.render() + self.response_bytes.render()
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def _view_name(view_func, method):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', 'unknown')
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = getattr(settings, 'REQUEST_PROFILING', {})
+        if not config.get('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = float(config.get('SAMPLE_RATE', 0.1))
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        _install_hooks()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile, time.perf_counter() - started)
+
+    def finish(self, request, response, profile, total):
+        """Add the ``Server-Timing`` header and record the request"""
+        if request.resolver_match is not None:
+            profile.view = _view_name(request.resolver_match.func, request.method)
+        response_bytes = None if response.streaming else len(response.content)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db_seconds * 1000:.1f};desc="{profile.db_queries} queries"',
+            f'auth;dur={profile.auth_seconds * 1000:.1f}',
+            f'ser;dur={profile.serializer_seconds * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        metrics.record(profile, total, response_bytes)
+        return response
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def metrics_view(request):
+    """Prometheus text exposition of the sampled request histograms (admins only)"""
+    user = request.user
+    if not (user.is_staff or getattr(user, 'role', None) == 'admin'):
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,203 @@
+"""Read replicas.
+
+``ReplicaRouter`` sends the reads of safe (GET/HEAD/OPTIONS) requests to one
+of ``DATABASE_REPLICAS``, picked once per request, and everything else to the
+primary (``default``):
+
+- writes, and every read of a request once it has written;
+- reads of unsafe requests and reads inside ``transaction.atomic`` blocks;
+- reads outside a request (management commands, the geometry worker);
+- reads of a user who wrote within ``DATABASE_REPLICA_PIN_SECONDS``, so the
+  negotiation actions read their own writes. The user is the one DRF
+  authenticated (``ClaimsJWTAuthentication`` reports it through
+  ``authenticated``). Pins live in the ``DATABASE_REPLICA_CACHE`` cache and
+  need a shared backend to reach every worker;
+- reads while no replica is within ``DATABASE_REPLICA_MAX_LAG`` seconds.
+
+Lag is measured with a heartbeat: each check stamps the primary's
+``ReplicationHeartbeat`` row (at most once per
+``DATABASE_REPLICA_CHECK_INTERVAL``). A replica holding the primary's latest
+stamp is caught up; otherwise it trails by the age of its copy of the stamp,
+less the interval the stamp may have waited for its refresh. Each process
+measures at most once per interval, and a replica that cannot be read counts
+as lagging. A copy of the SQLite database file therefore works as a local
+replica that falls further behind with every check.
+
+Without replicas configured the middleware removes itself and the router
+leaves every query on ``default``.
+"""
+import contextvars
+import random
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+from rest_framework.permissions import SAFE_METHODS
+
+_current = contextvars.ContextVar('database_routing', default=None)
+_lag = {}  # alias -> (lag in seconds or None when unreadable, monotonic time it was measured)
+_lag_lock = threading.Lock()
+
+
+class Routing:
+    def __init__(self, primary):
+        self.primary = primary
+        self.replica = None
+        self.wrote = False
+        self.user_id = None
+
+
+def get_cache():
+    return caches[getattr(settings, 'DATABASE_REPLICA_CACHE', 'default')]
+
+
+def _pin_key(user_id):
+    return f'database-pin:{user_id}'
+
+
+def pin(user_id):
+    """Read ``user_id``'s requests from the primary for the next ``DATABASE_REPLICA_PIN_SECONDS``"""
+    get_cache().set(_pin_key(user_id), True, getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 15))
+
+
+async def apin(user_id):
+    await get_cache().aset(_pin_key(user_id), True, getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 15))
+
+
+def is_pinned(user_id):
+    return get_cache().get(_pin_key(user_id)) is not None
+
+
+def authenticated(user_id):
+    """Record the request's authenticated user; a pinned user's reads go to the primary from now on"""
+    routing = _current.get()
+    if routing is not None:
+        routing.user_id = user_id
+        if not routing.primary and is_pinned(user_id):
+            routing.primary = True
+
+
+def _stamp(alias):
+    from orders.models import ReplicationHeartbeat
+    return ReplicationHeartbeat.objects.using(alias).filter(pk=1).values_list('timestamp', flat=True).first()
+
+
+def heartbeat(stamped):
+    """Stamp the primary's heartbeat anew when ``stamped``, its current stamp, is older than the check interval"""
+    from orders.models import ReplicationHeartbeat
+    now = timezone.now()
+    if stamped is not None and now - stamped < timedelta(seconds=getattr(settings, 'DATABASE_REPLICA_CHECK_INTERVAL', 5)):
+        return
+    beats = ReplicationHeartbeat.objects.using(DEFAULT_DB_ALIAS)
+    if not beats.filter(pk=1).update(timestamp=now):
+        beats.bulk_create([ReplicationHeartbeat(pk=1, timestamp=now)], ignore_conflicts=True)
+
+
+def replica_lag(alias):
+    """Seconds ``alias`` trails the primary, to within one check interval; None if it cannot be read
+
+    A replica that has the primary's current stamp is caught up. One that
+    lacks it trails by at least the stamp's age, and by at most the age of
+    the older stamp it holds, which may have waited a whole interval before
+    it was replaced. Reading the primary first means a stamp written by
+    another process in between makes a replica look caught up rather than
+    stale.
+    """
+    try:
+        stamped = _stamp(DEFAULT_DB_ALIAS)
+        applied = _stamp(alias)
+        heartbeat(stamped)
+    except DatabaseError:
+        return None
+    if applied is None:
+        return None
+    if stamped is not None and applied >= stamped:
+        return 0.0
+    interval = getattr(settings, 'DATABASE_REPLICA_CHECK_INTERVAL', 5)
+    return max(0.0, (timezone.now() - applied).total_seconds() - interval)
+
+
+def usable_replicas():
+    """Replicas within ``DATABASE_REPLICA_MAX_LAG``, re-measuring any not checked for a while"""
+    interval = getattr(settings, 'DATABASE_REPLICA_CHECK_INTERVAL', 5)
+    max_lag = getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 5)
+    usable = []
+    for alias in getattr(settings, 'DATABASE_REPLICAS', []):
+        now = time.monotonic()
+        measured = _lag.get(alias)
+        if measured is None or now - measured[1] >= interval:
+            measured = (replica_lag(alias), now)
+            with _lag_lock:
+                _lag[alias] = measured
+        if measured[0] is not None and measured[0] <= max_lag:
+            usable.append(alias)
+    return usable
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _current.get()
+        if routing is None or routing.primary or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        if routing.replica is None:
+            # One replica per request, so its reads see one consistent point in time
+            replicas = usable_replicas()
+            routing.replica = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _current.get()
+        if routing is not None:
+            routing.wrote = routing.primary = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's data, so objects from any of them may be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'DATABASE_REPLICAS', None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        routing = Routing(primary=request.method not in SAFE_METHODS)
+        token = _current.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        if routing.wrote and routing.user_id is not None:
+            pin(routing.user_id)
+        return response
+
+    async def __acall__(self, request):
+        # Views and sync_to_async threads run in copies of this context and share the Routing
+        routing = Routing(primary=request.method not in SAFE_METHODS)
+        token = _current.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        if routing.wrote and routing.user_id is not None:
+            await apin(routing.user_id)
+        return response
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -50,6 +52,8 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'backend.profiling.RequestProfilingMiddleware',
+    'backend.replicas.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -81,17 +85,100 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connection details come from the same MYSQL_* variables as the db service in
+# docker-compose.yml. Persistent connections save a MySQL handshake per request:
+# each worker keeps its connection for DB_CONN_MAX_AGE seconds, and health checks
+# replace one the server has dropped before it is reused. Connections are per
+# thread and ASGI requests do not keep to one thread, so Django advises against
+# persistent connections there and the default under SERVER_MODE=asgi is 0;
+# DB_POOL=true shares a pool per process instead (poetry extra "pool").
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+DB_POOL = os.environ.get('DB_POOL', '').lower() in ('1', 'true', 'yes')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'emesa_db',
-        'USER': 'emesa_user',
-        'PASSWORD': 'Emesa@123',
-        'HOST': 'db',
+        'ENGINE': 'dj_db_conn_pool.backends.mysql' if DB_POOL else 'django.db.backends.mysql',
+        'NAME': os.environ.get('MYSQL_DATABASE', 'emesa_db'),
+        'USER': os.environ.get('MYSQL_USER', 'emesa_user'),
+        'PASSWORD': os.environ.get('MYSQL_PASSWORD', 'Emesa@123'),
+        'HOST': os.environ.get('MYSQL_HOST', 'db'),
         #'HOST': '127.0.0.1',  # Use 'localhost' for local development
-        'PORT': '3306',
+        'PORT': os.environ.get('MYSQL_PORT', '3306'),
+        # With the pool Django returns its connection after every request and the pool keeps it
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', '0' if SERVER_MODE == 'asgi' else '60')),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'true').lower() in ('1', 'true', 'yes'),
     }
 }
+if DB_POOL:
+    DATABASES['default']['POOL_OPTIONS'] = {
+        'POOL_SIZE': int(os.environ.get('DB_POOL_SIZE', '10')),
+        'MAX_OVERFLOW': int(os.environ.get('DB_POOL_MAX_OVERFLOW', '10')),
+        'RECYCLE': int(os.environ.get('DB_POOL_RECYCLE', '3600')),
+        'PRE_PING': True,
+    }
+
+# Local development and benchmarks (manage.py bench_api) without a MySQL server
+if os.environ.get('DJANGO_DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+# Read replicas for safe requests (backend/replicas.py): MYSQL_REPLICA_HOSTS=host[:port],...
+# with the primary's credentials, or SQLITE_REPLICAS=path,... under DJANGO_DB_ENGINE=sqlite
+# (a copy of db.sqlite3 is a replica that stopped replicating). Tests use the primary.
+if os.environ.get('DJANGO_DB_ENGINE') == 'sqlite':
+    REPLICA_DATABASES = [
+        {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path.strip()}
+        for path in os.environ.get('SQLITE_REPLICAS', '').split(',') if path.strip()
+    ]
+else:
+    REPLICA_DATABASES = [
+        {**DATABASES['default'], 'HOST': host.strip().partition(':')[0],
+         'PORT': host.strip().partition(':')[2] or DATABASES['default']['PORT']}
+        for host in os.environ.get('MYSQL_REPLICA_HOSTS', '').split(',') if host.strip()
+    ]
+for number, replica in enumerate(REPLICA_DATABASES, start=1):
+    DATABASES[f'replica{number}'] = {**replica, 'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS = [f'replica{number}' for number in range(1, len(REPLICA_DATABASES) + 1)]
+DATABASE_ROUTERS = ['backend.replicas.ReplicaRouter']
+# A replica further behind than this is skipped until it catches up
+DATABASE_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', '5'))
+DATABASE_REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', '5'))
+# Covers the tolerated lag plus the time until the next lag check
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', '15'))
+DATABASE_REPLICA_CACHE = 'default'
+
+
+# Cache
+# Local memory is per process; point these at a shared backend (Redis,
+# Memcached, database) so every worker sees the same entries.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', ''),
+    },
+    'reference': {
+        'BACKEND': os.environ.get('DJANGO_REFERENCE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_REFERENCE_CACHE_LOCATION', 'reference'),
+    },
+}
+
+# Serialized machine and supplier lists; with a per-process backend a write in
+# another worker shows up here within the timeout. Their version tokens (and
+# so the ETags) live in the database and are the same in every worker.
+ORDERS_REFERENCE_CACHE = 'reference'
+ORDERS_REFERENCE_CACHE_TIMEOUT = int(os.environ.get('DJANGO_REFERENCE_CACHE_TIMEOUT', '60'))
+
+# JWT token versions (accounts.authentication); with a per-process backend a
+# logout in another worker is only seen here once the entry expires, so keep
+# the timeout short.
+ACCOUNTS_TOKEN_CACHE = 'default'
+ACCOUNTS_TOKEN_VERSION_TIMEOUT = int(os.environ.get('ACCOUNTS_TOKEN_VERSION_TIMEOUT', '30'))
 
 
 # Password validation
@@ -134,6 +221,13 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Deduplicating SHA-256 keyed storage for Order.step_file / Order.d2_draft_design
+    'order_files': {'BACKEND': 'orders.storage.ContentAddressedStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -147,8 +241,54 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_ALLOW_HEADERS = (
+    *default_headers,
+    'upload-offset',
+)
+
+CORS_EXPOSE_HEADERS = [
+    'X-Orders-Cursor',
+    'X-Has-More',
+    'Upload-Offset',
+    'Upload-Length',
+    'Content-Disposition',
+]
+
+# Largest file accepted by the chunked upload API (/api/uploads/)
+ORDER_UPLOAD_MAX_BYTES = int(os.environ.get('ORDER_UPLOAD_MAX_BYTES', str(1024 ** 3)))
+# Most rows accepted by one bulk import (/api/orders/bulk_import/)
+ORDER_IMPORT_MAX_ROWS = int(os.environ.get('ORDER_IMPORT_MAX_ROWS', '1000'))
+
+# Machine hours available per calendar day (two shifts); used to turn estimated
+# run time into scheduled start/end times
+PRODUCTION_HOURS_PER_DAY = float(os.environ.get('PRODUCTION_HOURS_PER_DAY', '16'))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
     ),
-}
\ No newline at end of file
+}
+
+# ?since= delta sync: cursors stop this many seconds short of the newest change
+# so rows of transactions still committing are re-sent rather than skipped;
+# prune_order_changes keeps this many days of the change log.
+ORDER_CHANGES_SETTLE_SECONDS = int(os.environ.get('ORDER_CHANGES_SETTLE_SECONDS', '5'))
+ORDER_CHANGES_RETENTION_DAYS = int(os.environ.get('ORDER_CHANGES_RETENTION_DAYS', '30'))
+
+# Fan-out backend for the /api/events/ stream. InProcessBroker only reaches
+# streams of the publishing process, so with more than one gunicorn worker
+# (GUNICORN_WORKERS, as setup.sh reads it) events go through the database.
+ORDER_EVENTS_BROKER = os.environ.get('ORDER_EVENTS_BROKER') or (
+    'orders.events.InProcessBroker' if int(os.environ.get('GUNICORN_WORKERS', '3')) == 1
+    else 'orders.events.DatabaseBroker'
+)
+ORDER_EVENTS_POLL_SECONDS = float(os.environ.get('ORDER_EVENTS_POLL_SECONDS', '0.5'))
+# Only ASGI workers serve the stream; WSGI deployments publish nothing
+ORDER_EVENTS_ENABLED = os.environ.get('ORDER_EVENTS_ENABLED', 'true' if SERVER_MODE == 'asgi' else 'false').lower() in ('1', 'true', 'yes')
+ORDER_EVENTS_TICKET_SECONDS = int(os.environ.get('ORDER_EVENTS_TICKET_SECONDS', '30'))
+
+# Sampled request profiling (Server-Timing headers + /api/metrics/); off unless enabled
+REQUEST_PROFILING = {
+    'ENABLED': os.environ.get('REQUEST_PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes'),
+    'SAMPLE_RATE': float(os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', '0.1')),
+}
@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from orders.models import ReplicationHeartbeat
+from . import replicas
+
+REPLICA = 'lag-test-replica'
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+@mock.patch('backend.replicas.usable_replicas', return_value=['replica1'])
+class ReplicaPinningTests(SimpleTestCase):
+    """Outside a test transaction: reads inside ``atomic`` always go to the primary"""
+    user_id = 42
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.router = replicas.ReplicaRouter()
+
+    def route(self, method, view):
+        """Run ``view(routing)`` inside the routing middleware for a ``method`` request"""
+        def get_response(request):
+            view(replicas._current.get())
+            return None
+        replicas.ReplicaRoutingMiddleware(get_response)(getattr(RequestFactory(), method)('/'))
+
+    def test_reads_of_safe_requests_go_to_a_replica(self, usable):
+        def view(routing):
+            replicas.authenticated(self.user_id)
+            self.assertEqual(self.router.db_for_read(User), 'replica1')
+        self.route('get', view)
+        self.assertFalse(replicas.is_pinned(self.user_id))
+
+    def test_a_write_pins_the_user_to_the_primary(self, usable):
+        def write(routing):
+            replicas.authenticated(self.user_id)
+            self.assertEqual(self.router.db_for_write(User), 'default')
+            self.assertIsNone(self.router.db_for_read(User))
+        self.route('get', write)
+        self.assertTrue(replicas.is_pinned(self.user_id))
+
+        def read(routing):
+            replicas.authenticated(self.user_id)
+            self.assertIsNone(self.router.db_for_read(User))
+        self.route('get', read)
+
+    def test_pins_are_per_user(self, usable):
+        replicas.pin(self.user_id + 1)
+
+        def view(routing):
+            replicas.authenticated(self.user_id)
+            self.assertEqual(self.router.db_for_read(User), 'replica1')
+        self.route('get', view)
+
+    def test_unsafe_requests_read_the_primary(self, usable):
+        def view(routing):
+            replicas.authenticated(self.user_id)
+            self.assertIsNone(self.router.db_for_read(User))
+        self.route('post', view)
+        self.assertFalse(replicas.is_pinned(self.user_id))
+
+    def test_without_replicas_the_middleware_is_not_used(self, usable):
+        with override_settings(DATABASE_REPLICAS=[]):
+            with self.assertRaises(MiddlewareNotUsed):
+                replicas.ReplicaRoutingMiddleware(lambda request: None)
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], DATABASE_REPLICA_CHECK_INTERVAL=5, DATABASE_REPLICA_MAX_LAG=5)
+class ReplicaLagTests(TestCase):
+    """A second SQLite database stands in for the replica; ``replicate`` plays the replication stream"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        database = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            REPLICA: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory, 'replica.sqlite3')},
+        })[REPLICA]
+        # Left out of connections.settings, so the test runner neither creates nor guards it
+        connections[REPLICA] = DatabaseWrapper(database, REPLICA)
+        self.addCleanup(connections.__delitem__, REPLICA)
+        self.addCleanup(connections[REPLICA].close)
+        with connections[REPLICA].schema_editor() as editor:
+            editor.create_model(ReplicationHeartbeat)
+        replicas._lag.clear()
+        self.addCleanup(replicas._lag.clear)
+
+    def stamp(self, seconds_ago):
+        timestamp = timezone.now() - timedelta(seconds=seconds_ago)
+        ReplicationHeartbeat.objects.update_or_create(pk=1, defaults={'timestamp': timestamp})
+        return timestamp
+
+    def replicate(self, timestamp):
+        ReplicationHeartbeat.objects.using(REPLICA).update_or_create(pk=1, defaults={'timestamp': timestamp})
+
+    def test_a_caught_up_replica_is_usable(self):
+        # The primary's stamp is due for a refresh that the replica has not applied yet
+        self.replicate(self.stamp(6))
+        self.assertEqual(replicas.usable_replicas(), [REPLICA])
+        self.assertGreater(ReplicationHeartbeat.objects.get().timestamp, timezone.now() - timedelta(seconds=1))
+        # Measured again before the new stamp arrives it is still within the allowed lag
+        self.assertLess(replicas.replica_lag(REPLICA), 5)
+
+    def test_a_stale_replica_is_not_usable(self):
+        self.replicate(self.stamp(60))
+        self.stamp(1)
+        self.assertGreater(replicas.replica_lag(REPLICA), 50)
+        self.assertEqual(replicas.usable_replicas(), [])
+
+    def test_a_replica_without_a_stamp_is_not_usable(self):
+        self.stamp(1)
+        self.assertIsNone(replicas.replica_lag(REPLICA))
+        self.assertEqual(replicas.usable_replicas(), [])
@@ -21,6 +21,7 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
 )
 from accounts.views import CustomTokenObtainPairView
+from backend.profiling import metrics_view
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -28,6 +29,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('orders.urls')),
     path('api/auth/', include('accounts.urls')),
+    path('api/metrics/', metrics_view, name='metrics'),
 ]
 
 urlpatterns += [
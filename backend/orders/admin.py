@@ -1,8 +1,9 @@
 from django.contrib import admin
-from .models import Supplier, Machine, Order
+from .models import Supplier, Machine, Order, StoredBlob
 
 # Register your models here.
 
 admin.site.register(Supplier)
 admin.site.register(Machine)
 admin.site.register(Order)
+admin.site.register(StoredBlob)
@@ -0,0 +1,325 @@
+"""Endpoint scenarios for the ``bench_api`` command.
+
+Each scenario drives one route of ``orders/urls.py``, ``accounts/urls.py`` or
+the JWT views through the DRF test client with a real bearer token, so query
+counts include authentication. ``setup`` runs outside the measured window and
+prepares whatever row the request needs (e.g. an order in the right status).
+Budgets are set on SQLite, where order and message writes also maintain the
+search index (``orders.searching``); MySQL needs fewer queries.
+
+Budgets are ceilings with headroom over the measured counts (at least two
+queries, or a quarter), so the bench catches N+1 regressions rather than
+every extra lookup; exact counts for the hot list endpoints are pinned with
+``assertNumQueries`` in ``orders/tests.py``.
+"""
+import hashlib
+import io
+import itertools
+import statistics
+import time
+import zipfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from accounts.serializers import CustomTokenObtainPairSerializer
+from .models import Machine, Order, OrderChange, OrderMessage, Supplier
+from . import uploads
+
+PASSWORD = 'bench-password'
+_sequence = itertools.count()
+
+
+def unique(prefix):
+    return f'{prefix}{time.time_ns() % 10**9}{next(_sequence)}'
+
+
+class Context:
+    """Users, tokens and sample rows shared by all scenarios."""
+
+    def __init__(self):
+        self.admin = User.objects.create_user(
+            username=unique('bench-admin-'), email=f"{unique('bench-admin-')}@example.com",
+            password=PASSWORD, role='admin', is_staff=True,
+        )
+        self.client_user = User.objects.create_user(
+            username=unique('bench-client-'), email=f"{unique('bench-client-')}@example.com",
+            password=PASSWORD, role='client',
+        )
+        # Give the benchmark client a share of the seeded history
+        seeded_owner = Order.objects.values_list('client_id', flat=True).first()
+        if seeded_owner:
+            Order.objects.filter(client_id=seeded_owner).update(client=self.client_user)
+        supplier = Supplier.objects.first() or Supplier.objects.create(name='Bench Supplier')
+        self.machine = Machine.objects.filter(supplier=supplier).first() or Machine.objects.create(
+            supplier=supplier, name='Bench Machine', make='Bench')
+        self.supplier = supplier
+        self.thread_order = self.make_order()
+        for n in range(20):
+            OrderMessage.objects.create(order=self.thread_order, sender=self.client_user, message=f'Bench message {n}')
+        # Logging out revokes the user's tokens, so that scenario gets a user of its own
+        self.logout_user = User.objects.create_user(
+            username=unique('bench-logout-'), email=f"{unique('bench-logout-')}@example.com",
+            password=PASSWORD, role='client',
+        )
+        self.clients = {}
+        for role, user in (('admin', self.admin), ('client', self.client_user), ('logout', self.logout_user)):
+            self.clients[role] = APIClient()
+            self.sign_in(role, user)
+        self.clients['anonymous'] = APIClient()
+
+    def sign_in(self, role, user):
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        self.clients[role].credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def make_order(self, status='under_review', **fields):
+        values = {
+            'client': self.client_user,
+            'part_id': unique('BENCH-'),
+            'product_description': 'Bench part',
+            'd2_draft_design': 'draft_designs/bench.pdf',
+            'quantity': 10,
+            'material_thickness': '2',
+            'material_type': 'Mild Steel',
+            'material_grade': 'S235',
+            'surface_treatment': 'None',
+            'packing_standard': 'Standard',
+            'target_price': 1000,
+            'status': status,
+        }
+        values.update(fields)
+        return Order.objects.create(**values)
+
+
+class Scenario:
+    def __init__(self, name, method, path, user='admin', data=None, setup=None, format='json', headers=None, budget=10):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.user = user
+        self.data = data
+        self.setup = setup
+        self.format = format
+        self.headers = headers or {}
+        self.budget = budget
+
+    def run(self, ctx, iterations):
+        """Return per-request query counts, latencies (ms) and body sizes."""
+        queries, latencies, sizes = [], [], []
+        client = ctx.clients[self.user]
+        for _ in range(iterations):
+            values = self.setup(ctx) if self.setup else {}
+            path = self.path.format(ctx=ctx, **values)
+            data = self.data(ctx, values) if callable(self.data) else self.data
+            request = getattr(client, self.method)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                if data is not None:
+                    response = request(path, data, format=self.format, **self.headers)
+                else:
+                    response = request(path, **self.headers)
+                # Streamed bodies run their queries as they are read
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+                latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{self.name}: {self.method.upper()} {path} returned {response.status_code}: {response.content[:200]!r}')
+            queries.append(len(captured))
+            sizes.append(len(body))
+        return queries, latencies, sizes
+
+
+def summarize(queries, latencies, sizes):
+    ordered = sorted(latencies)
+    return {
+        'queries': max(queries),
+        'p50_ms': statistics.median(ordered),
+        'p95_ms': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        'bytes': int(statistics.median(sizes)),
+    }
+
+
+def _cursor_before_change(ctx):
+    cursor = OrderChange.latest_cursor()
+    ctx.make_order()
+    return {'cursor': cursor}
+
+
+def _order(status='under_review', **fields):
+    def setup(ctx):
+        return {'order': ctx.make_order(status=status, **fields).pk}
+    return setup
+
+
+def _order_fields():
+    return {
+        'part_id': unique('BENCH-'),
+        'product_description': 'Bench upload',
+        'quantity': 5,
+        'material_thickness': '3',
+        'material_type': 'Mild Steel',
+        'material_grade': 'S235',
+        'surface_treatment': 'None',
+        'packing_standard': 'Standard',
+        'target_price': '500',
+    }
+
+
+def _new_order_form(ctx, values):
+    draft = SimpleUploadedFile('draft.pdf', b'%PDF-1.4 bench', content_type='application/pdf')
+    return {**_order_fields(), 'd2_draft_design': draft}
+
+
+BULK_SIZE = 20
+
+
+def _orders(status='under_review', **fields):
+    def setup(ctx):
+        return {'ids': [ctx.make_order(status=status, **fields).pk for _ in range(BULK_SIZE)]}
+    return setup
+
+
+def _bulk(**extra):
+    def data(ctx, values):
+        return {'ids': values['ids'], **{key: value(ctx) if callable(value) else value for key, value in extra.items()}}
+    return data
+
+
+def _import_form(ctx, values):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as bundle:
+        bundle.writestr('draft.pdf', b'%PDF-1.4 bench import')
+    manifest = '\n'.join(
+        [','.join([*_order_fields(), 'd2_draft_design'])]
+        + [','.join([*map(str, _order_fields().values()), 'draft.pdf']) for _ in range(BULK_SIZE)]
+    )
+    return {
+        'manifest': SimpleUploadedFile('orders.csv', manifest.encode(), content_type='text/csv'),
+        'files': SimpleUploadedFile('files.zip', archive.getvalue(), content_type='application/zip'),
+    }
+
+
+UPLOAD_BYTES = b'%PDF-1.4 bench upload\n' * 1024
+UPLOAD_SHA256 = hashlib.sha256(UPLOAD_BYTES).hexdigest()
+
+
+def _upload(received=0, complete=False):
+    def setup(ctx):
+        # No declared hash, so the pre-check never short-circuits these uploads
+        upload = ctx.client_user.uploads.create(kind='d2_draft_design', filename='bench.pdf', size=len(UPLOAD_BYTES))
+        uploads.start(upload)
+        if received:
+            with open(uploads.partial_path(upload), 'wb') as part:
+                part.write(UPLOAD_BYTES[:received])
+            upload.offset = received
+            upload.save()
+        if complete:
+            upload = uploads.finalize(upload.pk, ctx.client_user, UPLOAD_SHA256)
+        return {'upload': upload.pk}
+    return setup
+
+
+def _supplier(ctx):
+    return {'supplier': Supplier.objects.create(name=unique('Bench Supplier ')).pk}
+
+
+def _machine(ctx):
+    return {'machine': Machine.objects.create(supplier=ctx.supplier, name=unique('Bench Machine '), make='Bench').pk}
+
+
+def _registration(ctx, values):
+    name = unique('bench-register-')
+    return {'username': name, 'email': f'{name}@example.com', 'password': PASSWORD}
+
+
+SCENARIOS = [
+    # orders/urls.py: orders
+    Scenario('orders list (admin)', 'get', '/api/orders/', budget=6),
+    Scenario('orders list (client)', 'get', '/api/orders/', user='client', budget=6),
+    Scenario('orders list page', 'get', '/api/orders/?page_size=25', budget=5),
+    Scenario('orders list filtered page', 'get', '/api/orders/?status=completed&page_size=25&fields=id,status,part_id', budget=5),
+    Scenario('orders changes since', 'get', '/api/orders/?since={cursor}', setup=_cursor_before_change, budget=8),
+    Scenario('orders retrieve', 'get', '/api/orders/{ctx.thread_order.pk}/', user='client', budget=5),
+    Scenario('orders stats', 'get', '/api/orders/stats/', budget=5),
+    Scenario('orders create', 'post', '/api/orders/', user='client', data=_new_order_form, format='multipart', budget=19),
+    Scenario('orders update', 'patch', '/api/orders/{order}/', data={'admin_notes': 'bench'}, setup=_order(), budget=8),
+    Scenario('orders destroy', 'delete', '/api/orders/{order}/', setup=_order(), budget=13),
+    Scenario('approve_order', 'post', '/api/orders/{order}/approve_order/',
+             data=lambda ctx, values: {'machine_id': ctx.machine.pk}, setup=_order(), budget=14),
+    Scenario('reject_order', 'post', '/api/orders/{order}/reject_order/',
+             data={'rejection_reason': 'bench'}, setup=_order(), budget=9),
+    Scenario('assign_machine', 'post', '/api/orders/{order}/assign_machine/',
+             data=lambda ctx, values: {'machine_id': ctx.machine.pk}, setup=_order('accepted'), budget=14),
+    Scenario('recommended_machines', 'get', '/api/orders/{ctx.thread_order.pk}/recommended_machines/', budget=5),
+    Scenario('start_production', 'post', '/api/orders/{order}/start_production/',
+             setup=lambda ctx: {'order': ctx.make_order('accepted', machine=ctx.machine).pk}, budget=14),
+    Scenario('complete_order', 'post', '/api/orders/{order}/complete_order/',
+             data={'actual_cost': '900'}, setup=lambda ctx: {'order': ctx.make_order('in_production', machine=ctx.machine).pk}, budget=9),
+    Scenario('search', 'get', '/api/orders/search/?q=steel&page_size=25', budget=7),
+    Scenario('search client', 'get', '/api/orders/search/?q=bench', user='client', budget=7),
+    Scenario('export', 'get', '/api/orders/export/', budget=4),
+    Scenario('export xlsx', 'get', '/api/orders/export/?filetype=xlsx&status=pending', budget=4),
+    Scenario('export_offers', 'get', '/api/orders/export_offers/', budget=4),
+    Scenario('bulk_import', 'post', '/api/orders/bulk_import/', user='client', data=_import_form, format='multipart', budget=18),
+    Scenario('bulk_approve', 'post', '/api/orders/bulk_approve/',
+             data=_bulk(machine_id=lambda ctx: ctx.machine.pk), setup=_orders(), budget=15),
+    Scenario('bulk_reject', 'post', '/api/orders/bulk_reject/',
+             data=_bulk(rejection_reason='bench'), setup=_orders(), budget=12),
+    Scenario('bulk_assign_machine', 'post', '/api/orders/bulk_assign_machine/',
+             data=_bulk(machine_id=lambda ctx: ctx.machine.pk), setup=_orders('accepted'), budget=15),
+    Scenario('bulk_start_production', 'post', '/api/orders/bulk_start_production/',
+             data=_bulk(), setup=lambda ctx: _orders('accepted', machine=ctx.machine)(ctx), budget=17),
+    Scenario('confirm_price', 'post', '/api/orders/{order}/confirm_price/', user='client',
+             setup=_order(price_estimate=1100), budget=12),
+    Scenario('send_counter_offer', 'post', '/api/orders/{order}/send_counter_offer/', user='client',
+             data={'amount': '950', 'message': 'bench'}, setup=_order(), budget=12),
+    Scenario('accept_counter_offer', 'post', '/api/orders/{order}/accept_counter_offer/', user='client',
+             setup=_order('negotiation', latest_offer_amount=975, latest_offer_sender_role='admin'), budget=12),
+    Scenario('confirm_payment', 'post', '/api/orders/{order}/confirm_payment/', user='client',
+             setup=_order('awaiting_payment', agreed_price=975), budget=12),
+    Scenario('orders create from upload', 'post', '/api/orders/', user='client', setup=_upload(len(UPLOAD_BYTES), complete=True),
+             data=lambda ctx, values: {**_order_fields(), 'd2_draft_design_upload': values['upload']},
+             budget=15),
+    # orders/urls.py: chunked uploads
+    Scenario('uploads init', 'post', '/api/uploads/', user='client',
+             data={'kind': 'step_file', 'filename': 'bench.step', 'size': len(UPLOAD_BYTES)}, budget=3),
+    Scenario('uploads init known hash', 'post', '/api/uploads/', user='client', setup=_upload(len(UPLOAD_BYTES), complete=True),
+             data={'kind': 'd2_draft_design', 'filename': 'bench.pdf', 'size': len(UPLOAD_BYTES), 'sha256': UPLOAD_SHA256},
+             budget=6),
+    Scenario('uploads status', 'get', '/api/uploads/{upload}/', user='client', setup=_upload(), budget=3),
+    Scenario('uploads chunk', 'put', '/api/uploads/{upload}/', user='client', setup=_upload(), data=UPLOAD_BYTES,
+             format=None, headers={'content_type': 'application/octet-stream', 'HTTP_UPLOAD_OFFSET': '0'}, budget=6),
+    Scenario('uploads finalize', 'post', '/api/uploads/{upload}/finalize/', user='client',
+             setup=_upload(len(UPLOAD_BYTES)), data={'sha256': UPLOAD_SHA256}, budget=9),
+    # orders/urls.py: messages
+    Scenario('messages list', 'get', '/api/orders/{ctx.thread_order.pk}/messages/', user='client', budget=4),
+    Scenario('messages after_id', 'get', '/api/orders/{ctx.thread_order.pk}/messages/?after_id=0&limit=10', user='client', budget=5),
+    Scenario('messages create', 'post', '/api/orders/{ctx.thread_order.pk}/messages/', user='client',
+             data={'message': 'bench'}, budget=8),
+    # orders/urls.py: suppliers and machines
+    Scenario('suppliers list', 'get', '/api/suppliers/', budget=3),
+    Scenario('suppliers retrieve', 'get', '/api/suppliers/{ctx.supplier.pk}/', budget=3),
+    Scenario('suppliers create', 'post', '/api/suppliers/', data=lambda ctx, values: {'name': unique('Bench Supplier ')}, budget=3),
+    Scenario('suppliers update', 'patch', '/api/suppliers/{supplier}/', data={'phone': '123'}, setup=_supplier, budget=4),
+    Scenario('suppliers destroy', 'delete', '/api/suppliers/{supplier}/', setup=_supplier, budget=7),
+    Scenario('machines list', 'get', '/api/machines/', budget=3),
+    Scenario('machines available', 'get', '/api/machines/available/', budget=3),
+    Scenario('machines retrieve', 'get', '/api/machines/{ctx.machine.pk}/', budget=3),
+    Scenario('machines queue', 'get', '/api/machines/{ctx.machine.pk}/queue/', budget=4),
+    Scenario('machines create', 'post', '/api/machines/',
+             data=lambda ctx, values: {'name': unique('Bench Machine '), 'make': 'Bench', 'supplier': ctx.supplier.pk}, budget=4),
+    Scenario('machines update', 'patch', '/api/machines/{machine}/', data={'make': 'Bench 2'}, setup=_machine, budget=4),
+    Scenario('machines destroy', 'delete', '/api/machines/{machine}/', setup=_machine, budget=7),
+    # accounts/urls.py and JWT
+    Scenario('auth register', 'post', '/api/auth/register/', user='anonymous', data=_registration, budget=5),
+    Scenario('auth login', 'post', '/api/auth/login/', user='anonymous',
+             data=lambda ctx, values: {'username': ctx.client_user.email, 'password': PASSWORD}, budget=12),
+    Scenario('auth logout', 'post', '/api/auth/logout/', user='logout',
+             setup=lambda ctx: ctx.sign_in('logout', User.objects.get(pk=ctx.logout_user.pk)) or {}, budget=5),
+    Scenario('auth me', 'get', '/api/auth/me/', user='client', budget=3),
+    Scenario('auth me update', 'patch', '/api/auth/me/', user='client', data={'company': 'Bench Co'}, budget=4),
+    Scenario('jwt create', 'post', '/api/auth/jwt/create/', user='anonymous',
+             data=lambda ctx, values: {'email': ctx.client_user.email, 'password': PASSWORD}, budget=3),
+]
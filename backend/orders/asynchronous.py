@@ -0,0 +1,83 @@
+"""Async handlers for DRF views.
+
+DRF dispatches synchronously. ``AsyncViewMixin`` lets a view or viewset
+implement chosen handlers as ``async def``: a route with an async handler is
+served by a coroutine view that awaits it directly and runs the route's sync
+handlers (writes, uploads) through ``sync_to_async``. Under ASGI (gunicorn
+with uvicorn workers, see setup.sh) polling reads then wait on the database
+without holding a worker; under WSGI Django runs the coroutine to completion
+per request, so both deployment modes serve the same views.
+
+Authentication, permissions and throttling run in a worker thread, since the
+authentication classes may query the database.
+"""
+from functools import update_wrapper
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.http import Http404
+from django.utils.decorators import classonlymethod
+
+
+class AsyncViewMixin:
+    # Set on instances of routes that have an async handler (as_view passes it)
+    asynchronous = False
+    # Django would reject views mixing sync and async handlers; dispatch() handles both
+    view_is_async = False
+
+    @classonlymethod
+    def as_view(cls, *args, **initkwargs):
+        actions = args[0] if args else initkwargs.get('actions')
+        names = actions.values() if actions else cls.http_method_names
+        if not any(iscoroutinefunction(getattr(cls, name, None)) for name in names):
+            return super().as_view(*args, **initkwargs)
+        view = super().as_view(*args, asynchronous=True, **initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+        # Keeps cls, initkwargs, actions and csrf_exempt for routers and middleware
+        return update_wrapper(async_view, view)
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.asynchronous:
+            return super().dispatch(request, *args, **kwargs)
+        method = request.method.lower()
+        handler = getattr(self, method, None) if method in self.http_method_names else None
+        if iscoroutinefunction(handler):
+            return self.async_dispatch(request, *args, **kwargs)
+        return sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+    async def async_dispatch(self, request, *args, **kwargs):
+        """``APIView.dispatch`` awaiting the handler"""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            response = await getattr(self, request.method.lower())(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aget_object(self):
+        """``get_object`` through the async ORM"""
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (ObjectDoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def aserialize(self, instance, many=False):
+        """Serializer data, built in a worker thread since related fields may query lazily"""
+        return await sync_to_async(lambda: self.get_serializer(instance, many=many).data)()
+
+    async def alist_all(self, queryset):
+        """Serialized data of every row of ``queryset``"""
+        return await self.aserialize(queryset, many=True)
@@ -0,0 +1,99 @@
+"""Versioned cache for near-static reference data (machines, suppliers).
+
+Entries are keyed by a per-namespace version token that model signals replace
+on every write, so invalidation never has to find old keys. The token is
+stored in ``ReferenceVersion`` by the writing transaction and only memoized in
+the cache: every worker reads the same value, so ETags built from it match
+across workers and stay put while nothing is written. The memo expires with
+the entries, which bounds staleness when the backend is per process (the
+local-memory default) and the write happened in another worker.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+
+def get_cache():
+    return caches[getattr(settings, 'ORDERS_REFERENCE_CACHE', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'ORDERS_REFERENCE_CACHE_TIMEOUT', 60)
+
+
+def _version_key(namespace):
+    return f'reference-version:{namespace}'
+
+
+def _stored_version(namespace):
+    from .models import ReferenceVersion
+    # The primary: a replica may not have the latest write yet
+    versions = ReferenceVersion.objects.using(DEFAULT_DB_ALIAS)
+    version = versions.filter(namespace=namespace).values_list('version', flat=True).first()
+    if version is None:
+        versions.bulk_create([ReferenceVersion(namespace=namespace, version=time.time_ns())], ignore_conflicts=True)
+        version = versions.filter(namespace=namespace).values_list('version', flat=True).get()
+    return version
+
+
+def get_version(namespace):
+    """Current version token for ``namespace``: nanoseconds since the epoch of its last write."""
+    cache = get_cache()
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        version = _stored_version(namespace)
+        cache.set(key, version, get_timeout())
+    return version
+
+
+async def aget_version(namespace):
+    version = await get_cache().aget(_version_key(namespace))
+    if version is None:
+        version = await sync_to_async(get_version)(namespace)
+    return version
+
+
+def bump_version(*namespaces):
+    """Retire every cached entry of ``namespaces``; other readers see it once the current transaction commits."""
+    from .models import ReferenceVersion
+    version = time.time_ns()
+    for namespace in namespaces:
+        if not ReferenceVersion.objects.filter(namespace=namespace).update(version=version):
+            ReferenceVersion.objects.bulk_create([ReferenceVersion(namespace=namespace, version=version)], ignore_conflicts=True)
+    transaction.on_commit(lambda: get_cache().set_many(
+        {_version_key(namespace): version for namespace in namespaces}, get_timeout()))
+
+
+def version_modified(version):
+    return datetime.fromtimestamp(version / 1e9, tz=dt_timezone.utc)
+
+
+def cached_collection(namespace, request, build):
+    """Return ``build()`` from the cache, rebuilding it after the namespace's next write.
+
+    Keyed by host as well, since serializers embed absolute media URLs.
+    """
+    cache = get_cache()
+    key = f'reference:{namespace}:{get_version(namespace)}:{request.scheme}://{request.get_host()}'
+    data = cache.get(key)
+    if data is None:
+        data = list(build())
+        cache.set(key, data, get_timeout())
+    return data
+
+
+async def acached_collection(namespace, request, build):
+    """``cached_collection`` for async views; ``build`` is a coroutine function"""
+    cache = get_cache()
+    version = await aget_version(namespace)
+    key = f'reference:{namespace}:{version}:{request.scheme}://{request.get_host()}'
+    data = await cache.aget(key)
+    if data is None:
+        data = list(await build())
+        await cache.aset(key, data, get_timeout())
+    return data
@@ -0,0 +1,74 @@
+import hashlib
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .caching import aget_version, get_version, version_modified
+
+
+def conditional_get(method):
+    """Answer a GET with 304 when the view's validators match the request's.
+
+    The view provides ``get_validators(request)`` returning ``(version,
+    last_modified)``; both are cheap to compute, so an unchanged poll never
+    reaches the queryset or serializer. Async handlers await the view's
+    ``aget_validators(request)`` when it has one.
+    """
+    def check(self, request, version, last_modified):
+        # The same data renders differently per URL (filters, fields), user and format
+        key = repr((version, request.get_full_path(), request.user.pk, request.accepted_renderer.format))
+        etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        return etag, timestamp, get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+    def stamp(response, etag, timestamp):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    if iscoroutinefunction(method):
+        @wraps(method)
+        async def async_inner(self, request, *args, **kwargs):
+            validators = getattr(self, 'aget_validators', None) or sync_to_async(self.get_validators)
+            etag, timestamp, response = check(self, request, *await validators(request))
+            if response is None:
+                response = await method(self, request, *args, **kwargs)
+            return stamp(response, etag, timestamp)
+        return async_inner
+
+    @wraps(method)
+    def inner(self, request, *args, **kwargs):
+        etag, timestamp, response = check(self, request, *self.get_validators(request))
+        if response is None:
+            response = method(self, request, *args, **kwargs)
+        return stamp(response, etag, timestamp)
+    return inner
+
+
+def latest(*timestamps):
+    timestamps = [value for value in timestamps if value is not None]
+    return max(timestamps) if timestamps else None
+
+
+def reference_validators(namespace):
+    """Validators for a cached reference collection; no database access while its version is cached."""
+    version = get_version(namespace)
+    return version, version_modified(version)
+
+
+async def areference_validators(namespace):
+    version = await aget_version(namespace)
+    return version, version_modified(version)
+
+
+def machine_validators():
+    return reference_validators('machines')
+
+
+async def amachine_validators():
+    return await areference_validators('machines')
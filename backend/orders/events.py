@@ -0,0 +1,370 @@
+"""Server push for order events.
+
+Views publish through ``publish_order_event`` / ``publish_message_event``; the
+``order_event_stream`` view (ASGI only) relays them to browsers as server-sent
+events. Each event goes to the admin channel and to the owning client's
+channel, so a subscriber only ever sees orders it is allowed to list.
+
+``InProcessBroker`` only reaches streams served by the publishing process;
+``DatabaseBroker`` relays events between workers (and hosts) through the
+``PublishedEvent`` table and is the default whenever gunicorn runs more than
+one worker (see ``ORDER_EVENTS_BROKER``). Nothing is published unless
+``ORDER_EVENTS_ENABLED`` (on under ``SERVER_MODE=asgi``): a WSGI deployment
+has no streams to deliver to.
+
+Browsers cannot set headers on an ``EventSource``, so a stream is opened with
+``?ticket=`` from ``event_ticket``: a signed, single-purpose credential valid
+for ``ORDER_EVENTS_TICKET_SECONDS``, which keeps the bearer token out of
+access logs.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from accounts.authentication import ClaimsJWTAuthentication, VERSION_CLAIM, token_user, token_version, user_claims
+from .models import PublishedEvent
+
+logger = logging.getLogger(__name__)
+
+ADMIN_CHANNEL = 'admin'
+KEEPALIVE_SECONDS = 15
+# Published rows commit independently, so one may appear after a higher id was read;
+# rows this recent are read again (and skipped if already delivered)
+PUBLISH_SETTLE_SECONDS = 2
+PUBLISH_RETENTION_SECONDS = 300
+PRUNE_INTERVAL_SECONDS = 60
+TICKET_SALT = 'orders.events.stream-ticket'
+
+
+def client_channel(client_id):
+    return f'client:{client_id}'
+
+
+class BaseBroker:
+    """Fan-out interface between publishing views and open event streams.
+
+    ``publish`` may be called from any thread; ``subscribe`` is called from the
+    event loop serving the stream and returns a ``Subscription``. Multi-worker
+    deployments plug in a broker backed by a shared bus through the
+    ``ORDER_EVENTS_BROKER`` setting, delivering remote events to local
+    subscriptions with ``Subscription.put``.
+    """
+
+    def publish(self, channels, event):
+        raise NotImplementedError
+
+    def publish_many(self, messages):
+        """Publish ``(channels, event)`` pairs; brokers that can batch override this"""
+        for channels, event in messages:
+            self.publish(channels, event)
+
+    def subscribe(self, channels):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class Subscription:
+    """Bounded per-stream queue owned by the event loop that created it."""
+
+    def __init__(self, broker, channels, maxsize=100):
+        self.broker = broker
+        self.channels = frozenset(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put_nowait, event)
+        except RuntimeError:
+            # Loop already closed; the stream is gone
+            pass
+
+    def _put_nowait(self, event):
+        if self.queue.full():
+            # A stalled reader loses its oldest events rather than blocking publishers
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker(BaseBroker):
+    """Delivers events to streams served by the same process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def publish(self, channels, event):
+        with self._lock:
+            targets = set()
+            for channel in channels:
+                targets.update(self._subscriptions.get(channel, ()))
+        for subscription in targets:
+            subscription.put(event)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[channel]
+
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subscriptions)
+
+
+class DatabaseBroker(BaseBroker):
+    """Relays events through the ``PublishedEvent`` table to the streams of every worker.
+
+    ``publish`` inserts a row. While the process has open streams, a background
+    thread reads the rows added since its last poll every
+    ``ORDER_EVENTS_POLL_SECONDS`` and hands them to the local subscriptions.
+    Publishers and the relay delete rows older than ``PUBLISH_RETENTION_SECONDS``
+    at most every ``PRUNE_INTERVAL_SECONDS`` per process, so the table stays
+    small whether or not any stream is open.
+    """
+
+    def __init__(self):
+        self.local = InProcessBroker()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pruned = 0.0
+
+    def publish(self, channels, event):
+        PublishedEvent.objects.create(channels=' '.join(channels), payload=event)
+        self._prune()
+
+    def publish_many(self, messages):
+        if len(messages) == 1:
+            # A plain INSERT: bulk_create would wrap it in a transaction of its own
+            self.publish(*messages[0])
+        else:
+            PublishedEvent.objects.bulk_create([
+                PublishedEvent(channels=' '.join(channels), payload=event) for channels, event in messages
+            ])
+            self._prune()
+
+    def _prune(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._pruned < PRUNE_INTERVAL_SECONDS:
+                return
+            self._pruned = now
+        PublishedEvent.objects.filter(
+            timestamp__lt=timezone.now() - timedelta(seconds=PUBLISH_RETENTION_SECONDS)
+        ).delete()
+
+    def subscribe(self, channels):
+        with self._lock:
+            subscription = self.local.subscribe(channels)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._relay, name='order-events-relay', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.local.unsubscribe(subscription)
+
+    def _relay(self):
+        interval = getattr(settings, 'ORDER_EVENTS_POLL_SECONDS', 0.5)
+        settled, delivered = None, set()
+        try:
+            while True:
+                with self._lock:
+                    if not self.local.has_subscribers():
+                        self._thread = None
+                        return
+                try:
+                    if settled is None:
+                        # Only events published from now on are relayed
+                        settled = PublishedEvent.objects.aggregate(last=Max('id'))['last'] or 0
+                    settled = self._deliver(settled, delivered)
+                    self._prune()
+                except DatabaseError:
+                    logger.exception('Reading published order events failed')
+                    connection.close()
+                time.sleep(interval)
+        finally:
+            connection.close()
+
+    def _deliver(self, settled, delivered):
+        """Publish locally the rows after ``settled`` not yet ``delivered``; returns the new settled id"""
+        cutoff = timezone.now() - timedelta(seconds=PUBLISH_SETTLE_SECONDS)
+        rows = PublishedEvent.objects.filter(id__gt=settled).values_list('id', 'channels', 'payload', 'timestamp')
+        for pk, channels, payload, timestamp in rows:
+            if pk not in delivered:
+                delivered.add(pk)
+                self.local.publish(channels.split(), payload)
+            if timestamp <= cutoff:
+                settled = pk
+        delivered.difference_update([pk for pk in delivered if pk <= settled])
+        return settled
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_path = getattr(settings, 'ORDER_EVENTS_BROKER', 'orders.events.InProcessBroker')
+                _broker = import_string(broker_path)()
+    return _broker
+
+
+def _publish(messages):
+    # Only announce committed state, otherwise a subscriber could refetch stale rows
+    if messages and getattr(settings, 'ORDER_EVENTS_ENABLED', True):
+        transaction.on_commit(lambda: get_broker().publish_many(messages))
+
+
+def _channels(client_id):
+    return [ADMIN_CHANNEL, client_channel(client_id)]
+
+
+def _order_message(order, event):
+    return _channels(order.client_id), {
+        'event': event,
+        'order_id': order.pk,
+        'status': order.status,
+    }
+
+
+def publish_order_event(order, event):
+    """Announce that ``event`` (usually the action name) changed ``order``."""
+    _publish([_order_message(order, event)])
+
+
+def publish_order_events(orders, event):
+    """``publish_order_event`` for many orders, handed to the broker as one batch"""
+    _publish([_order_message(order, event) for order in orders])
+
+
+def publish_message_event(message):
+    _publish([(_channels(message.order.client_id), {
+        'event': 'message_created',
+        'order_id': message.order_id,
+        'message_id': message.pk,
+        'type': message.type,
+    })])
+
+
+def _format_event(event):
+    # Unnamed, so EventSource.onmessage sees every event; the name is in the data
+    return f"data: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n"
+
+
+def issue_ticket(user):
+    """A signed ``?ticket=`` for ``user``'s event stream"""
+    return signing.dumps({'id': user.pk, **user_claims(user)}, salt=TICKET_SALT)
+
+
+def redeem_ticket(ticket):
+    """The user a ticket was issued to; None once expired, tampered with or revoked"""
+    try:
+        claims = signing.loads(ticket, salt=TICKET_SALT, max_age=getattr(settings, 'ORDER_EVENTS_TICKET_SECONDS', 30))
+    except signing.BadSignature:
+        return None
+    if token_version(claims['id']) != claims[VERSION_CLAIM]:
+        return None
+    return token_user(claims['id'], claims)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def event_ticket(request):
+    """Short-lived ticket for opening ``/api/events/?ticket=``"""
+    if not isinstance(request._request, ASGIRequest):
+        return Response({'error': 'Event stream requires the ASGI server'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+    return Response({'ticket': issue_ticket(request.user)})
+
+
+async def _authenticate(request):
+    """Resolve the user from a ``?ticket=`` (EventSource can't set headers) or the Authorization header."""
+    ticket = request.GET.get('ticket')
+    if ticket:
+        return await sync_to_async(redeem_ticket)(ticket)
+    authentication = ClaimsJWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if not raw_token:
+        return None
+    try:
+        validated_token = authentication.get_validated_token(raw_token)
+        return await sync_to_async(authentication.get_user)(validated_token)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+async def order_event_stream(request):
+    """Server-sent event stream of order and message events for the caller."""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Event stream requires the ASGI server'}, status=501)
+    user = await _authenticate(request)
+    if user is None or not user.is_active:
+        return JsonResponse({'error': 'Authentication credentials were not provided or are invalid.'}, status=401)
+
+    if user.is_staff or getattr(user, 'role', None) == 'admin':
+        channels = [ADMIN_CHANNEL]
+    else:
+        channels = [client_channel(user.id)]
+
+    async def stream():
+        subscription = get_broker().subscribe(channels)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await subscription.get(KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield _format_event(event)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,300 @@
+"""Streaming CSV/XLSX exports of orders and their negotiation history.
+
+Rows are read as ``values_list`` tuples in primary-key pages of
+``CHUNK_SIZE`` (each fetched with ``.iterator(chunk_size=...)``), formatted
+and handed to ``StreamingHttpResponse`` page by page, so memory stays flat
+however many years of history are exported and the first bytes go out
+immediately. Keyset pages rather than one big iterator keep that true on
+MySQL, whose driver buffers a whole result set client-side. Under ASGI the
+response gets an async iterator that reads each page in a worker thread:
+Django would otherwise collect a sync iterator into a list before sending it.
+
+XLSX files are written without third-party packages: a minimal workbook of
+one sheet with inline strings, streamed through ``zipfile`` into a
+write-only sink that is drained after every page.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+# CSV text starting with these is read as a formula by spreadsheet apps (formula injection).
+# XLSX inline strings are always text, so they are written as is.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+FILETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# (header, values_list path)
+ORDER_COLUMNS = [
+    ('Order ID', 'id'),
+    ('Part ID', 'part_id'),
+    ('Status', 'status'),
+    ('Client', 'client__email'),
+    ('Company', 'client__company'),
+    ('Description', 'product_description'),
+    ('Quantity', 'quantity'),
+    ('Material', 'material_type'),
+    ('Grade', 'material_grade'),
+    ('Thickness', 'material_thickness'),
+    ('Surface treatment', 'surface_treatment'),
+    ('Packing', 'packing_standard'),
+    ('Target price', 'target_price'),
+    ('Price estimate', 'price_estimate'),
+    ('Agreed price', 'agreed_price'),
+    ('Actual cost', 'actual_cost'),
+    ('Payment confirmed', 'payment_confirmed'),
+    ('Machine', 'machine__name'),
+    ('Machine type', 'machine__type'),
+    ('Supplier', 'machine__supplier__name'),
+    ('Submitted', 'date_submitted'),
+    ('Accepted', 'date_accepted'),
+    ('Production started', 'date_production_started'),
+    ('Completed', 'date_completed'),
+    ('Rejected', 'date_rejected'),
+    ('Expected completion', 'expected_completion_date'),
+    ('Scheduled start', 'scheduled_start'),
+    ('Scheduled end', 'scheduled_end'),
+]
+OFFER_COLUMNS = [
+    ('Message ID', 'id'),
+    ('Order ID', 'order_id'),
+    ('Part ID', 'order__part_id'),
+    ('Client', 'order__client__email'),
+    ('Type', 'type'),
+    ('Amount', 'amount'),
+    ('Sender', 'sender__email'),
+    ('Sender role', 'sender__role'),
+    ('Admin', 'is_admin'),
+    ('Message', 'message'),
+    ('Timestamp', 'timestamp'),
+]
+# Counter offers plus the system messages that record agreements and payments
+NEGOTIATION_TYPES = ['counter_offer', 'system']
+
+_ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _page(queryset, fields, last):
+    page = queryset.order_by('pk')
+    if last is not None:
+        page = page.filter(pk__gt=last)
+    return page.values_list('pk', *fields)[:CHUNK_SIZE]
+
+
+def _pages(queryset, fields):
+    """Rows of ``fields`` in primary-key order, one list per page of CHUNK_SIZE"""
+    last = None
+    while True:
+        rows = list(_page(queryset, fields, last).iterator(chunk_size=CHUNK_SIZE))
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield [row[1:] for row in rows]
+        if len(rows) < CHUNK_SIZE:
+            return
+
+
+async def _apages(queryset, fields):
+    """``_pages`` through the async ORM"""
+    last = None
+    while True:
+        # Not aiterator(): ValuesListIterable runs its query when created, in the event loop
+        rows = await sync_to_async(list)(_page(queryset, fields, last).iterator(chunk_size=CHUNK_SIZE))
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield [row[1:] for row in rows]
+        if len(rows) < CHUNK_SIZE:
+            return
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat() if timezone.is_aware(value) else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_text(value):
+    text = _text(value)
+    if isinstance(value, str) and text.startswith(FORMULA_PREFIXES):
+        # Keep spreadsheets from evaluating client-entered text as a formula
+        return "'" + text
+    return text
+
+
+class _Csv:
+    def __init__(self, headers, sheet_name):
+        self.headers = headers
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def drain(self):
+        data = self.buffer.getvalue().encode()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def start(self):
+        self.buffer.write('\ufeff')  # BOM so Excel reads UTF-8
+        self.writer.writerow(self.headers)
+        return self.drain()
+
+    def write(self, rows):
+        self.writer.writerows([_csv_text(value) for value in row] for row in rows)
+        return self.drain()
+
+    def finish(self):
+        return b''
+
+
+class _Sink:
+    """Write-only file for zipfile; without ``seek`` it streams entries with data descriptors"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c t="n"><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML.sub('', _text(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row(values):
+    return '<row>' + ''.join(_cell(value) for value in values) + '</row>'
+
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+
+class _Xlsx:
+    def __init__(self, headers, sheet_name):
+        self.headers = headers
+        self.sheet_name = sheet_name
+        self.sink = _Sink()
+
+    def start(self):
+        self.workbook = zipfile.ZipFile(self.sink, 'w', compression=zipfile.ZIP_DEFLATED)
+        for name, content in _XLSX_PARTS.items():
+            self.workbook.writestr(name, content)
+        self.workbook.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(self.sheet_name)}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        self.sheet = self.workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+        self.sheet.write((
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            + _row(self.headers)
+        ).encode())
+        return self.sink.drain()
+
+    def write(self, rows):
+        self.sheet.write(''.join(_row(row) for row in rows).encode())
+        return self.sink.drain()
+
+    def finish(self):
+        self.sheet.write(b'</sheetData></worksheet>')
+        self.sheet.close()
+        self.workbook.close()
+        return self.sink.drain()
+
+
+FORMATS = {'csv': _Csv, 'xlsx': _Xlsx}
+
+
+def _content(output, pages):
+    yield output.start()
+    for rows in pages:
+        yield output.write(rows)
+    yield output.finish()
+
+
+async def _acontent(output, pages):
+    yield output.start()
+    async for rows in pages:
+        yield output.write(rows)
+    yield output.finish()
+
+
+def stream(queryset, columns, filetype, filename, asynchronous=False):
+    """``StreamingHttpResponse`` of ``queryset`` as ``filetype`` ('csv' or 'xlsx') with the given columns.
+
+    ``asynchronous`` (an ASGI request) streams from an async iterator.
+    """
+    output = FORMATS[filetype]([header for header, _ in columns], filename.capitalize())
+    fields = [path for _, path in columns]
+    if asynchronous:
+        content = _acontent(output, _apages(queryset, fields))
+    else:
+        content = _content(output, _pages(queryset, fields))
+    response = StreamingHttpResponse(content, content_type=FILETYPES[filetype])
+    stamp = timezone.localdate().isoformat()
+    response['Content-Disposition'] = f'attachment; filename="{filename}-{stamp}.{filetype}"'
+    # Tell nginx not to buffer the download
+    response['X-Accel-Buffering'] = 'no'
+    return response
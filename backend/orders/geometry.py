@@ -0,0 +1,111 @@
+"""Background analysis of order STEP files.
+
+``OrderGeometry`` rows are the queue: the order signals insert or reset a
+``pending`` row whenever ``step_file`` changes, and ``process_geometry``
+workers claim rows with ``SELECT ... FOR UPDATE SKIP LOCKED`` so several
+workers can share the table without a broker. Results are reused across
+orders whose file has the same SHA-256, so a resubmitted file is never
+parsed twice. A finished (done or failed) row logs an ``OrderChange`` for its
+order, since the order payload embeds the geometry: ``?since=`` syncs and
+ETags pick the result up.
+"""
+import os
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import step
+from .models import OrderGeometry
+from .storage import BLOB_PREFIX, file_sha256
+
+MAX_ATTEMPTS = 3
+STALE_AFTER = timedelta(minutes=10)  # A claimed row older than this belongs to a dead worker
+RESULT_FIELDS = ['bbox_x', 'bbox_y', 'bbox_z', 'part_count', 'surface_area', 'preview']
+
+
+def enqueue(order):
+    """Queue analysis of the order's current step_file, or drop its geometry when the file was removed."""
+    if not order.step_file:
+        OrderGeometry.objects.filter(order=order).delete()
+        return
+    reset = {field: None for field in RESULT_FIELDS}
+    reset.update(status='pending', sha256='', attempts=0, locked_at=None, error='', updated_at=timezone.now())
+    if not OrderGeometry.objects.filter(order=order).update(**reset):
+        OrderGeometry.objects.create(order=order)
+
+
+def claim_next():
+    """Mark the oldest pending (or abandoned) row as processing and return it, or None when idle."""
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            OrderGeometry.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending') | Q(status='processing', locked_at__lt=now - STALE_AFTER))
+            .order_by('updated_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'processing'
+        job.locked_at = now
+        job.attempts += 1
+        job.save(update_fields=['status', 'locked_at', 'attempts', 'updated_at'])
+    return job
+
+
+def _sha256(field_file):
+    name = field_file.name
+    if name.startswith(BLOB_PREFIX):  # Content-addressed names already carry the digest
+        return os.path.splitext(os.path.basename(name))[0]
+    return file_sha256(field_file.path)
+
+
+def _analyse(field_file, sha256):
+    cached = OrderGeometry.objects.filter(sha256=sha256, status='done').values(*RESULT_FIELDS).first()
+    if cached is not None:
+        return cached
+    result = step.analyse(field_file.path)
+    preview = result.pop('preview')
+    result['preview'] = None
+    if preview:
+        name = f'geometry_previews/{sha256}.png'
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(preview))
+        result['preview'] = name
+    return result
+
+
+def _finish(job, claimed, **fields):
+    """Write the outcome while the row is still claimed by this run"""
+    from .signals import record_order_changes  # signals imports this module to enqueue analyses
+    with transaction.atomic():
+        if claimed.update(locked_at=None, updated_at=timezone.now(), **fields) and fields['status'] != 'pending':
+            record_order_changes([job.order])
+
+
+def process(job):
+    """Analyse one claimed row. Returns True on success.
+
+    Results are written only while the row is still claimed by this run, so a
+    file replaced mid-analysis re-queues instead of getting stale numbers.
+    """
+    claimed = OrderGeometry.objects.filter(pk=job.pk, status='processing', locked_at=job.locked_at)
+    try:
+        field_file = job.order.step_file
+        if not field_file:
+            claimed.delete()
+            return False
+        sha256 = _sha256(field_file)
+        result = _analyse(field_file, sha256)
+    except Exception as exc:
+        # Unparseable files fail at once; anything else (I/O, DB) is retried
+        permanent = isinstance(exc, step.StepError) or job.attempts >= MAX_ATTEMPTS
+        status = 'failed' if permanent else 'pending'
+        _finish(job, claimed, status=status, error=f'{type(exc).__name__}: {exc}'[:2000])
+        return False
+    _finish(job, claimed, status='done', sha256=sha256, error='', **result)
+    return True
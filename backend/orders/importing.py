@@ -0,0 +1,177 @@
+"""Bulk order import: a CSV or JSON manifest plus a zip of the files it names.
+
+Each manifest row has the ``POST /api/orders/`` fields; ``step_file`` and
+``d2_draft_design`` name members of the zip. Rows are validated in memory,
+``part_id`` uniqueness is checked with one query for the whole manifest,
+referenced files are stored once each, and valid rows are inserted with
+``bulk_create`` in batches of ``BATCH_SIZE``, each in its own transaction.
+A batch that hits a ``part_id`` taken meanwhile is retried row by row, so one
+bad row never sinks the others. ``bulk_create`` skips the order signals, so
+the change log, blob ref counts, geometry queue and search index are
+updated here.
+"""
+import csv
+import io
+import json
+import os
+import zipfile
+from collections import Counter
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from .events import publish_order_events
+from .models import Order, OrderGeometry
+from .searching import index_orders
+from .signals import adjust_blob_refs, record_order_changes
+from .uploads import max_upload_size
+
+BATCH_SIZE = 200
+FILE_FIELDS = ('step_file', 'd2_draft_design')
+
+
+class ManifestError(Exception):
+    """The manifest or archive as a whole is unusable (as opposed to a bad row)"""
+
+
+class OrderRowSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = [
+            'part_id', 'product_description', 'quantity', 'material_thickness', 'material_type',
+            'material_grade', 'surface_treatment', 'packing_standard', 'target_price',
+        ]
+        # Uniqueness is checked for the whole manifest at once
+        extra_kwargs = {'part_id': {'validators': []}}
+
+
+def max_rows():
+    return getattr(settings, 'ORDER_IMPORT_MAX_ROWS', 1000)
+
+
+def read_manifest(manifest):
+    """Rows (dicts) from an uploaded CSV or JSON manifest file, a JSON string or an already parsed list"""
+    try:
+        if isinstance(manifest, str):
+            manifest = json.loads(manifest)
+        elif not isinstance(manifest, (list, dict)):
+            raw = manifest.read()
+            if manifest.name.lower().endswith('.json'):
+                manifest = json.loads(raw)
+            else:
+                manifest = list(csv.DictReader(io.StringIO(raw.decode('utf-8-sig'))))
+    except (ValueError, csv.Error) as exc:
+        raise ManifestError(f'Unreadable manifest: {exc}')
+    rows = manifest.get('orders') if isinstance(manifest, dict) else manifest
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ManifestError('The manifest must be a list of order objects')
+    if not rows:
+        raise ManifestError('The manifest has no rows')
+    if len(rows) > max_rows():
+        raise ManifestError(f'At most {max_rows()} orders can be imported at once')
+    return rows
+
+
+def open_archive(upload):
+    if upload is None:
+        return None
+    try:
+        archive = zipfile.ZipFile(upload)
+    except zipfile.BadZipFile:
+        raise ManifestError('files must be a zip archive')
+    if sum(info.file_size for info in archive.infolist()) > max_upload_size():
+        raise ManifestError('The archive is too large once extracted')
+    return archive
+
+
+def _validate(rows, archive):
+    """Split ``rows`` into ``[(row number, data, {field: member})]`` and ``{row number: errors}``"""
+    members = set(archive.namelist()) if archive else set()
+    valid, errors, seen = [], {}, set()
+    for number, row in enumerate(rows, start=1):
+        serializer = OrderRowSerializer(data=row)
+        problems = {} if serializer.is_valid() else dict(serializer.errors)
+        files = {field: str(row.get(field) or '').strip() for field in FILE_FIELDS}
+        if not files['d2_draft_design']:
+            problems['d2_draft_design'] = ['This field is required.']
+        for field, member in files.items():
+            if member and member not in members:
+                problems[field] = [f'{member} is not in the archive.']
+        part_id = str(row.get('part_id') or '').strip()
+        if part_id and part_id in seen:
+            problems['part_id'] = ['Duplicate part_id in the manifest.']
+        seen.add(part_id)
+        if problems:
+            errors[number] = problems
+        else:
+            valid.append((number, serializer.validated_data, files))
+    taken = set(Order.objects.filter(part_id__in=[data['part_id'] for _, data, _ in valid]).values_list('part_id', flat=True))
+    for number, data, _ in valid:
+        if data['part_id'] in taken:
+            errors[number] = {'part_id': ['An order with this part_id already exists.']}
+    return [entry for entry in valid if entry[0] not in errors], errors
+
+
+def _store(archive, valid):
+    """Save every referenced zip member once; returns {(field, member): stored name}"""
+    stored = {}
+    for _, _, files in valid:
+        for field, member in files.items():
+            if member and (field, member) not in stored:
+                model_field = Order._meta.get_field(field)
+                filename = os.path.basename(member)
+                with archive.open(member) as handle:
+                    stored[(field, member)] = model_field.storage.save(
+                        model_field.generate_filename(None, filename), File(handle, name=filename))
+    return stored
+
+
+def _inserted(orders):
+    """What the order signals would have done for rows written by ``bulk_create``"""
+    if any(order.pk is None for order in orders):
+        # Backends without RETURNING (MySQL) leave pks unset
+        ids = dict(Order.objects.filter(part_id__in=[order.part_id for order in orders]).values_list('part_id', 'id'))
+        for order in orders:
+            order.pk = ids[order.part_id]
+    record_order_changes(orders)
+    references = Counter(getattr(order, field).name for order in orders for field in FILE_FIELDS if getattr(order, field))
+    for count in set(references.values()):
+        adjust_blob_refs([name for name, refs in references.items() if refs == count], count)
+    OrderGeometry.objects.bulk_create([OrderGeometry(order=order) for order in orders if order.step_file])
+    index_orders(orders, replace=False)
+    publish_order_events(orders, 'order_created')
+
+
+def import_orders(client, rows, archive=None):
+    """Create ``client``'s orders from manifest ``rows``; returns ``(created orders by row, {row: errors})``"""
+    valid, errors = _validate(rows, archive)
+    stored = _store(archive, valid) if valid else {}
+    created = {}
+    for start in range(0, len(valid), BATCH_SIZE):
+        batch = [
+            (number, Order(client=client, **data, **{
+                field: stored.get((field, member), '') for field, member in files.items()
+            }))
+            for number, data, files in valid[start:start + BATCH_SIZE]
+        ]
+        try:
+            with transaction.atomic():
+                Order.objects.bulk_create([order for _, order in batch])
+                _inserted([order for _, order in batch])
+        except IntegrityError:
+            # A concurrent request took one of the part ids: find it row by row
+            for number, order in batch:
+                order.pk = None
+                try:
+                    with transaction.atomic():
+                        Order.objects.bulk_create([order])
+                        _inserted([order])
+                except IntegrityError:
+                    errors[number] = {'part_id': ['An order with this part_id already exists.']}
+                else:
+                    created[number] = order
+            continue
+        created.update(batch)
+    return created, errors
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from orders.models import Machine
+from orders.caching import bump_version
+from orders.renditions import generate
+
+class Command(BaseCommand):
+    help = 'Generate missing WebP/JPEG renditions for existing machine photos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate renditions that already exist')
+
+    def handle(self, *args, **options):
+        written = failed = 0
+        for machine in Machine.objects.exclude(photo='').exclude(photo__isnull=True).only('id', 'photo').iterator():
+            try:
+                written += generate(machine.photo.name, machine.photo.storage, overwrite=options['force'])
+            except (OSError, ValueError) as exc:  # Missing or unreadable original
+                failed += 1
+                self.stderr.write(f'Machine {machine.id}: {exc}')
+        if written:
+            bump_version('machines')
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} renditions ({failed} photos failed)'))
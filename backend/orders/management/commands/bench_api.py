@@ -0,0 +1,71 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+from orders.api_benchmark import SCENARIOS, Context, summarize
+from orders.seeding import seed
+
+class Command(BaseCommand):
+    help = ('Seed data, drive every orders/accounts API route through the DRF test client and report '
+            'query counts, p50/p95 latency and response size; fails when a query budget is exceeded. '
+            'The /api/events/ stream is ASGI-only and not covered.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=50)
+        parser.add_argument('--suppliers', type=int, default=5)
+        parser.add_argument('--machines', type=int, default=20)
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--messages-per-order', type=int, default=2)
+        parser.add_argument('--iterations', type=int, default=20, help='Requests per endpoint')
+        parser.add_argument('--only', help='Only run scenarios whose name contains this text')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+        parser.add_argument('--in-place', action='store_true',
+                            help='Use the configured database instead of a throwaway test database (seeded rows are kept)')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = None if options['in_place'] else runner.setup_databases()
+        try:
+            results = self.benchmark(options)
+        finally:
+            if old_config is not None:
+                runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+        over_budget = [result for result in results if result['queries'] > result['budget']]
+        if over_budget:
+            raise CommandError('Query budget exceeded: ' + ', '.join(
+                f"{result['endpoint']} ({result['queries']} > {result['budget']})" for result in over_budget
+            ))
+        self.stdout.write(self.style.SUCCESS(f'All {len(results)} endpoints within their query budgets.'))
+
+    def benchmark(self, options):
+        counts = seed(
+            clients=options['clients'],
+            suppliers=options['suppliers'],
+            machines=options['machines'],
+            orders=options['orders'],
+            messages_per_order=options['messages_per_order'],
+        )
+        self.stdout.write('Seeded ' + ', '.join(f'{count} {name}' for name, count in counts.items())
+                          + f' on {connection.vendor}')
+        ctx = Context()
+
+        results = []
+        self.stdout.write(f"{'endpoint':<28} {'queries':>7} {'budget':>6} {'p50 ms':>8} {'p95 ms':>8} {'bytes':>9}")
+        for scenario in SCENARIOS:
+            if options['only'] and options['only'] not in scenario.name:
+                continue
+            summary = summarize(*scenario.run(ctx, options['iterations']))
+            result = {'endpoint': scenario.name, 'budget': scenario.budget, **summary}
+            results.append(result)
+            line = (f"{scenario.name:<28} {summary['queries']:>7} {scenario.budget:>6} "
+                    f"{summary['p50_ms']:>8.2f} {summary['p95_ms']:>8.2f} {summary['bytes']:>9}")
+            self.stdout.write(self.style.ERROR(line) if summary['queries'] > scenario.budget else line)
+        return results
@@ -0,0 +1,73 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Sum
+from orders.models import Order, OrderMessage
+
+# Composite indexes this benchmark exercises; --compare hides them to get the "before" numbers
+BENCHMARK_INDEXES = [
+    (Order._meta.db_table, index.name) for index in Order._meta.indexes
+] + [
+    (OrderMessage._meta.db_table, index.name) for index in OrderMessage._meta.indexes
+]
+
+
+def query_shapes(client_id, order_id):
+    """The hot query shapes issued by the order, stats and message endpoints."""
+    orders = Order.objects.select_related('machine', 'machine__supplier', 'client')
+    return [
+        ('admin list page', orders.order_by('-date_submitted', '-id')[:25]),
+        ('client order list', orders.filter(client_id=client_id).order_by('-date_submitted')),
+        ('status filter page', orders.filter(status__in=['negotiation', 'awaiting_payment']).order_by('-date_submitted', '-id')[:25]),
+        ('dashboard status counts', Order.objects.order_by().values('status').annotate(count=Count('id'), total=Sum('agreed_price'))),
+        ('message thread', OrderMessage.objects.filter(order_id=order_id).order_by('timestamp', 'id')),
+        ('latest counter offer', OrderMessage.objects.filter(order_id=order_id, type='counter_offer').order_by('-timestamp')[:1]),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Print query plans and latencies for the hot Order/OrderMessage query shapes (seed data first with seed_orders)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10, help='Timed runs per query')
+        parser.add_argument('--compare', action='store_true',
+                            help='MySQL 8 only: first run with the composite indexes made INVISIBLE, then restore them')
+        parser.add_argument('--no-plans', action='store_true', help='Only print latencies')
+
+    def handle(self, *args, **options):
+        client_id = Order.objects.values_list('client_id', flat=True).first()
+        order_id = OrderMessage.objects.values_list('order_id', flat=True).first()
+        if client_id is None or order_id is None:
+            raise CommandError('No orders with messages found; run seed_orders first.')
+        if options['compare'] and connection.vendor != 'mysql':
+            raise CommandError('--compare relies on MySQL 8 invisible indexes.')
+
+        self.stdout.write(f'{Order.objects.count()} orders, {OrderMessage.objects.count()} messages on {connection.vendor}')
+        if options['compare']:
+            self.set_visibility('INVISIBLE')
+            try:
+                self.run(client_id, order_id, options, label='without composite indexes')
+            finally:
+                self.set_visibility('VISIBLE')
+        self.run(client_id, order_id, options, label='with composite indexes')
+
+    def set_visibility(self, visibility):
+        with connection.cursor() as cursor:
+            for table, index in BENCHMARK_INDEXES:
+                cursor.execute(f'ALTER TABLE `{table}` ALTER INDEX `{index}` {visibility}')
+
+    def run(self, client_id, order_id, options, label):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {label} =='))
+        for name, queryset in query_shapes(client_id, order_id):
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                rows = len(list(queryset.all()))
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f'{name}: {rows} rows, median {statistics.median(timings):.2f} ms, max {max(timings):.2f} ms'
+            )
+            if not options['no_plans']:
+                self.stdout.write(queryset.explain())
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from orders import uploads
+from orders.models import Upload
+
+class Command(BaseCommand):
+    help = 'Delete pending chunked uploads (and their part files) that have not received data recently'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Idle time after which a pending upload is abandoned')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = Upload.objects.filter(status='pending', updated_at__lt=cutoff)
+        count = 0
+        for upload in stale.iterator():
+            if not options['dry_run']:
+                uploads.discard(upload)
+            count += 1
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {count} stale uploads'))
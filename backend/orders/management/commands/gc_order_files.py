@@ -0,0 +1,75 @@
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from orders.models import Order, StoredBlob, Upload
+from orders.storage import BLOB_PREFIX, order_file_storage
+
+class Command(BaseCommand):
+    help = ('Delete content-addressed order files no order references any more. '
+            'Blobs touched within the grace period are kept so in-flight uploads can still be attached.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24)
+        parser.add_argument('--recount', action='store_true',
+                            help='Rebuild ref_count from the order table first (fixes drift from bulk writes)')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            self.recount(options['dry_run'])
+
+        storage = order_file_storage()
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        freed = deleted = 0
+        for blob_id in StoredBlob.objects.filter(ref_count__lte=0, updated_at__lt=cutoff).values_list('id', flat=True):
+            with transaction.atomic():
+                # Re-check under the row lock: an order may have picked the blob up meanwhile
+                blob = StoredBlob.objects.select_for_update().filter(
+                    id=blob_id, ref_count__lte=0, updated_at__lt=cutoff).first()
+                if blob is None:
+                    continue
+                if not options['dry_run']:
+                    storage.delete(blob.name)
+                    Upload.objects.filter(stored_name=blob.name).delete()
+                    blob.delete()
+                freed += blob.size
+                deleted += 1
+
+        orphans = self.delete_orphan_files(storage, cutoff, options['dry_run'])
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted} unreferenced blobs ({freed} bytes) and {orphans} files without a blob record'))
+
+    def recount(self, dry_run):
+        counts = Counter()
+        for names in Order.objects.values_list('step_file', 'd2_draft_design').iterator():
+            counts.update(name for name in names if name and name.startswith(BLOB_PREFIX))
+        drifted = [blob for blob in StoredBlob.objects.all() if blob.ref_count != counts.get(blob.name, 0)]
+        for blob in drifted:
+            blob.ref_count = counts.get(blob.name, 0)
+        if not dry_run:
+            StoredBlob.objects.bulk_update(drifted, ['ref_count'], batch_size=1000)
+        self.stdout.write(f'Recounted references: {len(drifted)} blobs corrected')
+
+    def delete_orphan_files(self, storage, cutoff, dry_run):
+        """Files under blobs/ with no StoredBlob row, e.g. left by a crash between write and insert"""
+        root = storage.path(BLOB_PREFIX)
+        if not os.path.isdir(root):
+            return 0
+        known = set(StoredBlob.objects.values_list('name', flat=True))
+        count = 0
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+                modified = datetime.fromtimestamp(os.path.getmtime(path), tz=dt_timezone.utc)
+                if name in known or modified >= cutoff:
+                    continue
+                if not dry_run:
+                    os.remove(path)
+                count += 1
+        return count
@@ -0,0 +1,263 @@
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from accounts.serializers import CustomTokenObtainPairSerializer
+from orders.models import Order
+
+# gunicorn arguments per deployment mode, as setup.sh starts them
+MODES = {
+    'wsgi': ['backend.wsgi:application'],
+    'asgi': ['backend.asgi:application', '-k', 'uvicorn_worker.UvicornWorker'],
+}
+UPLOAD_SIZE = 4096
+UPLOAD_PIECES = 16
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def mysql_status():
+    """``(Threads_connected, Connections)``: connections open now and opened since the server started"""
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN ('Threads_connected', 'Connections')")
+        status = dict(cursor.fetchall())
+    return int(status['Threads_connected']), int(status['Connections'])
+
+
+class Command(BaseCommand):
+    help = ('Start gunicorn in WSGI (sync workers) and ASGI (uvicorn workers) mode against the configured '
+            'database, drive both with the same polling load on the read endpoints while clients trickle '
+            'slow uploads, and compare throughput and p50/p95/p99 latency. On MySQL it also samples '
+            'Threads_connected and counts the connections opened. Seed data first (seed_orders).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default='wsgi,asgi', help='Comma separated: wsgi, asgi')
+        parser.add_argument('--workers', type=int, default=3, help='gunicorn workers per server')
+        parser.add_argument('--port', type=int, default=8100, help='First port; each mode uses the next one')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds of load per mode')
+        parser.add_argument('--concurrency', type=int, default=32, help='Polling clients')
+        parser.add_argument('--slow-uploads', type=int, default=3, help='Clients trickling upload chunks')
+        parser.add_argument('--trickle-seconds', type=float, default=10, help='How long one slow chunk takes to send')
+        parser.add_argument('--conn-max-age',
+                            help='Comma separated DB_CONN_MAX_AGE values to run every mode with, e.g. 0,60')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+
+    def handle(self, *args, **options):
+        modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown mode(s): {', '.join(sorted(unknown))}")
+        User = get_user_model()
+        user = User.objects.filter(is_active=True, role='admin').first() or User.objects.filter(is_active=True, is_staff=True).first()
+        if user is None:
+            raise CommandError('No active admin user to poll as; setup.sh creates one.')
+        order_id = Order.objects.order_by('-id').values_list('id', flat=True).first()
+        if order_id is None:
+            raise CommandError('No orders to poll; run seed_orders first.')
+        self.paths = [
+            ('orders list', '/api/orders/?page_size=50'),
+            ('orders retrieve', f'/api/orders/{order_id}/'),
+            ('messages list', f'/api/orders/{order_id}/messages/'),
+            ('machines list', '/api/machines/'),
+            ('machines available', '/api/machines/available/'),
+            ('orders stats', '/api/orders/stats/'),
+        ]
+
+        ages = [age.strip() for age in (options['conn_max_age'] or '').split(',') if age.strip()] or [None]
+        results = {}
+        for number, (mode, age) in enumerate((mode, age) for mode in modes for age in ages):
+            label = mode if age is None else f'{mode} age={age}'
+            env = {**os.environ, 'SERVER_MODE': mode}
+            if age is not None:
+                env['DB_CONN_MAX_AGE'] = age
+            port = options['port'] + number
+            self.token = str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+            server = self.start(mode, port, options['workers'], env)
+            try:
+                self.stdout.write(f"{label}: {options['duration']:.0f}s, {options['concurrency']} pollers, "
+                                  f"{options['slow_uploads']} slow uploads, {options['workers']} workers")
+                results[label] = self.run_load(port, options)
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=30)
+            self.report(label, results[label])
+
+        if len(results) > 1:
+            self.stdout.write(f"\n{'run':<16}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+                              f"{'threads max':>13}{'new conns':>11}")
+            for label, result in results.items():
+                mysql = result.get('mysql', {})
+                self.stdout.write(f"{label:<16}{result['throughput']:>8.1f}{result['p50']:>9.1f}{result['p95']:>9.1f}"
+                                  f"{result['p99']:>9.1f}{result['errors']:>8}"
+                                  f"{mysql.get('threads_connected_max', '-'):>13}{mysql.get('connections_opened', '-'):>11}")
+        if options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+
+    def start(self, mode, port, workers, env):
+        command = [sys.executable, '-m', 'gunicorn', *MODES[mode], '-b', f'127.0.0.1:{port}',
+                   f'--workers={workers}', '--timeout=120', '--log-level=warning']
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn ({mode}) exited with status {server.returncode}')
+            try:
+                if self.request(port, 'GET', self.paths[0][1])[0] == 200:
+                    return server
+            except OSError:
+                pass
+            time.sleep(0.5)
+        server.kill()
+        raise CommandError(f'gunicorn ({mode}) did not answer on port {port}')
+
+    def request(self, port, method, path, body=None):
+        """``(status, parsed JSON or None)`` of one request on a fresh connection"""
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=130)
+        headers = {'Authorization': f'Bearer {self.token}'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            content = response.read()
+        finally:
+            connection.close()
+        data = json.loads(content) if content and response.getheader('Content-Type', '').startswith('application/json') else None
+        return response.status, data
+
+    def run_load(self, port, options):
+        stop = threading.Event()
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+
+        def poll(first):
+            index = first
+            while not stop.is_set():
+                name, path = self.paths[index % len(self.paths)]
+                index += 1
+                started = time.perf_counter()
+                try:
+                    ok = self.request(port, 'GET', path)[0] == 200
+                except OSError:
+                    ok = False
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    if ok:
+                        latencies[name].append(elapsed)
+                    else:
+                        errors[name] += 1
+
+        def trickle():
+            while not stop.is_set():
+                self.slow_upload(port, options['trickle_seconds'], stop)
+
+        threads_connected = []
+
+        def sample():
+            # Its own connection, counted in Threads_connected like the servers' ones
+            try:
+                while not stop.wait(0.5):
+                    threads_connected.append(mysql_status()[0])
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=poll, args=(i,)) for i in range(options['concurrency'])]
+        threads += [threading.Thread(target=trickle) for _ in range(options['slow_uploads'])]
+        if connection.vendor == 'mysql':
+            threads.append(threading.Thread(target=sample))
+            opened = mysql_status()[1]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        every = [value for values in latencies.values() for value in values]
+        result = {
+            'requests': len(every),
+            'errors': sum(errors.values()),
+            'throughput': len(every) / elapsed,
+            'p50': percentile(every, 0.50),
+            'p95': percentile(every, 0.95),
+            'p99': percentile(every, 0.99),
+            'endpoints': {
+                name: {
+                    'requests': len(latencies[name]),
+                    'errors': errors[name],
+                    'p50': percentile(latencies[name], 0.50),
+                    'p95': percentile(latencies[name], 0.95),
+                    'p99': percentile(latencies[name], 0.99),
+                }
+                for name, _ in self.paths
+            },
+        }
+        if connection.vendor == 'mysql':
+            result['mysql'] = {
+                'threads_connected_max': max(threads_connected, default=0),
+                'threads_connected_mean': round(sum(threads_connected) / len(threads_connected), 1) if threads_connected else 0,
+                'connections_opened': mysql_status()[1] - opened,
+            }
+        return result
+
+    def slow_upload(self, port, seconds, stop):
+        """Start an upload and send its one chunk a piece at a time over ``seconds``"""
+        status, upload = self.request(port, 'POST', '/api/uploads/', {
+            'kind': 'step_file', 'filename': 'load-test.step', 'size': UPLOAD_SIZE,
+        })
+        if status != 201:
+            stop.wait(1)
+            return
+        piece = b'x' * (UPLOAD_SIZE // UPLOAD_PIECES)
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=130) as sock:
+                sock.sendall((
+                    f"PUT /api/uploads/{upload['id']}/ HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+                    f'Authorization: Bearer {self.token}\r\nUpload-Offset: 0\r\n'
+                    f'Content-Type: application/offset+octet-stream\r\nContent-Length: {UPLOAD_SIZE}\r\n'
+                    'Connection: close\r\n\r\n'
+                ).encode())
+                for _ in range(UPLOAD_PIECES):
+                    sock.sendall(piece)
+                    stop.wait(seconds / UPLOAD_PIECES)
+                while sock.recv(65536):
+                    pass
+        except OSError:
+            pass
+        finally:
+            self.request(port, 'DELETE', f"/api/uploads/{upload['id']}/")
+
+    def report(self, mode, result):
+        self.stdout.write(f"{'endpoint':<22}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for name, endpoint in result['endpoints'].items():
+            self.stdout.write(f"{name:<22}{endpoint['requests']:>9}{endpoint['errors']:>8}"
+                              f"{endpoint['p50']:>9.1f}{endpoint['p95']:>9.1f}{endpoint['p99']:>9.1f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode}: {result['requests']} requests, {result['throughput']:.1f} req/s, "
+            f"p50 {result['p50']:.1f} ms, p95 {result['p95']:.1f} ms, p99 {result['p99']:.1f} ms, "
+            f"{result['errors']} errors"
+        ))
+        if 'mysql' in result:
+            mysql = result['mysql']
+            self.stdout.write(f"MySQL Threads_connected max {mysql['threads_connected_max']}, "
+                              f"mean {mysql['threads_connected_mean']}; {mysql['connections_opened']} connections "
+                              f"opened ({mysql['connections_opened'] / max(result['requests'], 1):.2f} per request)")
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from orders.geometry import claim_next, process
+
+class Command(BaseCommand):
+    help = 'Worker that analyses queued order STEP files (bounding box, part count, surface area, preview)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty instead of polling')
+        parser.add_argument('--poll', type=float, default=5.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--limit', type=int, default=0, help='Stop after this many jobs (0 = no limit)')
+
+    def handle(self, *args, **options):
+        handled = 0
+        try:
+            while not options['limit'] or handled < options['limit']:
+                close_old_connections()
+                job = claim_next()
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+                ok = process(job)
+                handled += 1
+                self.stdout.write(f"Order {job.order_id}: {'done' if ok else 'failed, attempt %d' % job.attempts}")
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Processed {handled} geometry jobs'))
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from orders.models import OrderChange
+
+
+class Command(BaseCommand):
+    help = ('Delete order change-log rows older than --days, oldest first. Clients whose ?since= cursor '
+            'falls in the deleted range get 410 and reload the full list; the newest row is always kept.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ORDER_CHANGES_RETENTION_DAYS', 30))
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows deleted per statement')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # Delete a prefix of ids, so every cursor at or above the oldest kept row stays complete
+        last = (
+            OrderChange.objects.filter(timestamp__lt=cutoff, id__lt=OrderChange.latest_cursor())
+            .order_by('-id').values_list('id', flat=True).first()
+        )
+        count = 0
+        if last is not None and options['dry_run']:
+            count = OrderChange.objects.filter(id__lte=last).count()
+        elif last is not None:
+            while True:
+                batch = list(OrderChange.objects.filter(id__lte=last).values_list('id', flat=True)[:options['batch_size']])
+                if not batch:
+                    break
+                count += OrderChange.objects.filter(id__lte=batch[-1]).delete()[0]
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {count} order change rows older than {options["days"]} days'))
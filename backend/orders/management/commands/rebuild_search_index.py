@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from orders import searching
+
+class Command(BaseCommand):
+    help = 'Rebuild the order search index (the SearchTerm fallback; MySQL maintains its FULLTEXT indexes itself)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if searching.uses_fulltext():
+            self.stdout.write('MySQL searches through FULLTEXT indexes; nothing to rebuild')
+            return
+        with transaction.atomic():
+            orders, messages = searching.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {orders} orders and {messages} messages'))
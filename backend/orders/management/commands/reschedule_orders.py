@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from orders import scheduling
+from orders.models import Machine
+
+class Command(BaseCommand):
+    help = 'Replan machine production timelines from scratch (repairs slots after edits outside the order actions)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--machine', type=int, action='append', help='Only this machine id (repeatable)')
+
+    def handle(self, *args, **options):
+        machine_ids = options['machine'] or list(Machine.objects.values_list('pk', flat=True))
+        changed = 0
+        for machine_id in machine_ids:
+            with transaction.atomic():
+                changed += scheduling.rebuild(machine_id)
+        self.stdout.write(self.style.SUCCESS(f'Rescheduled {changed} orders on {len(machine_ids)} machines'))
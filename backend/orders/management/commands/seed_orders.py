@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from orders.seeding import seed
+
+class Command(BaseCommand):
+    help = 'Seed synthetic clients, suppliers, machines, orders and messages for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=100)
+        parser.add_argument('--suppliers', type=int, default=10)
+        parser.add_argument('--machines', type=int, default=50)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--messages-per-order', type=int, default=2)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for reproducible data')
+
+    def handle(self, *args, **options):
+        if options['clients'] < 1:
+            raise CommandError('At least one client is required to own the orders.')
+
+        def progress(done, total):
+            self.stdout.write(f'  {done}/{total} orders')
+
+        counts = seed(
+            clients=options['clients'],
+            suppliers=options['suppliers'],
+            machines=options['machines'],
+            orders=options['orders'],
+            messages_per_order=options['messages_per_order'],
+            random_seed=options['seed'],
+            progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS('Seeded ' + ', '.join(f'{count} {name}' for name, count in counts.items()))
+        )
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:54
+
+from django.db import migrations, models
+
+
+def backfill_latest_offer(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderMessage = apps.get_model('orders', 'OrderMessage')
+    for order in Order.objects.filter(messages__type='counter_offer').distinct():
+        offer = OrderMessage.objects.filter(order=order, type='counter_offer').order_by('-timestamp', '-id').first()
+        Order.objects.filter(pk=order.pk).update(
+            latest_offer_amount=offer.amount,
+            latest_offer_sender_role='admin' if offer.is_admin else 'client',
+            latest_offer_at=offer.timestamp,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_order_updated_at_orderchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='latest_offer_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='latest_offer_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='latest_offer_sender_role',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.RunPython(backfill_latest_offer, migrations.RunPython.noop),
+    ]
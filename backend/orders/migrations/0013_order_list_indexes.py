@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_order_latest_offer'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['date_submitted', 'id'], name='order_submitted_id'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['client', 'date_submitted'], name='order_client_submitted'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'date_submitted'], name='order_status_submitted'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['machine', 'date_submitted'], name='order_machine_submitted'),
+        ),
+    ]
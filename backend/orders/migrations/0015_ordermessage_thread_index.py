@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_machine_supplier_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ordermessage',
+            index=models.Index(fields=['order', 'timestamp', 'id'], name='ordermessage_order_ts_id'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0015_ordermessage_thread_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ordermessage',
+            index=models.Index(fields=['order', 'type', 'timestamp'], name='ordermessage_order_type_ts'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:07
+
+import orders.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0017_upload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='d2_draft_design',
+            field=models.FileField(storage=orders.storage.order_file_storage, upload_to='draft_designs/'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='step_file',
+            field=models.FileField(blank=True, null=True, storage=orders.storage.order_file_storage, upload_to='step_files/'),
+        ),
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='storedblob_gc')],
+            },
+        ),
+    ]
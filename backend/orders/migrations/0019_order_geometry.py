@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0018_stored_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderGeometry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('bbox_x', models.FloatField(blank=True, null=True)),
+                ('bbox_y', models.FloatField(blank=True, null=True)),
+                ('bbox_z', models.FloatField(blank=True, null=True)),
+                ('part_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('surface_area', models.FloatField(blank=True, null=True)),
+                ('preview', models.ImageField(blank=True, null=True, upload_to='geometry_previews/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='geometry', to='orders.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'updated_at'], name='ordergeometry_queue')],
+            },
+        ),
+    ]
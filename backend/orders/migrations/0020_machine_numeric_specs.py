@@ -0,0 +1,128 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:14
+
+import re
+
+from django.db import migrations, models
+
+# Frozen copy of orders.specs as of this migration, so later changes to the parser don't alter it
+# "3,000" (a comma before exactly three digits) is a thousands separator; "2,5" is a decimal comma
+_NUMBER = r'(\d{1,3}(?:,\d{3})+(?:\.\d+)?(?![\d,])|\d+(?:[.,]\d+)?)'
+_THOUSANDS = re.compile(r'\d{1,3}(?:,\d{3})+(?:\.\d+)?')
+_QUANTITY = re.compile(_NUMBER + r"\s*([a-zA-Z\"'µ]*)")
+
+POWER_UNITS = {'w': 1, 'watt': 1, 'watts': 1, 'kw': 1000, 'kilowatt': 1000, 'kilowatts': 1000}
+LENGTH_UNITS = {'mm': 1, 'cm': 10, 'm': 1000, 'in': 25.4, 'inch': 25.4, '"': 25.4, 'ft': 304.8, "'": 304.8}
+FORCE_UNITS = {'t': 1, 'ton': 1, 'tons': 1, 'tonne': 1, 'tonnes': 1, 'kn': 1 / 9.80665}
+
+
+def _number(value):
+    return float(value.replace(',', '') if _THOUSANDS.fullmatch(value) else value.replace(',', '.'))
+
+
+def _numbers(text):
+    return [(_number(value), unit.lower()) for value, unit in _QUANTITY.findall(text or '')]
+
+
+def _convert(value, unit, units, default_unit):
+    factor = units.get(unit) if unit else units[default_unit]
+    return value * factor if factor is not None else None
+
+
+def parse_power(text):
+    numbers = _numbers(text)
+    if not numbers:
+        return None
+    value, unit = numbers[0]
+    if not unit:
+        return value * 1000 if value < 100 else value
+    return _convert(value, unit, POWER_UNITS, 'w')
+
+
+def parse_length(text):
+    numbers = _numbers(text)
+    if not numbers:
+        return None
+    value, unit = numbers[0]
+    if not unit:
+        return value * 1000 if value < 20 else value
+    return _convert(value, unit, LENGTH_UNITS, 'mm')
+
+
+def parse_bed_size(text):
+    parts = re.split(r'\s*(?:x|×|\*|by)\s*', (text or '').lower())
+    numbers = [_numbers(part) for part in parts]
+    numbers = [found[0] for found in numbers if found][:2]
+    if len(numbers) != 2:
+        return None, None
+    trailing_unit = numbers[1][1]
+    sides = []
+    for value, unit in numbers:
+        unit = unit or trailing_unit
+        if not unit:
+            sides.append(value * 1000 if value < 20 else value)
+        else:
+            sides.append(_convert(value, unit, LENGTH_UNITS, 'mm'))
+    if None in sides:
+        return None, None
+    return max(sides), min(sides)
+
+
+def parse_force(text):
+    numbers = _numbers(text)
+    if not numbers:
+        return None
+    value, unit = numbers[0]
+    return _convert(value, unit, FORCE_UNITS, 't')
+
+
+def parse_machine_specs(machine):
+    bed_width, bed_depth = parse_bed_size(machine.bed_size)
+    return {
+        'capacity_watts': parse_power(machine.capacity),
+        'bed_width_mm': bed_width,
+        'bed_depth_mm': bed_depth,
+        'tonnage_tons': parse_force(machine.tonnage),
+        'bed_length_mm': parse_length(machine.bed_length),
+    }
+
+
+def parse_existing_specs(apps, schema_editor):
+    Machine = apps.get_model('orders', 'Machine')
+    for machine in Machine.objects.all():
+        Machine.objects.filter(pk=machine.pk).update(**parse_machine_specs(machine))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0019_order_geometry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='machine',
+            name='bed_depth_mm',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='machine',
+            name='bed_length_mm',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='machine',
+            name='bed_width_mm',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='machine',
+            name='capacity_watts',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='machine',
+            name='tonnage_tons',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(parse_existing_specs, migrations.RunPython.noop),
+    ]
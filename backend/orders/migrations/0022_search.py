@@ -0,0 +1,107 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:31
+
+import math
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of the orders.searching tokenizer and weights as of this migration
+ORDER_FIELDS = {
+    'part_id': 4.0,
+    'product_description': 1.0,
+    'material_type': 2.0,
+    'material_grade': 2.0,
+    'material_thickness': 1.0,
+}
+MESSAGE_WEIGHT = 0.5
+MAX_TERM_LENGTH = 64
+
+_TOKEN = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in _TOKEN.findall((text or '').lower())]
+
+
+def _weights(counts, weight):
+    return {term: weight * (1 + math.log(count)) for term, count in counts.items()}
+
+
+def order_postings(order):
+    weights = Counter()
+    for field, weight in ORDER_FIELDS.items():
+        weights.update(_weights(Counter(tokenize(getattr(order, field))), weight))
+    return dict(weights)
+
+
+def message_postings(message):
+    return _weights(Counter(tokenize(message.message)), MESSAGE_WEIGHT)
+
+FULLTEXT_INDEXES = [
+    ('order', 'order_fulltext', list(ORDER_FIELDS)),
+    ('ordermessage', 'ordermessage_fulltext', ['message']),
+]
+
+
+def create_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    quote = schema_editor.quote_name
+    for model_name, name, fields in FULLTEXT_INDEXES:
+        model = apps.get_model('orders', model_name)
+        columns = ', '.join(quote(model._meta.get_field(field).column) for field in fields)
+        schema_editor.execute(f'CREATE FULLTEXT INDEX {quote(name)} ON {quote(model._meta.db_table)} ({columns})')
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    quote = schema_editor.quote_name
+    for model_name, name, _ in FULLTEXT_INDEXES:
+        model = apps.get_model('orders', model_name)
+        schema_editor.execute(f'DROP INDEX {quote(name)} ON {quote(model._meta.db_table)}')
+
+
+def index_existing(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        return
+    Order = apps.get_model('orders', 'Order')
+    OrderMessage = apps.get_model('orders', 'OrderMessage')
+    SearchTerm = apps.get_model('orders', 'SearchTerm')
+    SearchTerm.objects.bulk_create((
+        SearchTerm(term=term, order_id=order.pk, weight=weight)
+        for order in Order.objects.only('id', *ORDER_FIELDS).iterator()
+        for term, weight in order_postings(order).items()
+    ), batch_size=2000)
+    SearchTerm.objects.bulk_create((
+        SearchTerm(term=term, order_id=message.order_id, message_id=message.pk, weight=weight)
+        for message in OrderMessage.objects.only('id', 'order_id', 'message').iterator()
+        for term, weight in message_postings(message).items()
+    ), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0021_order_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='orders.ordermessage')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='orders.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'order'], name='searchterm_term_order')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_indexes, drop_fulltext_indexes),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
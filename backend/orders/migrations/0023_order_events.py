@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0022_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(max_length=32)),
+                ('from_status', models.CharField(choices=[('under_review', 'Under Review'), ('negotiation', 'Negotiation'), ('awaiting_payment', 'Awaiting Payment'), ('accepted', 'Accepted'), ('in_production', 'In Production'), ('completed', 'Completed'), ('rejected', 'Rejected')], max_length=20)),
+                ('to_status', models.CharField(choices=[('under_review', 'Under Review'), ('negotiation', 'Negotiation'), ('awaiting_payment', 'Awaiting Payment'), ('accepted', 'Accepted'), ('in_production', 'In Production'), ('completed', 'Completed'), ('rejected', 'Rejected')], max_length=20)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_events', to=settings.AUTH_USER_MODEL)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='orders.order')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:40
+
+import time
+
+from django.db import migrations, models
+
+
+def seed_versions(apps, schema_editor):
+    ReferenceVersion = apps.get_model('orders', 'ReferenceVersion')
+    version = time.time_ns()
+    ReferenceVersion.objects.bulk_create([
+        ReferenceVersion(namespace=namespace, version=version) for namespace in ('machines', 'suppliers')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0025_replication_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceVersion',
+            fields=[
+                ('namespace', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(seed_versions, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,12 @@
+import uuid
+from datetime import timedelta
+
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .storage import order_file_storage
 
 # Create your models here.
 
@@ -9,6 +16,7 @@ class Supplier(models.Model):
     email = models.EmailField(blank=True)
     phone = models.CharField(max_length=20, blank=True)
     address = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -29,7 +37,15 @@ class Machine(models.Model):
     tonnage = models.CharField(max_length=100, blank=True)   # For bending, punch
     bed_length = models.CharField(max_length=100, blank=True) # For bending
     
+    # Numeric values parsed from the free-text fields above (see orders.specs)
+    capacity_watts = models.FloatField(null=True, blank=True, editable=False)
+    bed_width_mm = models.FloatField(null=True, blank=True, editable=False)
+    bed_depth_mm = models.FloatField(null=True, blank=True, editable=False)
+    tonnage_tons = models.FloatField(null=True, blank=True, editable=False)
+    bed_length_mm = models.FloatField(null=True, blank=True, editable=False)
+
     photo = models.ImageField(upload_to='machine_photos/', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.supplier.name})"
@@ -49,8 +65,8 @@ class Order(models.Model):
     client = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='orders')
     part_id = models.CharField(max_length=32, unique=True)  # NEW FIELD
     product_description = models.TextField()
-    step_file = models.FileField(upload_to='step_files/', blank=True, null=True)  # Now optional
-    d2_draft_design = models.FileField(upload_to='draft_designs/', blank=False, null=False)  # NEW FIELD, required
+    step_file = models.FileField(upload_to='step_files/', storage=order_file_storage, blank=True, null=True)  # Now optional
+    d2_draft_design = models.FileField(upload_to='draft_designs/', storage=order_file_storage, blank=False, null=False)  # NEW FIELD, required
     quantity = models.PositiveIntegerField()
     material_thickness = models.CharField(max_length=100)
     material_type = models.CharField(max_length=100)
@@ -60,6 +76,7 @@ class Order(models.Model):
     target_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # NEW FIELD
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='under_review')
     date_submitted = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     expected_completion_date = models.DateField(null=True, blank=True)
     machine = models.ForeignKey(Machine, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
     
@@ -70,6 +87,11 @@ class Order(models.Model):
     actual_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     agreed_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # NEW: agreed price after negotiation
     payment_confirmed = models.BooleanField(default=False)  # NEW: payment confirmation flag
+
+    # Latest counter offer, denormalized from OrderMessage so lists need no per-order lookup
+    latest_offer_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    latest_offer_sender_role = models.CharField(max_length=10, blank=True)
+    latest_offer_at = models.DateTimeField(null=True, blank=True)
     
     # Timestamps for status changes
     date_accepted = models.DateTimeField(null=True, blank=True)
@@ -77,11 +99,24 @@ class Order(models.Model):
     date_completed = models.DateTimeField(null=True, blank=True)
     date_rejected = models.DateTimeField(null=True, blank=True)
 
+    # Slot on the assigned machine's production timeline, maintained by orders.scheduling
+    estimated_hours = models.FloatField(null=True, blank=True)
+    scheduled_start = models.DateTimeField(null=True, blank=True)
+    scheduled_end = models.DateTimeField(null=True, blank=True)
+
     def __str__(self):
         return f"Order {self.id} by {self.client.email} - {self.status}"
 
     class Meta:
         ordering = ['-date_submitted']
+        indexes = [
+            # Match the list filters, each ordered by submission date for keyset pagination
+            models.Index(fields=['date_submitted', 'id'], name='order_submitted_id'),
+            models.Index(fields=['client', 'date_submitted'], name='order_client_submitted'),
+            models.Index(fields=['status', 'date_submitted'], name='order_status_submitted'),
+            models.Index(fields=['machine', 'date_submitted'], name='order_machine_submitted'),
+            models.Index(fields=['machine', 'scheduled_start'], name='order_machine_schedule'),
+        ]
 
 class OrderMessage(models.Model):
     MESSAGE_TYPE_CHOICES = [
@@ -102,3 +137,206 @@ class OrderMessage(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Keyset scans for ?after_id= / ?before_id= within one order's thread
+            models.Index(fields=['order', 'timestamp', 'id'], name='ordermessage_order_ts_id'),
+            # Latest counter offer / system messages of one order
+            models.Index(fields=['order', 'type', 'timestamp'], name='ordermessage_order_type_ts'),
+        ]
+
+
+class OrderChange(models.Model):
+    """Append-only log of order writes; its id is the cursor for ``?since=`` delta sync.
+
+    prune_order_changes trims it to ``ORDER_CHANGES_RETENTION_DAYS``.
+    """
+    order_id = models.BigIntegerField()  # Plain column so tombstones outlive the order row
+    client_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Change {self.id} on Order {self.order_id}{' (deleted)' if self.deleted else ''}"
+
+    @classmethod
+    def latest_cursor(cls):
+        return cls.objects.aggregate(cursor=models.Max('id'))['cursor'] or 0
+
+    @classmethod
+    async def alatest_cursor(cls):
+        return (await cls.objects.aaggregate(cursor=models.Max('id')))['cursor'] or 0
+
+    @classmethod
+    def settle_cutoff(cls):
+        """Rows logged before this belong to transactions that have finished.
+
+        Ids are handed out at insert but rows show up at commit, so a row can
+        appear after a higher id was already read. Sync cursors therefore stop
+        before ``ORDER_CHANGES_SETTLE_SECONDS`` and the newer rows are sent again.
+        """
+        return timezone.now() - timedelta(seconds=getattr(settings, 'ORDER_CHANGES_SETTLE_SECONDS', 5))
+
+    @classmethod
+    def settled_cursor(cls):
+        """Sync cursor for a full list: the newest change older than the settle window"""
+        changes = cls.objects.filter(timestamp__lte=cls.settle_cutoff()).order_by('-id')
+        return changes.values_list('id', flat=True).first() or 0
+
+    @classmethod
+    async def asettled_cursor(cls):
+        changes = cls.objects.filter(timestamp__lte=cls.settle_cutoff()).order_by('-id')
+        return await changes.values_list('id', flat=True).afirst() or 0
+
+    @classmethod
+    async def aoldest_cursor(cls):
+        """Lowest ``?since=`` the retained log still answers (see prune_order_changes)"""
+        first = await cls.objects.order_by('id').values_list('id', flat=True).afirst()
+        return 0 if first is None else first - 1
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['client_id', 'id'], name='orderchange_client_cursor'),
+        ]
+
+
+class ReplicationHeartbeat(models.Model):
+    """One row the lag checks of backend/replicas.py stamp on the primary.
+
+    A replica's copy of the stamp shows how far its replication trails.
+    """
+    timestamp = models.DateTimeField()
+
+
+class ReferenceVersion(models.Model):
+    """Version token of a cached reference collection (``orders.caching``), replaced by every write to it."""
+    namespace = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField()
+
+
+class PublishedEvent(models.Model):
+    """An order or message event on its way to the /api/events/ streams of every worker (``orders.events.DatabaseBroker``)."""
+    channels = models.CharField(max_length=255)  # Space separated, e.g. 'admin client:7'
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Event {self.id} to {self.channels}"
+
+    class Meta:
+        ordering = ['id']
+
+
+class OrderEvent(models.Model):
+    """A status transition of an order (see ``orders.transitions``): what moved it, from where, by whom."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    event = models.CharField(max_length=32)  # Transition name, e.g. 'confirm_payment'
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_events')
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.from_status} -> {self.to_status} ({self.event})"
+
+    class Meta:
+        ordering = ['id']
+
+
+class Upload(models.Model):
+    """A resumable chunked upload of an order design file; orders reference it by id once complete."""
+    KIND_CHOICES = [
+        ('step_file', 'STEP File'),
+        ('d2_draft_design', '2D Draft Design'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('complete', 'Complete'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='uploads')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()  # Declared total length in bytes
+    offset = models.BigIntegerField(default=0)  # Bytes received so far
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    stored_name = models.CharField(max_length=255, blank=True)  # Storage name once finalized
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.filename}, {self.offset}/{self.size})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='upload_status_updated'),
+        ]
+
+
+class StoredBlob(models.Model):
+    """A deduplicated design file in ContentAddressedStorage; ref_count is the number of order fields using it."""
+    name = models.CharField(max_length=255, unique=True)  # Storage name, blobs/<aa>/<sha256><ext>
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at'], name='storedblob_gc'),
+        ]
+
+
+class OrderGeometry(models.Model):
+    """Geometry extracted from an order's STEP file; pending rows double as the worker queue."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='geometry')
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)  # Of the analysed step_file
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    locked_at = models.DateTimeField(null=True, blank=True)  # When a worker claimed it
+    error = models.TextField(blank=True)
+    # Results, in millimetres; None where the file does not allow computing them
+    bbox_x = models.FloatField(null=True, blank=True)
+    bbox_y = models.FloatField(null=True, blank=True)
+    bbox_z = models.FloatField(null=True, blank=True)
+    part_count = models.PositiveIntegerField(null=True, blank=True)
+    surface_area = models.FloatField(null=True, blank=True)  # mm²
+    preview = models.ImageField(upload_to='geometry_previews/', null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Geometry of Order {self.order_id} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='ordergeometry_queue'),
+        ]
+
+
+class SearchTerm(models.Model):
+    """Posting of the inverted index behind order search on databases without FULLTEXT (see orders.searching)."""
+    term = models.CharField(max_length=64)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='search_terms')
+    # Set for terms from a chat message, null for terms from the order's own fields
+    message = models.ForeignKey(OrderMessage, on_delete=models.CASCADE, null=True, blank=True, related_name='search_terms')
+    weight = models.FloatField()
+
+    def __str__(self):
+        return f"{self.term} in Order {self.order_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'order'], name='searchterm_term_order'),
+        ]
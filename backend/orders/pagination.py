@@ -0,0 +1,19 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OrderCursorPagination(CursorPagination):
+    """Keyset pagination over (date_submitted, id), newest first.
+
+    Opt-in: only requests carrying ``?cursor=`` or ``?page_size=`` are paginated,
+    so existing callers keep receiving a bare list.
+    """
+    ordering = ('-date_submitted', '-id')
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
@@ -0,0 +1,143 @@
+"""In-memory machine capability index and order → machine ranking.
+
+The index holds, per (machine type, material), the machines sorted by the
+thickest sheet they can process, so finding every machine able to handle an
+order is a bisect plus a slice. It is rebuilt (one query) whenever the
+``machines`` reference-cache version changes, i.e. after any machine or
+supplier write, and otherwise lives for the life of the process.
+
+Ranking combines how well the order uses the machine (thickness / max
+thickness: a 1 mm job should not tie up a 20 kW laser) with its current
+load from one aggregate query over active orders.
+"""
+import bisect
+import threading
+
+from django.db.models import Count
+
+from .caching import get_version
+from .models import Machine, Order
+from .scheduling import ACTIVE_STATUSES
+from .specs import MATERIALS, material_key, max_thickness, parse_thickness
+
+FIT_WEIGHT = 0.6
+LOAD_WEIGHT = 0.4
+
+
+class CapabilityIndex:
+    def __init__(self, machines):
+        self.machines = {}
+        self.by_capability = {}  # (type, material) -> (sorted thicknesses, machine ids in the same order)
+        self.unrated = {}  # type -> ids of machines whose specs could not be parsed
+        buckets = {}
+        for machine in machines:
+            self.machines[machine['id']] = machine
+            for material in MATERIALS:
+                ceiling = max_thickness(machine['type'], machine, material)
+                if ceiling is None:
+                    continue
+                buckets.setdefault((machine['type'], material), []).append((ceiling, machine['id']))
+            if all(max_thickness(machine['type'], machine, material) is None for material in MATERIALS):
+                self.unrated.setdefault(machine['type'], []).append(machine['id'])
+        for key, entries in buckets.items():
+            entries.sort()
+            self.by_capability[key] = ([ceiling for ceiling, _ in entries], [machine_id for _, machine_id in entries])
+
+    def capable(self, machine_type, material, thickness):
+        """(machine id, max thickness) for every machine of ``machine_type`` that handles ``thickness`` mm"""
+        limits, ids = self.by_capability.get((machine_type, material), ([], []))
+        start = bisect.bisect_left(limits, thickness)
+        return zip(ids[start:], limits[start:])
+
+    @property
+    def types(self):
+        return sorted({machine['type'] for machine in self.machines.values()})
+
+
+_lock = threading.Lock()
+_index = (None, None)
+
+
+def load_index():
+    return CapabilityIndex(
+        Machine.objects.values(
+            'id', 'name', 'type', 'make', 'supplier_id', 'supplier__name',
+            'capacity_watts', 'bed_width_mm', 'bed_depth_mm', 'tonnage_tons', 'bed_length_mm',
+        )
+    )
+
+
+def get_index():
+    global _index
+    version = get_version('machines')
+    if _index[0] != version:
+        with _lock:
+            if _index[0] != version:
+                _index = (version, load_index())
+    return _index[1]
+
+
+def machine_loads():
+    return dict(
+        Order.objects.filter(status__in=ACTIVE_STATUSES, machine__isnull=False)
+        .order_by().values_list('machine_id').annotate(count=Count('id'))
+    )
+
+
+def recommend(order, machine_type=None, limit=10):
+    """Ranked machines able to process ``order``; unrated machines are listed after the rated ones.
+
+    Raises ValueError when the order's thickness cannot be read.
+    """
+    thickness = parse_thickness(order.material_thickness)
+    if not thickness:
+        raise ValueError(f'Cannot read material thickness {order.material_thickness!r}')
+    material = material_key(order.material_type)
+    index = get_index()
+    types = [machine_type] if machine_type else index.types
+    loads = machine_loads()
+
+    candidates = {}
+    for kind in types:
+        # Unknown materials must fit the most demanding one
+        materials = [material] if material else list(MATERIALS)
+        capable = None
+        for key in materials:
+            found = dict(index.capable(kind, key, thickness))
+            capable = found if capable is None else {
+                machine_id: min(ceiling, found[machine_id]) for machine_id, ceiling in capable.items() if machine_id in found
+            }
+        candidates.update(capable or {})
+
+    ranked = []
+    for machine_id, ceiling in candidates.items():
+        fit = min(thickness / ceiling, 1.0)
+        load = loads.get(machine_id, 0)
+        ranked.append((FIT_WEIGHT * fit + LOAD_WEIGHT / (1 + load), machine_id, ceiling, fit, load))
+    ranked.sort(key=lambda entry: (-entry[0], entry[1]))
+
+    results = [_result(index, machine_id, score, ceiling, fit, load)
+               for score, machine_id, ceiling, fit, load in ranked[:limit]]
+    if len(results) < limit:
+        for kind in types:
+            for machine_id in index.unrated.get(kind, []):
+                if len(results) >= limit:
+                    break
+                results.append(_result(index, machine_id, None, None, None, loads.get(machine_id, 0)))
+    return {'material': material, 'thickness_mm': thickness, 'machines': results}
+
+
+def _result(index, machine_id, score, ceiling, fit, load):
+    machine = index.machines[machine_id]
+    return {
+        'id': machine_id,
+        'name': machine['name'],
+        'type': machine['type'],
+        'make': machine['make'],
+        'supplier': machine['supplier_id'],
+        'supplier_name': machine['supplier__name'],
+        'max_thickness_mm': round(ceiling, 2) if ceiling is not None else None,
+        'fit': round(fit, 3) if fit is not None else None,
+        'active_orders': load,
+        'score': round(score, 3) if score is not None else None,
+    }
@@ -0,0 +1,76 @@
+"""Resized WebP/JPEG renditions of machine photos.
+
+Renditions are written next to the originals as
+``machine_photos/renditions/<photo file name>/w<width>.<ext>`` when a photo
+is saved (see the Machine signals) or by ``backfill_machine_photos``. The
+directory keeps the photo's extension, so ``cnc.jpg`` and ``cnc.png`` get
+their own renditions. Serializers only advertise renditions that were
+written; until then clients get the original photo.
+"""
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+SIZES = {'small': 160, 'medium': 480, 'large': 960}  # Max width in pixels
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+QUALITY = 80
+
+
+def rendition_name(photo_name, width, extension):
+    directory, filename = os.path.split(photo_name)
+    return f'{directory}/renditions/{filename}/w{width}.{extension}'
+
+
+def rendition_names(photo_name):
+    """{size: {'width': w, 'webp': name, 'jpeg': name}} for every configured rendition"""
+    return {
+        size: {'width': width, **{extension: rendition_name(photo_name, width, extension) for extension in FORMATS}}
+        for size, width in SIZES.items()
+    }
+
+
+def existing_rendition_names(photo_name, storage=default_storage):
+    """``rendition_names(photo_name)`` once every rendition is on disk, else None"""
+    names = rendition_names(photo_name)
+    for entry in names.values():
+        if not all(storage.exists(entry[extension]) for extension in FORMATS):
+            return None
+    return names
+
+
+def _encode(image, width, image_format):
+    copy = image.copy()
+    copy.thumbnail((width, width * 4))  # Bound by width only; never upscales
+    if image_format == 'JPEG' and copy.mode not in ('RGB', 'L'):
+        background = Image.new('RGB', copy.size, 'white')
+        background.paste(copy, mask=copy.convert('RGBA').getchannel('A'))
+        copy = background
+    buffer = io.BytesIO()
+    copy.save(buffer, format=image_format, quality=QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def generate(photo_name, storage=default_storage, overwrite=False):
+    """Write the missing renditions of ``photo_name``; returns how many files were written."""
+    targets = [
+        (rendition_name(photo_name, width, extension), width, image_format)
+        for width in SIZES.values()
+        for extension, image_format in FORMATS.items()
+    ]
+    if not overwrite:
+        targets = [target for target in targets if not storage.exists(target[0])]
+    if not targets:
+        return 0
+    with storage.open(photo_name, 'rb') as handle:
+        image = ImageOps.exif_transpose(Image.open(handle))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    for name, width, image_format in targets:
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(_encode(image, width, image_format)))
+    return len(targets)
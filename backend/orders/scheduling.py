@@ -0,0 +1,266 @@
+"""Per-machine production timelines.
+
+Every order with a machine in an active status (awaiting payment, accepted,
+in production) holds a ``[scheduled_start, scheduled_end)`` slot on that
+machine. Slots are kept back to back in queue order, so each change is
+local: appending reads the machine's tail, and taking orders off the
+timeline or moving them to the front shifts the slots behind them with one
+read and one bulk write instead of replanning the machine, however many
+orders (and machines) a bulk action touches. ``rebuild`` replans a machine
+from scratch; ``reschedule_orders`` runs it to repair timelines after edits
+made outside these hooks (bulk updates, deleted machines).
+
+The functions take lists of orders and leave saving them to the caller,
+who holds a transaction: they lock the machine rows so two requests cannot
+both claim the same tail.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from .models import Machine, Order
+from .signals import record_order_changes
+from .specs import parse_thickness
+
+ACTIVE_STATUSES = ['awaiting_payment', 'accepted', 'in_production']
+# (setup hours, minutes per part) by machine type
+RUN_RATES = {'laser': (0.5, 2.0), 'bending': (1.0, 1.5), 'punch': (0.5, 0.5)}
+DEFAULT_RATE = (1.0, 2.0)  # Unknown type: assume the slowest
+LASER_REFERENCE_MM = 3  # Laser cut time grows roughly linearly with thickness beyond this
+SCHEDULE_FIELDS = ['estimated_hours', 'scheduled_start', 'scheduled_end']
+
+
+def estimate_hours(order, machine_type=None):
+    """Machine hours to produce ``order``: setup plus a per-part time for the machine type"""
+    setup, minutes = RUN_RATES.get(machine_type, DEFAULT_RATE)
+    if machine_type == 'laser':
+        minutes *= max(1.0, (parse_thickness(order.material_thickness) or 0) / LASER_REFERENCE_MM)
+    return round(setup + order.quantity * minutes / 60, 2)
+
+
+def wall_time(hours):
+    """Calendar time the machine needs for ``hours`` of work"""
+    return timedelta(hours=hours * 24 / settings.PRODUCTION_HOURS_PER_DAY)
+
+
+def timeline(machine_id):
+    return Order.objects.filter(machine_id=machine_id, status__in=ACTIVE_STATUSES, scheduled_start__isnull=False)
+
+
+def _lock(machine_ids):
+    list(Machine.objects.select_for_update().filter(pk__in=machine_ids).values_list('pk'))
+
+
+def _hours(order):
+    if order.estimated_hours is None:
+        order.estimated_hours = estimate_hours(order, order.machine.type)
+    return order.estimated_hours
+
+
+def _release(orders, now):
+    """Clear the slots of ``orders``; returns ``(machine_id, old end, time given back)`` for ``_reflow``.
+
+    A running order frees its machine from ``now``: finishing early gives time
+    back, overrunning gives a negative amount.
+    """
+    freed = []
+    for order in orders:
+        if order.machine_id and order.scheduled_end:
+            freed.append((order.machine_id, order.scheduled_end, order.scheduled_end - max(order.scheduled_start, now)))
+        order.scheduled_start = order.scheduled_end = None
+    return freed
+
+
+def _reflow(now, freed=(), front=None, exclude=()):
+    """Shift the queued slots of the affected machines in one read and one write.
+
+    Each slot moves forward by the time ``freed`` ahead of it and back by the
+    work inserted at the front of its machine (``front``: machine id ->
+    timedelta from ``now``). Running orders stay put.
+    """
+    front = front or {}
+    gaps = {}
+    for machine_id, end, span in freed:
+        gaps.setdefault(machine_id, []).append((end, span))
+    machine_ids = set(gaps) | set(front)
+    if not machine_ids:
+        return
+    queued = {}
+    rows = (
+        Order.objects.filter(machine_id__in=machine_ids, status__in=ACTIVE_STATUSES, scheduled_start__isnull=False)
+        .exclude(status='in_production').exclude(pk__in=exclude)
+        .only('id', 'client_id', 'machine_id', 'scheduled_start', 'scheduled_end')
+    )
+    for row in rows:
+        queued.setdefault(row.machine_id, []).append(row)
+    changed = []
+    for machine_id, slots in queued.items():
+        ahead = front.get(machine_id, timedelta(0))
+        offsets = [
+            ahead - sum((span for end, span in gaps.get(machine_id, ()) if slot.scheduled_start >= end), timedelta(0))
+            for slot in slots
+        ]
+        if ahead:
+            # Slots already due to start still go behind the inserted work
+            first = min(range(len(slots)), key=lambda i: slots[i].scheduled_start)
+            extra = max(timedelta(0), now + ahead - (slots[first].scheduled_start + offsets[first]))
+            offsets = [offset + extra for offset in offsets]
+        for slot, offset in zip(slots, offsets):
+            if offset:
+                slot.scheduled_start += offset
+                slot.scheduled_end += offset
+                changed.append(slot)
+    Order.objects.bulk_update(changed, ['scheduled_start', 'scheduled_end'])
+    record_order_changes(changed)
+
+
+def _append(orders, machine_id, now):
+    tail = timeline(machine_id).exclude(pk__in=[order.pk for order in orders]).aggregate(end=Max('scheduled_end'))['end']
+    cursor = max(now, tail) if tail else now
+    for order in orders:
+        order.scheduled_start = cursor
+        order.scheduled_end = cursor = cursor + wall_time(_hours(order))
+
+
+def _place_front(orders, now):
+    """Back-to-back slots from ``now`` per machine; returns the ``front`` mapping for ``_reflow``"""
+    front = {}
+    for order in orders:
+        order.scheduled_start = now + front.get(order.machine_id, timedelta(0))
+        order.scheduled_end = order.scheduled_start + wall_time(_hours(order))
+        front[order.machine_id] = order.scheduled_end - now
+    return front
+
+
+def remove(orders, now=None):
+    """Take ``orders`` off their machines' timelines and close the gaps behind them."""
+    now = now or timezone.now()
+    _lock({order.machine_id for order in orders if order.scheduled_end})
+    _reflow(now, _release(orders, now), exclude=[order.pk for order in orders])
+
+
+def assign(orders, machine, hours=None, now=None):
+    """Move ``orders`` onto ``machine``'s timeline (off any other), re-estimating their run time.
+
+    Set each ``order.status`` first: orders outside the active statuses only give up their slot.
+    Running orders go to the front of the queue, the rest to its tail.
+    """
+    now = now or timezone.now()
+    machine_id = getattr(machine, 'pk', None)
+    moving = [order for order in orders if order.machine_id != machine_id or hours is not None]
+    leaving = [
+        order for order in orders
+        if order.scheduled_end and (order in moving or machine is None or order.status not in ACTIVE_STATUSES)
+    ]
+    _lock({order.machine_id for order in leaving} | ({machine_id} if machine_id else set()))
+    freed = _release(leaving, now)
+    for order in moving:
+        order.estimated_hours = hours
+    for order in orders:
+        order.machine = machine
+    placing = [] if machine is None else [
+        order for order in orders if order.status in ACTIVE_STATUSES and order.scheduled_end is None
+    ]
+    running = [order for order in placing if order.status == 'in_production']
+    _reflow(now, freed, _place_front(running, now), exclude=[order.pk for order in orders])
+    queued = [order for order in placing if order.status != 'in_production']
+    if queued:
+        _append(queued, machine_id, now)
+
+
+def start(orders, now=None):
+    """Production starts now: move ``orders`` to the front of their machines' queues."""
+    now = now or timezone.now()
+    _lock({order.machine_id for order in orders})
+    freed = _release(orders, now)
+    _reflow(now, freed, _place_front(orders, now), exclude=[order.pk for order in orders])
+
+
+def complete(order, now=None):
+    """Close ``order``'s slot at ``now``, pulling the rest of the queue forward (or back, if it overran)."""
+    now = now or timezone.now()
+    if order.machine_id and order.scheduled_end:
+        _lock({order.machine_id})
+        _reflow(now, _release([order], now), exclude=[order.pk])
+        order.scheduled_start = order.date_production_started or now
+        order.scheduled_end = now
+
+
+def machine_tails():
+    """``[(machine type, end of its last slot or None)]`` for every machine"""
+    return list(Machine.objects.annotate(tail=Max(
+        'orders__scheduled_end', filter=Q(orders__status__in=ACTIVE_STATUSES),
+    )).values_list('type', 'tail'))
+
+
+def earliest_completion(order, now=None, tails=None):
+    """Soonest ``order`` could be done on any machine, for approvals without a machine
+
+    Pass ``tails`` from ``machine_tails()`` to estimate many orders with one query.
+    """
+    now = now or timezone.now()
+    tails = machine_tails() if tails is None else tails
+    finishes = [max(now, tail or now) + wall_time(estimate_hours(order, kind)) for kind, tail in tails]
+    return min(finishes, default=now + wall_time(estimate_hours(order)))
+
+
+def conflicts(order, previous_end, now):
+    """Problems with ``order``'s slot: overlap with the slot before, missed promise date, overrun"""
+    found = []
+    if order.scheduled_start is None:
+        return ['unscheduled']
+    if previous_end and order.scheduled_start < previous_end:
+        found.append('overlap')
+    if order.expected_completion_date and order.scheduled_end.date() > order.expected_completion_date:
+        found.append('late')
+    if order.status == 'in_production' and order.scheduled_end < now:
+        found.append('overrun')
+    return found
+
+
+def queue(machine_id, now=None):
+    """Active orders on ``machine_id`` in timeline order, each annotated with ``conflicts``"""
+    now = now or timezone.now()
+    orders = list(
+        Order.objects.filter(machine_id=machine_id, status__in=ACTIVE_STATUSES)
+        .order_by(F('scheduled_start').asc(nulls_last=True), 'id')
+    )
+    previous_end = None
+    for order in orders:
+        order.conflicts = conflicts(order, previous_end, now)
+        if order.scheduled_end:
+            previous_end = max(previous_end, order.scheduled_end) if previous_end else order.scheduled_end
+    return orders
+
+
+def rebuild(machine_id, now=None):
+    """Replan ``machine_id`` from scratch: running orders from their start, then the queue in its current order.
+
+    Returns the number of orders whose slot changed.
+    """
+    now = now or timezone.now()
+    _lock({machine_id})
+    orders = list(Order.objects.filter(machine_id=machine_id, status__in=ACTIVE_STATUSES).select_related('machine'))
+    far = now + timedelta(days=36500)
+    orders.sort(key=lambda order: (
+        order.status != 'in_production', order.scheduled_start or far, order.date_accepted or order.date_submitted, order.pk,
+    ))
+    cursor = now
+    changed = []
+    for order in orders:
+        before = (order.estimated_hours, order.scheduled_start, order.scheduled_end)
+        if order.status == 'in_production':
+            # Running orders keep their actual start; they may overlap, which queue() reports
+            order.scheduled_start = order.date_production_started or order.scheduled_start or now
+            order.scheduled_end = order.scheduled_start + wall_time(_hours(order))
+            cursor = max(cursor, order.scheduled_end)
+        else:
+            order.scheduled_start = cursor
+            order.scheduled_end = cursor = cursor + wall_time(_hours(order))
+        if (order.estimated_hours, order.scheduled_start, order.scheduled_end) != before:
+            changed.append(order)
+    Order.objects.bulk_update(changed, SCHEDULE_FIELDS)
+    record_order_changes(changed)
+    return len(changed)
@@ -0,0 +1,293 @@
+"""Full-text search over orders and their chat messages.
+
+On MySQL the FULLTEXT indexes from migration 0022 do the work: one boolean
+mode ``MATCH ... AGAINST`` over the order columns and one over
+``OrderMessage.message``, summed per order. Other databases (SQLite in
+development) use ``SearchTerm``, an inverted index of (term, order) postings
+kept current by the order and message signals and ranked by tf-idf. Either
+way a query reads the postings of its terms rather than every order, so
+search time follows the number of matches, not the size of the tables.
+
+Every query term must match, as a prefix once it is ``PREFIX_MIN`` long.
+On MySQL all terms must match within the order's fields or within a single
+message; the fallback index also accepts terms spread across them.
+"""
+import html
+import math
+import re
+from collections import Counter
+
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, IntegerField, Max, Q, Sum, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Order, OrderMessage, SearchTerm
+
+# Indexed order fields and their weight in the fallback ranking
+ORDER_FIELDS = {
+    'part_id': 4.0,
+    'product_description': 1.0,
+    'material_type': 2.0,
+    'material_grade': 2.0,
+    'material_thickness': 1.0,
+}
+MESSAGE_WEIGHT = 0.5
+MAX_TERMS = 8
+MAX_TERM_LENGTH = 64  # SearchTerm.term
+PREFIX_MIN = 3
+MAX_EXPANSIONS = 50  # Index terms a prefix may stand for, most common first
+MYSQL_MIN_TOKEN = 3  # innodb_ft_min_token_size: shorter words are not in the FULLTEXT index
+SNIPPET_CHARS = 160
+MAX_MESSAGE_HITS = 3
+
+ORDER_MATCH = 'MATCH({columns}) AGAINST (%s IN BOOLEAN MODE)'
+MESSAGE_MATCH = 'MATCH({column}) AGAINST (%s IN BOOLEAN MODE)'
+
+_TOKEN = re.compile(r'[^\W_]+')
+
+
+def uses_fulltext():
+    return connection.vendor == 'mysql'
+
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in _TOKEN.findall((text or '').lower())]
+
+
+def parse_query(text):
+    """Distinct terms of a search string, at most ``MAX_TERMS``"""
+    return list(dict.fromkeys(tokenize(text)))[:MAX_TERMS]
+
+
+def _weights(counts, weight):
+    return {term: weight * (1 + math.log(count)) for term, count in counts.items()}
+
+
+def order_postings(order):
+    """``{term: weight}`` for an order's indexed fields"""
+    weights = Counter()
+    for field, weight in ORDER_FIELDS.items():
+        weights.update(_weights(Counter(tokenize(getattr(order, field))), weight))
+    return dict(weights)
+
+
+def message_postings(message):
+    return _weights(Counter(tokenize(message.message)), MESSAGE_WEIGHT)
+
+
+def indexed_text(order):
+    """The loaded values of the indexed fields, to tell whether a save needs reindexing"""
+    return {field: order.__dict__[field] for field in ORDER_FIELDS if field in order.__dict__}
+
+
+def index_orders(orders, replace=True):
+    """(Re)build the fallback postings of ``orders``' own fields; a no-op on MySQL."""
+    if uses_fulltext() or not orders:
+        return
+    if replace:
+        SearchTerm.objects.filter(order__in=[order.pk for order in orders], message__isnull=True).delete()
+    SearchTerm.objects.bulk_create([
+        SearchTerm(term=term, order_id=order.pk, weight=weight)
+        for order in orders for term, weight in order_postings(order).items()
+    ])
+
+
+def index_messages(messages):
+    if uses_fulltext() or not messages:
+        return
+    SearchTerm.objects.bulk_create([
+        SearchTerm(term=term, order_id=message.order_id, message_id=message.pk, weight=weight)
+        for message in messages for term, weight in message_postings(message).items()
+    ])
+
+
+def _term_range(term):
+    # Index terms are word characters, all below U+10FFFF, so this is "starts with" as an index range
+    if len(term) >= PREFIX_MIN:
+        return Q(term__gte=term, term__lt=term + '\U0010ffff')
+    return Q(term=term)
+
+
+def _expand(terms):
+    """``[{index term: idf}]`` per query term, from one query over the matching postings"""
+    condition = Q()
+    for term in terms:
+        condition |= _term_range(term)
+    frequencies = (
+        SearchTerm.objects.filter(condition).order_by().values_list('term')
+        .annotate(df=Count('order_id', distinct=True)).order_by('-df', 'term')
+    )
+    expansions = [{} for _ in terms]
+    for found, df in frequencies:
+        for i, term in enumerate(terms):
+            if (found.startswith(term) if len(term) >= PREFIX_MIN else found == term) and len(expansions[i]) < MAX_EXPANSIONS:
+                expansions[i][found] = 1 / math.log(2 + df)
+    return expansions
+
+
+def _fallback_ranked(terms, orders, restrict):
+    expansions = _expand(terms)
+    if not all(expansions):
+        return None
+    idf = {}
+    for expansion in expansions:
+        idf.update(expansion)
+    postings = SearchTerm.objects.filter(term__in=idf)
+    if restrict:
+        postings = postings.filter(order__in=orders.values('pk'))
+    matched = {
+        f'matched_{i}': Max(Case(When(term__in=list(expansion), then=Value(1)), default=Value(0), output_field=IntegerField()))
+        for i, expansion in enumerate(expansions)
+    }
+    return (
+        postings.order_by().values('order_id')
+        .annotate(score=Sum(F('weight') * Case(
+            *[When(term=term, then=Value(value)) for term, value in idf.items()], output_field=FloatField(),
+        )), **matched)
+        .filter(**{name: 1 for name in matched})
+        .order_by('-score', '-order_id')
+        .values_list('order_id', 'score')
+    )
+
+
+def _boolean_query(terms):
+    return ' '.join(f'+{term}*' for term in terms if len(term) >= MYSQL_MIN_TOKEN)
+
+
+def _order_match():
+    return ORDER_MATCH.format(columns=', '.join(
+        connection.ops.quote_name(Order._meta.get_field(field).column) for field in ORDER_FIELDS
+    ))
+
+
+def _message_match():
+    return MESSAGE_MATCH.format(column=connection.ops.quote_name(OrderMessage._meta.get_field('message').column))
+
+
+def _fulltext_hits(terms, orders, restrict):
+    """SQL and params of ``(order_key, score)`` rows, one per matching order or message"""
+    query = _boolean_query(terms)
+    if not query:
+        return None
+    order_hits = (
+        orders.order_by().annotate(order_key=F('pk'), score=RawSQL(_order_match(), [query], output_field=FloatField()))
+        .filter(score__gt=0).values_list('order_key', 'score')
+    )
+    messages = OrderMessage.objects.order_by()
+    if restrict:
+        messages = messages.filter(order__in=orders.values('pk'))
+    message_hits = (
+        messages.annotate(order_key=F('order_id'), score=RawSQL(_message_match(), [query], output_field=FloatField()))
+        .filter(score__gt=0).values_list('order_key', 'score')
+    )
+    order_sql, order_params = order_hits.query.sql_with_params()
+    message_sql, message_params = message_hits.query.sql_with_params()
+    return f'({order_sql}) UNION ALL ({message_sql})', order_params + message_params
+
+
+def search(terms, orders, offset=0, limit=25):
+    """``(total, [(order id, score)])`` for the ``orders`` matching every term, best first.
+
+    ``orders`` is the queryset the caller may see (list filters applied).
+    """
+    restrict = bool(orders.query.where)
+    if uses_fulltext():
+        hits = _fulltext_hits(terms, orders, restrict)
+        if hits is None:
+            return 0, []
+        sql, params = hits
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(DISTINCT order_key) FROM ({sql}) AS hits', params)
+            total = cursor.fetchone()[0]
+            cursor.execute(
+                f'SELECT order_key, SUM(score) AS total_score FROM ({sql}) AS hits GROUP BY order_key '
+                'ORDER BY total_score DESC, order_key DESC LIMIT %s OFFSET %s',
+                params + (limit, offset),
+            )
+            return total, cursor.fetchall()
+    ranked = _fallback_ranked(terms, orders, restrict)
+    if ranked is None:
+        return 0, []
+    return ranked.count(), list(ranked[offset:offset + limit])
+
+
+def matching_messages(terms, order_ids):
+    """``{order id: [message]}`` of the messages of ``order_ids`` that match, at most ``MAX_MESSAGE_HITS`` each"""
+    messages = OrderMessage.objects.filter(order_id__in=order_ids).order_by('-timestamp', '-id')
+    if uses_fulltext():
+        query = _boolean_query(terms)
+        if not query:
+            return {}
+        messages = messages.annotate(score=RawSQL(_message_match(), [query], output_field=FloatField())).filter(score__gt=0)
+    else:
+        condition = Q()
+        for term in terms:
+            condition |= _term_range(term)
+        messages = messages.filter(pk__in=SearchTerm.objects.filter(condition, order_id__in=order_ids, message__isnull=False).values('message_id'))
+    found = {}
+    for message in messages.only('id', 'order_id', 'message', 'type', 'timestamp'):
+        hits = found.setdefault(message.order_id, [])
+        if len(hits) < MAX_MESSAGE_HITS:
+            hits.append(message)
+    return found
+
+
+def _pattern(terms):
+    # Whole words for short terms, word prefixes for the rest, as the index matches them
+    alternatives = [
+        re.escape(term) + (r'[^\W_]*' if len(term) >= PREFIX_MIN else r'(?![^\W_])')
+        for term in sorted(terms, key=len, reverse=True)
+    ]
+    return re.compile(r'(?<![^\W_])(?:' + '|'.join(alternatives) + ')', re.IGNORECASE)
+
+
+def highlight(text, terms, width=SNIPPET_CHARS):
+    """HTML-escaped excerpt of ``text`` around its first match with matches in ``<mark>``; None without a match"""
+    text = text or ''
+    pattern = _pattern(terms)
+    first = pattern.search(text)
+    if first is None:
+        return None
+    start = max(0, min(first.start() - width // 3, len(text) - width))
+    end = start + width
+    excerpt = text[start:end]
+    pieces, cursor = [], 0
+    for match in pattern.finditer(excerpt):
+        pieces.append(html.escape(excerpt[cursor:match.start()]))
+        pieces.append(f'<mark>{html.escape(match.group())}</mark>')
+        cursor = match.end()
+    pieces.append(html.escape(excerpt[cursor:]))
+    return ('…' if start else '') + ''.join(pieces) + ('…' if end < len(text) else '')
+
+
+def highlights(order, terms):
+    """``{field: excerpt}`` for the indexed fields of ``order`` that match"""
+    found = {}
+    for field in ORDER_FIELDS:
+        excerpt = highlight(getattr(order, field), terms)
+        if excerpt is not None:
+            found[field] = excerpt
+    return found
+
+
+def _batches(queryset, size):
+    last = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last).order_by('pk')[:size])
+        if not rows:
+            return
+        last = rows[-1].pk
+        yield rows
+
+
+def rebuild(batch_size=2000):
+    """Rebuild the fallback index from scratch; returns the number of (orders, messages) indexed."""
+    SearchTerm.objects.all().delete()
+    orders = messages = 0
+    for batch in _batches(Order.objects.only('id', *ORDER_FIELDS), batch_size):
+        index_orders(batch, replace=False)
+        orders += len(batch)
+    for batch in _batches(OrderMessage.objects.only('id', 'order_id', 'message'), batch_size):
+        index_messages(batch)
+        messages += len(batch)
+    return orders, messages
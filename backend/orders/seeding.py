@@ -0,0 +1,136 @@
+"""Synthetic data for benchmarks.
+
+Rows are written with ``bulk_create`` so seeding a million orders stays fast;
+that also means no signals fire (no OrderChange rows, events or cache bumps),
+so the fallback search index is written here.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .models import Supplier, Machine, Order, OrderMessage
+from .searching import index_messages, index_orders
+
+BATCH_SIZE = 5000
+STATUS_WEIGHTS = {
+    'under_review': 10,
+    'negotiation': 5,
+    'awaiting_payment': 3,
+    'accepted': 5,
+    'in_production': 7,
+    'completed': 60,
+    'rejected': 10,
+}
+MESSAGE_TYPES = ['message', 'message', 'counter_offer', 'system']
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create store the given auto_now_add values instead of 'now'."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _batches(total, size=BATCH_SIZE):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+def seed(clients=100, suppliers=10, machines=50, orders=10000, messages_per_order=2,
+         random_seed=0, progress=None):
+    """Insert the requested volumes and return the created counts."""
+    rng = random.Random(random_seed)
+    User = get_user_model()
+    now = timezone.now()
+    # Unique per run so seeding can be repeated against the same database
+    tag = f'{now:%y%m%d%H%M%S}{rng.randrange(100):02d}'
+
+    User.objects.bulk_create([
+        User(username=f'bench-{tag}-{i}', email=f'bench-{tag}-{i}@example.com',
+             password='!', role='client', company=f'Bench Co {i}')
+        for i in range(clients)
+    ], batch_size=BATCH_SIZE)
+    client_ids = list(User.objects.filter(username__startswith=f'bench-{tag}-').values_list('id', flat=True))
+
+    Supplier.objects.bulk_create([
+        Supplier(name=f'Bench Supplier {tag}-{i}') for i in range(suppliers)
+    ])
+    supplier_ids = list(Supplier.objects.filter(name__startswith=f'Bench Supplier {tag}-').values_list('id', flat=True))
+
+    machine_types = [value for value, _label in Machine.MACHINE_TYPE_CHOICES]
+    Machine.objects.bulk_create([
+        Machine(supplier_id=rng.choice(supplier_ids), name=f'Bench Machine {tag}-{i}',
+                type=rng.choice(machine_types), make='Bench')
+        for i in range(machines)
+    ] if supplier_ids else [])
+    machine_ids = list(Machine.objects.filter(name__startswith=f'Bench Machine {tag}-').values_list('id', flat=True))
+
+    statuses = list(STATUS_WEIGHTS)
+    weights = list(STATUS_WEIGHTS.values())
+    order_fields = [Order._meta.get_field('date_submitted')]
+    message_fields = [OrderMessage._meta.get_field('timestamp')]
+    created_messages = 0
+    with explicit_timestamps(*order_fields, *message_fields):
+        for start, size in _batches(orders):
+            batch = []
+            for i in range(start, start + size):
+                status = rng.choices(statuses, weights)[0]
+                submitted = now - timedelta(minutes=rng.randrange(3 * 365 * 24 * 60))
+                price = rng.randrange(100, 100000)
+                batch.append(Order(
+                    client_id=rng.choice(client_ids),
+                    part_id=f'B{tag}-{i}',
+                    product_description=f'Bench part {i}',
+                    d2_draft_design='draft_designs/bench.pdf',
+                    quantity=rng.randrange(1, 500),
+                    material_thickness=str(rng.choice([1, 2, 3, 5, 8, 12])),
+                    material_type=rng.choice(['Mild Steel', 'Stainless Steel', 'Aluminium']),
+                    material_grade='Bench',
+                    surface_treatment='None',
+                    packing_standard='Standard',
+                    target_price=price,
+                    status=status,
+                    date_submitted=submitted,
+                    machine_id=rng.choice(machine_ids) if machine_ids and status in ('accepted', 'in_production', 'completed') else None,
+                    agreed_price=price if status not in ('under_review', 'negotiation', 'rejected') else None,
+                    actual_cost=price * 0.8 if status == 'completed' else None,
+                    date_completed=submitted + timedelta(days=rng.randrange(3, 40)) if status == 'completed' else None,
+                ))
+            Order.objects.bulk_create(batch)
+            index_orders(batch, replace=False)
+            if messages_per_order and client_ids:
+                # MySQL doesn't return bulk-inserted ids, so read them back by part_id
+                created = Order.objects.filter(part_id__in=[order.part_id for order in batch]).values_list('id', 'client_id', 'date_submitted')
+                messages = []
+                for order_id, client_id, submitted in created:
+                    for n in range(messages_per_order):
+                        message_type = rng.choice(MESSAGE_TYPES)
+                        messages.append(OrderMessage(
+                            order_id=order_id,
+                            sender_id=client_id,
+                            message=f'Bench message {n}',
+                            timestamp=submitted + timedelta(minutes=n + 1),
+                            type=message_type,
+                            amount=rng.randrange(100, 100000) if message_type == 'counter_offer' else None,
+                        ))
+                OrderMessage.objects.bulk_create(messages, batch_size=BATCH_SIZE)
+                index_messages(messages)
+                created_messages += len(messages)
+            if progress:
+                progress(start + size, orders)
+
+    return {
+        'clients': len(client_ids),
+        'suppliers': len(supplier_ids),
+        'machines': len(machine_ids),
+        'orders': orders,
+        'messages': created_messages,
+    }
@@ -1,13 +1,67 @@
 from rest_framework import serializers
-from .models import Order, Machine, Supplier, OrderMessage
+from .models import Order, Machine, Supplier, OrderMessage, OrderGeometry, Upload
+from .renditions import existing_rendition_names
+from .uploads import max_upload_size
 
-class OrderSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Limit GET responses to the comma-separated ``?fields=`` names"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        requested = request.query_params.get('fields')
+        if requested:
+            keep = {name.strip() for name in requested.split(',')}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+class LatestCounterOfferSerializer(serializers.Serializer):
+    """Read-only view of the counter offer fields denormalized onto Order"""
+    amount = serializers.DecimalField(source='latest_offer_amount', max_digits=10, decimal_places=2)
+    sender_role = serializers.CharField(source='latest_offer_sender_role')
+    timestamp = serializers.DateTimeField(source='latest_offer_at')
+
+class OrderGeometrySerializer(serializers.ModelSerializer):
+    preview_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OrderGeometry
+        fields = ['status', 'bbox_x', 'bbox_y', 'bbox_z', 'part_count', 'surface_area', 'preview_url', 'error', 'updated_at']
+
+    def get_preview_url(self, obj):
+        if obj.preview and hasattr(obj.preview, 'url'):
+            # Use nginx port for static files
+            return f"http://localhost:8080{obj.preview.url}"
+        return None
+
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     machine_name = serializers.CharField(source='machine.name', read_only=True)
     supplier_name = serializers.CharField(source='machine.supplier.name', read_only=True)
     client_name = serializers.CharField(source='client.email', read_only=True)
     client_company = serializers.CharField(source='client.company', read_only=True)
     step_file_url = serializers.SerializerMethodField()
     d2_draft_design_url = serializers.SerializerMethodField()
+    latest_counter_offer = serializers.SerializerMethodField()
+    geometry = serializers.SerializerMethodField()
+    step_file_upload = serializers.PrimaryKeyRelatedField(
+        queryset=Upload.objects.filter(status='complete'), write_only=True, required=False)
+    d2_draft_design_upload = serializers.PrimaryKeyRelatedField(
+        queryset=Upload.objects.filter(status='complete'), write_only=True, required=False)
+
+    def validate(self, attrs):
+        """Resolve ``*_upload`` ids from the chunked upload API to the stored files"""
+        request = self.context.get('request')
+        for field in ('step_file', 'd2_draft_design'):
+            upload = attrs.pop(f'{field}_upload', None)
+            if upload is None:
+                continue
+            if request is None or upload.owner_id != request.user.pk or upload.kind != field:
+                raise serializers.ValidationError({f'{field}_upload': 'Invalid upload.'})
+            attrs[field] = upload.stored_name
+        if self.instance is None and not attrs.get('d2_draft_design'):
+            raise serializers.ValidationError({'d2_draft_design': 'A file or a completed upload is required.'})
+        return attrs
 
     def get_step_file_url(self, obj):
         if obj.step_file and hasattr(obj.step_file, 'url'):
@@ -21,32 +75,62 @@ class OrderSerializer(serializers.ModelSerializer):
             return f"http://localhost:8080{obj.d2_draft_design.url}"
         return None
 
+    def get_geometry(self, obj):
+        if not obj.step_file:
+            return None
+        # Reverse one-to-one: select_related('geometry') avoids a query per order
+        try:
+            return OrderGeometrySerializer(obj.geometry).data
+        except OrderGeometry.DoesNotExist:
+            return None
+
+    def get_latest_counter_offer(self, obj):
+        if obj.latest_offer_amount is None:
+            return None
+        return LatestCounterOfferSerializer(obj).data
+
     class Meta:
         model = Order
         fields = [
             'id', 'client', 'client_name', 'client_company', 'part_id', 'product_description', 
             'step_file', 'step_file_url', 'd2_draft_design', 'd2_draft_design_url', 'quantity', 'material_thickness', 'material_type', 
             'material_grade', 'surface_treatment', 'packing_standard', 'target_price', 'status',
-            'date_submitted', 'expected_completion_date', 'machine', 'machine_name', 
+            'date_submitted', 'updated_at', 'expected_completion_date', 'machine', 'machine_name', 
             'supplier_name', 'admin_notes', 'rejection_reason', 'price_estimate', 
             'actual_cost', 'date_accepted', 'date_production_started', 
             'date_completed', 'date_rejected',
-            'agreed_price', 'payment_confirmed'
+            'agreed_price', 'payment_confirmed', 'latest_counter_offer', 'geometry',
+            'step_file_upload', 'd2_draft_design_upload',
+            'estimated_hours', 'scheduled_start', 'scheduled_end'
         ]
-        read_only_fields = ['status', 'date_submitted', 'client', 'client_name', 
+        read_only_fields = ['status', 'date_submitted', 'updated_at', 'client', 'client_name', 
                            'client_company', 'machine_name', 'supplier_name',
                            'date_accepted', 'date_production_started', 
                            'date_completed', 'date_rejected',
-                           'agreed_price', 'payment_confirmed']
+                           'agreed_price', 'payment_confirmed',
+                           'estimated_hours', 'scheduled_start', 'scheduled_end']
+        extra_kwargs = {'d2_draft_design': {'required': False}}
+
+class ScheduledOrderSerializer(serializers.ModelSerializer):
+    """An order's slot on a machine timeline; ``conflicts`` is set by scheduling.queue"""
+    conflicts = serializers.ListField(child=serializers.CharField(), read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'part_id', 'status', 'quantity', 'material_type', 'material_thickness', 'estimated_hours',
+            'scheduled_start', 'scheduled_end', 'expected_completion_date', 'conflicts'
+        ]
 
 class OrderUpdateSerializer(serializers.ModelSerializer):
-    """Serializer for admin updates to orders"""
+    """Serializer for admin updates to orders; ``status`` only moves through the order actions (``orders.transitions``)"""
     class Meta:
         model = Order
         fields = [
             'status', 'machine', 'expected_completion_date', 'admin_notes', 
             'rejection_reason', 'price_estimate', 'actual_cost', 'target_price'
         ]
+        read_only_fields = ['status']
 
 class SupplierSerializer(serializers.ModelSerializer):
     class Meta:
@@ -57,30 +141,67 @@ class MachineSerializer(serializers.ModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     supplier_email = serializers.CharField(source='supplier.email', read_only=True)
     photo_url = serializers.SerializerMethodField()
+    photo_thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = Machine
         fields = [
             'id', 'name', 'type', 'make', 'capacity', 'bed_size', 'tonnage', 'bed_length', 'supplier', 'supplier_name',
-            'supplier_email', 'photo', 'photo_url'
+            'supplier_email', 'photo', 'photo_url', 'photo_thumbnails',
+            'capacity_watts', 'bed_width_mm', 'bed_depth_mm', 'tonnage_tons', 'bed_length_mm'
         ]
 
-    def get_photo_url(self, obj):
+    def media_url(self, url):
         request = self.context.get('request')
+        if request:
+            url = request.build_absolute_uri(url)
+            # Always use port 8080 for media files
+            url = url.replace('http://localhost/', 'http://localhost:8080/')
+            url = url.replace('http://127.0.0.1/', 'http://localhost:8080/')
+        return url
+
+    def get_photo_url(self, obj):
         if obj.photo and hasattr(obj.photo, 'url'):
-            if request:
-                url = request.build_absolute_uri(obj.photo.url)
-                # Always use port 8080 for media files
-                url = url.replace('http://localhost/', 'http://localhost:8080/')
-                url = url.replace('http://127.0.0.1/', 'http://localhost:8080/')
-                return url
-            return obj.photo.url
+            return self.media_url(obj.photo.url)
         return None
 
+    def get_photo_thumbnails(self, obj):
+        """Resized renditions by size: {'small': {'width': 160, 'webp': url, 'jpeg': url}, ...}
+
+        None until the renditions are written; clients then show ``photo_url``.
+        """
+        if not obj.photo:
+            return None
+        storage = obj.photo.storage
+        renditions = existing_rendition_names(obj.photo.name, storage)
+        if renditions is None:
+            return None
+        return {
+            size: {key: value if key == 'width' else self.media_url(storage.url(value)) for key, value in names.items()}
+            for size, names in renditions.items()
+        }
+
 class OrderMessageSerializer(serializers.ModelSerializer):
     sender_email = serializers.CharField(source='sender.email', read_only=True)
     sender_role = serializers.CharField(source='sender.role', read_only=True)
     class Meta:
         model = OrderMessage
         fields = ['id', 'order', 'sender', 'sender_email', 'sender_role', 'message', 'timestamp', 'is_admin', 'type', 'amount']
-        read_only_fields = ['id', 'order', 'sender', 'sender_email', 'sender_role', 'timestamp', 'is_admin', 'type', 'amount'] 
\ No newline at end of file
+        read_only_fields = ['id', 'order', 'sender', 'sender_email', 'sender_role', 'timestamp', 'is_admin', 'type', 'amount'] 
+
+class UploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Upload
+        fields = ['id', 'kind', 'filename', 'size', 'offset', 'sha256', 'status', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'offset', 'status', 'created_at', 'updated_at']
+
+    def validate_size(self, value):
+        if value <= 0 or value > max_upload_size():
+            raise serializers.ValidationError(f'Size must be between 1 and {max_upload_size()} bytes.')
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if value and (len(value) != 64 or any(c not in '0123456789abcdef' for c in value)):
+            raise serializers.ValidationError('Must be a hex SHA-256 digest.')
+        return value
@@ -0,0 +1,117 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, post_delete, pre_save
+from django.dispatch import receiver
+from .caching import bump_version
+from .geometry import enqueue as enqueue_geometry
+from .renditions import generate as generate_renditions
+from .specs import parse_machine_specs
+from .searching import index_messages, index_orders, indexed_text, uses_fulltext
+from .models import Order, OrderChange, OrderMessage, Machine, Supplier, StoredBlob
+from .storage import BLOB_PREFIX
+
+ORDER_FILE_FIELDS = ('step_file', 'd2_draft_design')
+
+
+def record_order_changes(orders, deleted=False):
+    """Append change-log rows for orders written without ``save()`` (e.g. ``QuerySet.update``)."""
+    OrderChange.objects.bulk_create([
+        OrderChange(order_id=order.pk, client_id=order.client_id, deleted=deleted)
+        for order in orders
+    ])
+
+
+def adjust_blob_refs(names, delta):
+    """Add ``delta`` to the ref_count of the content-addressed files among ``names``."""
+    names = [name for name in names if name and name.startswith(BLOB_PREFIX)]
+    for name in names:
+        StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + delta)
+
+
+def _file_names(instance):
+    # Raw __dict__ values: no FieldFile wrapping, and deferred fields stay unloaded
+    names = {}
+    for field in ORDER_FILE_FIELDS:
+        if field in instance.__dict__:
+            value = instance.__dict__[field]
+            names[field] = getattr(value, 'name', value) or ''
+    return names
+
+
+@receiver(post_init, sender=Order)
+def order_loaded(sender, instance, **kwargs):
+    instance._stored_file_names = _file_names(instance) if instance.pk else {}
+    # Only the fallback index is kept by the signals; MySQL's FULLTEXT indexes need no snapshot
+    instance._indexed_text = indexed_text(instance) if instance.pk and not uses_fulltext() else {}
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    record_order_changes([instance])
+    before, after = instance._stored_file_names, _file_names(instance)
+    changed = [field for field in after if before.get(field, '') != after[field]]
+    if changed:
+        adjust_blob_refs([after[field] for field in changed], 1)
+        adjust_blob_refs([before.get(field) for field in changed], -1)
+        instance._stored_file_names = after
+    if 'step_file' in changed:
+        enqueue_geometry(instance)
+    if not uses_fulltext():
+        text = indexed_text(instance)
+        if text != instance._indexed_text:
+            index_orders([instance], replace=not kwargs.get('created'))
+            instance._indexed_text = text
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    record_order_changes([instance], deleted=True)
+    adjust_blob_refs(_file_names(instance).values(), -1)
+
+
+@receiver(post_save, sender=OrderMessage)
+def message_saved(sender, instance, created, **kwargs):
+    # Messages are never edited, so only new ones need indexing
+    if created:
+        index_messages([instance])
+
+
+@receiver(pre_save, sender=Machine)
+def machine_specs(sender, instance, **kwargs):
+    for field, value in parse_machine_specs(instance).items():
+        setattr(instance, field, value)
+
+
+@receiver([post_save, post_delete], sender=Machine)
+def machine_changed(sender, instance, **kwargs):
+    bump_version('machines')
+
+
+@receiver(post_init, sender=Machine)
+def machine_loaded(sender, instance, **kwargs):
+    instance._photo_name = getattr(instance.__dict__.get('photo'), 'name', instance.__dict__.get('photo'))
+
+
+@receiver(post_save, sender=Machine)
+def machine_photo_saved(sender, instance, **kwargs):
+    photo = instance.photo
+    if photo and photo.name != instance._photo_name:
+        instance._photo_name = photo.name
+        transaction.on_commit(lambda: _generate_renditions(photo))
+
+
+def _generate_renditions(photo):
+    try:
+        written = generate_renditions(photo.name, photo.storage)
+    except OSError:
+        # Unreadable image: serve the original; backfill_machine_photos reports it
+        return
+    if written:
+        # Cached machine payloads were built before the renditions existed
+        bump_version('machines')
+
+
+@receiver([post_save, post_delete], sender=Supplier)
+def supplier_changed(sender, instance, **kwargs):
+    # Machine payloads embed supplier name and email
+    bump_version('suppliers', 'machines')
@@ -0,0 +1,156 @@
+"""Parsing of the free-text machine spec fields into numbers with known units.
+
+``Machine.capacity`` (laser power), ``bed_size``, ``tonnage`` and
+``bed_length`` are typed by hand ("6 kW", "3000 x 1500 mm", "100T",
+"3.1m"). ``parse_machine_specs`` turns them into the numeric ``*_watts`` /
+``*_mm`` / ``*_tons`` columns, leaving None for anything it cannot read.
+It also carries the rules of thumb for how thick a material a machine can
+process.
+"""
+import re
+
+# "3,000" (a comma before exactly three digits) is a thousands separator; "2,5" is a decimal comma
+_NUMBER = r'(\d{1,3}(?:,\d{3})+(?:\.\d+)?(?![\d,])|\d+(?:[.,]\d+)?)'
+_THOUSANDS = re.compile(r'\d{1,3}(?:,\d{3})+(?:\.\d+)?')
+_QUANTITY = re.compile(_NUMBER + r"\s*([a-zA-Z\"'µ]*)")
+
+POWER_UNITS = {'w': 1, 'watt': 1, 'watts': 1, 'kw': 1000, 'kilowatt': 1000, 'kilowatts': 1000}
+LENGTH_UNITS = {'mm': 1, 'cm': 10, 'm': 1000, 'in': 25.4, 'inch': 25.4, '"': 25.4, 'ft': 304.8, "'": 304.8}
+FORCE_UNITS = {'t': 1, 'ton': 1, 'tons': 1, 'tonne': 1, 'tonnes': 1, 'kn': 1 / 9.80665}
+
+# Max cut thickness (mm) by laser power (kW) per material; interpolated linearly
+LASER_THICKNESS = {
+    'mild steel': [(1, 10), (2, 16), (3, 20), (6, 25), (12, 40), (20, 50)],
+    'stainless steel': [(1, 5), (2, 8), (3, 12), (6, 20), (12, 40), (20, 50)],
+    'aluminium': [(1, 3), (2, 6), (3, 8), (6, 16), (12, 30), (20, 40)],
+}
+# Forming force relative to mild steel (tensile/shear strength ratio)
+MATERIAL_STRENGTH = {'mild steel': 1.0, 'stainless steel': 1.45, 'aluminium': 0.5}
+MATERIALS = tuple(MATERIAL_STRENGTH)
+# Air bending with V = 8t needs about 8.1 t/m per mm of mild steel
+BENDING_TONS_PER_MM_PER_M = 8.1
+# Punching a 30 mm round hole in mild steel needs about 3.4 t per mm
+PUNCH_TONS_PER_MM = 3.4
+
+
+def _number(value):
+    return float(value.replace(',', '') if _THOUSANDS.fullmatch(value) else value.replace(',', '.'))
+
+
+def _numbers(text):
+    return [(_number(value), unit.lower()) for value, unit in _QUANTITY.findall(text or '')]
+
+
+def _convert(value, unit, units, default_unit):
+    factor = units.get(unit) if unit else units[default_unit]
+    return value * factor if factor is not None else None
+
+
+def parse_power(text):
+    """Laser power in watts; bare numbers below 100 are taken as kW ("6" -> 6000)"""
+    numbers = _numbers(text)
+    if not numbers:
+        return None
+    value, unit = numbers[0]
+    if not unit:
+        return value * 1000 if value < 100 else value
+    return _convert(value, unit, POWER_UNITS, 'w')
+
+
+def parse_length(text):
+    """Length in millimetres; bare numbers below 20 are taken as metres ("3.1" -> 3100)"""
+    numbers = _numbers(text)
+    if not numbers:
+        return None
+    value, unit = numbers[0]
+    if not unit:
+        return value * 1000 if value < 20 else value
+    return _convert(value, unit, LENGTH_UNITS, 'mm')
+
+
+def parse_thickness(text):
+    """Sheet thickness in millimetres; bare numbers are millimetres ("2" -> 2.0)"""
+    numbers = _numbers(text)
+    if not numbers:
+        return None
+    value, unit = numbers[0]
+    return _convert(value, unit, LENGTH_UNITS, 'mm')
+
+
+def parse_bed_size(text):
+    """(width_mm, depth_mm) from "3000 x 1500 mm", "3m x 1.5m" or "3000*1500"; larger side first"""
+    parts = re.split(r'\s*(?:x|×|\*|by)\s*', (text or '').lower())
+    numbers = [_numbers(part) for part in parts]
+    numbers = [found[0] for found in numbers if found][:2]
+    if len(numbers) != 2:
+        return None, None
+    trailing_unit = numbers[1][1]  # "3000 x 1500 mm": the unit applies to both
+    sides = []
+    for value, unit in numbers:
+        unit = unit or trailing_unit
+        if not unit:
+            sides.append(value * 1000 if value < 20 else value)
+        else:
+            sides.append(_convert(value, unit, LENGTH_UNITS, 'mm'))
+    if None in sides:
+        return None, None
+    return max(sides), min(sides)
+
+
+def parse_force(text):
+    """Press force in metric tons"""
+    numbers = _numbers(text)
+    if not numbers:
+        return None
+    value, unit = numbers[0]
+    return _convert(value, unit, FORCE_UNITS, 't')
+
+
+def parse_machine_specs(machine):
+    """Numeric column values for ``machine``'s free-text spec fields"""
+    bed_width, bed_depth = parse_bed_size(machine.bed_size)
+    return {
+        'capacity_watts': parse_power(machine.capacity),
+        'bed_width_mm': bed_width,
+        'bed_depth_mm': bed_depth,
+        'tonnage_tons': parse_force(machine.tonnage),
+        'bed_length_mm': parse_length(machine.bed_length),
+    }
+
+
+def material_key(material_type):
+    """Map an order's free-text material onto LASER_THICKNESS / MATERIAL_STRENGTH keys, or None"""
+    text = (material_type or '').lower()
+    if 'stainless' in text or 'inox' in text or re.search(r'\b(304|316)\b', text):
+        return 'stainless steel'
+    if 'alu' in text:
+        return 'aluminium'
+    if 'steel' in text or 'ms' == text.strip() or 'iron' in text:
+        return 'mild steel'
+    return None
+
+
+def _interpolate(table, x):
+    if x <= table[0][0]:
+        return table[0][1] * x / table[0][0]
+    for (x0, y0), (x1, y1) in zip(table, table[1:]):
+        if x <= x1:
+            return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+    return table[-1][1]
+
+
+def max_thickness(machine_type, specs, material):
+    """Thickest ``material`` sheet (mm) the machine can process, or None when its specs are unknown"""
+    strength = MATERIAL_STRENGTH[material]
+    if machine_type == 'laser':
+        watts = specs.get('capacity_watts')
+        return _interpolate(LASER_THICKNESS[material], watts / 1000) if watts else None
+    tons = specs.get('tonnage_tons')
+    if not tons:
+        return None
+    if machine_type == 'bending':
+        length_m = (specs.get('bed_length_mm') or 3000) / 1000  # Full-length bend is the worst case
+        return tons / (BENDING_TONS_PER_MM_PER_M * strength * length_m)
+    if machine_type == 'punch':
+        return tons / (PUNCH_TONS_PER_MM * strength)
+    return None
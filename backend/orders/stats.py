@@ -0,0 +1,106 @@
+from django.core.cache import cache
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q, Sum
+
+from .models import Order, OrderChange
+
+# Entries are keyed by the change cursor, so any order write makes them unreachable;
+# the TTL only bounds staleness from machine/supplier renames and frees old keys.
+STATS_CACHE_TIMEOUT = 300
+ACTIVE_STATUSES = ['accepted', 'in_production']
+
+
+def _money(value):
+    return str(value) if value is not None else None
+
+
+def _total(rows, key):
+    values = [row[key] for row in rows if row[key] is not None]
+    return sum(values) if values else None
+
+
+def _by_status(queryset):
+    turnaround = ExpressionWrapper(F('date_completed') - F('date_submitted'), output_field=DurationField())
+    return queryset.order_by().values('status').annotate(
+        count=Count('id'),
+        agreed_price_total=Sum('agreed_price'),
+        actual_cost_total=Sum('actual_cost'),
+        average_turnaround=Avg(turnaround, filter=Q(date_completed__isnull=False)),
+    )
+
+
+def _machines(queryset):
+    return queryset.order_by().filter(machine__isnull=False).values(
+        'machine', 'machine__name', 'machine__supplier', 'machine__supplier__name',
+    ).annotate(
+        total_orders=Count('id'),
+        active_orders=Count('id', filter=Q(status__in=ACTIVE_STATUSES)),
+    )
+
+
+def compute_order_stats(queryset):
+    """Per-status totals and per-machine/per-supplier workload for ``queryset``."""
+    return _summarize(list(_by_status(queryset)), list(_machines(queryset)))
+
+
+async def acompute_order_stats(queryset):
+    return _summarize([row async for row in _by_status(queryset)], [row async for row in _machines(queryset)])
+
+
+def _summarize(status_rows, machines):
+    by_status = {row['status']: row for row in status_rows}
+    completed = by_status.get('completed', {}).get('average_turnaround')
+
+    machine_workload = []
+    suppliers = {}
+    for row in machines:
+        machine_workload.append({
+            'machine': row['machine'],
+            'machine_name': row['machine__name'],
+            'supplier': row['machine__supplier'],
+            'total_orders': row['total_orders'],
+            'active_orders': row['active_orders'],
+        })
+        supplier = suppliers.setdefault(row['machine__supplier'], {
+            'supplier': row['machine__supplier'],
+            'supplier_name': row['machine__supplier__name'],
+            'total_orders': 0,
+            'active_orders': 0,
+        })
+        supplier['total_orders'] += row['total_orders']
+        supplier['active_orders'] += row['active_orders']
+
+    return {
+        'total': sum(row['count'] for row in by_status.values()),
+        'by_status': {
+            value: {
+                'count': by_status.get(value, {}).get('count', 0),
+                'agreed_price_total': _money(by_status.get(value, {}).get('agreed_price_total')),
+                'actual_cost_total': _money(by_status.get(value, {}).get('actual_cost_total')),
+            }
+            for value, _label in Order.STATUS_CHOICES
+        },
+        'agreed_price_total': _money(_total(by_status.values(), 'agreed_price_total')),
+        'actual_cost_total': _money(_total(by_status.values(), 'actual_cost_total')),
+        'average_turnaround_seconds': completed.total_seconds() if completed is not None else None,
+        'machine_workload': machine_workload,
+        'supplier_workload': list(suppliers.values()),
+    }
+
+
+def cached_order_stats(queryset, scope):
+    """``compute_order_stats`` memoized per scope until the next order write."""
+    key = f'orders:stats:{scope}:{OrderChange.latest_cursor()}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_order_stats(queryset)
+        cache.set(key, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+async def acached_order_stats(queryset, scope):
+    key = f'orders:stats:{scope}:{await OrderChange.alatest_cursor()}'
+    stats = await cache.aget(key)
+    if stats is None:
+        stats = await acompute_order_stats(queryset)
+        await cache.aset(key, stats, STATS_CACHE_TIMEOUT)
+    return stats
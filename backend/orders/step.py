@@ -0,0 +1,368 @@
+"""Streaming reader for STEP (ISO 10303-21) files.
+
+``analyse(path)`` reads the file in fixed-size chunks and handles one
+``#id=ENTITY(...);`` record at a time. Only the entities needed for the
+metrics are kept: points, directions and placements, plus the B-rep
+topology (vertices, edges, loops, faces). It returns:
+
+- bbox: extent of every CARTESIAN_POINT, accumulated as the file streams.
+- part_count: number of solids (MANIFOLD_SOLID_BREP / BREP_WITH_VOIDS),
+  falling back to PRODUCT entries.
+- surface_area: only when every face is planar and each of its loops is a
+  polygon of straight edges or a single full circle. Otherwise None, since
+  curved faces cannot be measured without a geometry kernel.
+- preview: a small isometric wireframe PNG rendered with Pillow.
+
+All lengths are converted to millimetres using the file's length unit.
+"""
+import io
+import math
+import re
+
+from PIL import Image, ImageDraw
+
+READ_SIZE = 64 * 1024
+PREVIEW_SIZE = 256
+
+_RECORD = re.compile(r'#(\d+)\s*=\s*(.*)', re.S)
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<string>'(?:[^']|'')*')
+    |(?P<ref>\#\d+)
+    |(?P<enum>\.[A-Za-z_0-9]+\.)
+    |(?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    |(?P<omitted>[$*])
+    |(?P<keyword>[A-Za-z_][A-Za-z0-9_]*)
+    |(?P<open>\()
+    |(?P<close>\))
+    |(?P<comma>,)
+)""", re.X)
+_SI_PREFIX_TO_MM = {'$': 1000.0, '.KILO.': 1e6, '.CENTI.': 10.0, '.MILLI.': 1.0, '.MICRO.': 1e-3}
+_NAMED_UNIT_TO_MM = {'INCH': 25.4, 'FOOT': 304.8}
+_SOLIDS = {'MANIFOLD_SOLID_BREP', 'BREP_WITH_VOIDS'}
+_KEPT = {
+    'CARTESIAN_POINT', 'DIRECTION', 'AXIS2_PLACEMENT_3D', 'VERTEX_POINT', 'CIRCLE', 'LINE', 'POLYLINE',
+    'EDGE_CURVE', 'ORIENTED_EDGE', 'EDGE_LOOP', 'FACE_OUTER_BOUND', 'FACE_BOUND', 'ADVANCED_FACE',
+    'FACE_SURFACE', 'PLANE',
+}
+
+
+class StepError(ValueError):
+    pass
+
+
+class Ref(int):
+    """A ``#id`` entity reference"""
+
+
+def iter_records(handle):
+    """Yield each ``;``-terminated record of a STEP text stream, skipping comments and quoted ``;``."""
+    pending = []
+    in_string = in_comment = False
+    previous = ''
+    while True:
+        chunk = handle.read(READ_SIZE)
+        if not chunk:
+            break
+        start = 0
+        for index, char in enumerate(chunk):
+            if in_comment:
+                if char == '/' and previous == '*':
+                    in_comment = False
+                    start = index + 1
+                    char = ''  # So "*/*" does not reopen a comment
+            elif in_string:
+                if char == "'":
+                    in_string = False  # A doubled '' re-enters on the next character
+            elif char == "'":
+                in_string = True
+            elif char == '*' and previous == '/':
+                if index:
+                    pending.append(chunk[start:index - 1])
+                elif pending:
+                    pending[-1] = pending[-1][:-1]  # The '/' ended the previous chunk
+                in_comment = True
+            elif char == ';':
+                pending.append(chunk[start:index])
+                yield ''.join(pending).strip()
+                pending = []
+                start = index + 1
+            previous = char
+        if not in_comment:
+            pending.append(chunk[start:])
+    if ''.join(pending).strip():
+        yield ''.join(pending).strip()
+
+
+def parse_params(text):
+    """Parse a parenthesised STEP parameter list into nested Python lists."""
+    tokens = [match for match in _TOKEN.finditer(text) if match.group().strip()]
+    position = 0
+
+    def value():
+        nonlocal position
+        token = tokens[position]
+        kind = token.lastgroup
+        position += 1
+        if kind == 'open':
+            items = []
+            while tokens[position].lastgroup != 'close':
+                if tokens[position].lastgroup == 'comma':
+                    position += 1
+                    continue
+                items.append(value())
+            position += 1
+            return items
+        if kind == 'keyword':  # Typed parameter such as LENGTH_MEASURE(1.0)
+            inner = value() if position < len(tokens) and tokens[position].lastgroup == 'open' else []
+            return inner[0] if len(inner) == 1 else inner
+        if kind == 'string':
+            return token.group(kind)[1:-1].replace("''", "'")
+        if kind == 'ref':
+            return Ref(token.group(kind)[1:])
+        if kind == 'number':
+            return float(token.group(kind))
+        if kind == 'enum':
+            return token.group(kind)
+        return None
+
+    try:
+        return value()
+    except IndexError:
+        raise StepError(f'Malformed parameter list: {text[:80]}')
+
+
+def _length_unit(body):
+    """Millimetres per file length unit from a complex LENGTH_UNIT record, or None"""
+    if 'LENGTH_UNIT' not in body:
+        return None
+    named = re.search(r"CONVERSION_BASED_UNIT\s*\(\s*'([^']*)'", body)
+    if named:
+        return _NAMED_UNIT_TO_MM.get(named.group(1).strip().upper())
+    si = re.search(r'SI_UNIT\s*\(\s*(\$|\.\w+\.)\s*,\s*\.METRE\.', body)
+    return _SI_PREFIX_TO_MM.get(si.group(1)) if si else None
+
+
+def _sub(a, b):
+    return (a[0] - b[0], a[1] - b[1], a[2] - b[2])
+
+
+def _cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
+
+
+def _norm(a):
+    return math.sqrt(a[0] ** 2 + a[1] ** 2 + a[2] ** 2)
+
+
+def _unit(a):
+    length = _norm(a)
+    return (a[0] / length, a[1] / length, a[2] / length) if length else a
+
+
+def _polygon_area(points):
+    """Area of a planar polygon (Newell's method)"""
+    normal = (0.0, 0.0, 0.0)
+    for index, point in enumerate(points):
+        step = _cross(point, points[(index + 1) % len(points)])
+        normal = (normal[0] + step[0], normal[1] + step[1], normal[2] + step[2])
+    return _norm(normal) / 2
+
+
+class Model:
+    def __init__(self):
+        self.entities = {}
+        self.lower = [math.inf] * 3
+        self.upper = [-math.inf] * 3
+        self.solids = 0
+        self.products = 0
+        self.scale = None
+
+    def add(self, record):
+        match = _RECORD.match(record)
+        if not match:
+            return
+        entity_id, body = int(match.group(1)), match.group(2).strip()
+        if body.startswith('('):
+            if self.scale is None:
+                self.scale = _length_unit(body)
+            return
+        name, _, rest = body.partition('(')
+        name = name.strip().upper()
+        if name in _SOLIDS:
+            self.solids += 1
+        elif name == 'PRODUCT':
+            self.products += 1
+        if name not in _KEPT:
+            return
+        params = parse_params('(' + rest)
+        if name == 'CARTESIAN_POINT':
+            coordinates = [float(c) for c in params[1]] + [0.0] * (3 - len(params[1]))
+            for axis in range(3):
+                self.lower[axis] = min(self.lower[axis], coordinates[axis])
+                self.upper[axis] = max(self.upper[axis], coordinates[axis])
+            params = tuple(coordinates)
+        self.entities[entity_id] = (name, params)
+
+    def get(self, ref, *names):
+        entity = self.entities.get(ref)
+        if entity is None or (names and entity[0] not in names):
+            return None
+        return entity
+
+    def point(self, ref):
+        entity = self.get(ref, 'CARTESIAN_POINT')
+        return entity[1] if entity else None
+
+    def vertex(self, ref):
+        entity = self.get(ref, 'VERTEX_POINT')
+        return self.point(entity[1][1]) if entity else None
+
+    def direction(self, ref, default):
+        entity = self.get(ref, 'DIRECTION')
+        return _unit(tuple(entity[1][1]) + (0.0,) * (3 - len(entity[1][1]))) if entity else default
+
+    def placement(self, ref):
+        """(origin, axis, ref_direction) of an AXIS2_PLACEMENT_3D"""
+        entity = self.get(ref, 'AXIS2_PLACEMENT_3D')
+        if entity is None:
+            return None
+        origin = self.point(entity[1][1])
+        axis = self.direction(entity[1][2], (0.0, 0.0, 1.0))
+        ref_direction = self.direction(entity[1][3], (1.0, 0.0, 0.0))
+        if origin is None:
+            return None
+        # Make the reference direction orthogonal to the axis
+        ref_direction = _unit(_cross(_cross(axis, ref_direction), axis))
+        return origin, axis, ref_direction
+
+    def circle(self, ref):
+        entity = self.get(ref, 'CIRCLE')
+        if entity is None:
+            return None
+        placement = self.placement(entity[1][1])
+        return (placement, float(entity[1][2])) if placement else None
+
+    def edges(self):
+        for name, params in self.entities.values():
+            if name == 'EDGE_CURVE':
+                yield params
+
+    def loop_area(self, loop_ref):
+        loop = self.get(loop_ref, 'EDGE_LOOP')
+        if loop is None:
+            return None
+        oriented = [self.get(ref, 'ORIENTED_EDGE') for ref in loop[1][1]]
+        edges = [self.get(entity[1][3], 'EDGE_CURVE') if entity else None for entity in oriented]
+        if not edges or None in edges:
+            return None
+        if len(edges) == 1:
+            _, start, end, geometry, _ = edges[0][1]
+            circle = self.circle(geometry)
+            return math.pi * circle[1] ** 2 if circle and start == end else None
+        points = []
+        for entity, edge in zip(oriented, edges):
+            _, start, end, geometry, _ = edge[1]
+            if self.get(geometry, 'LINE', 'POLYLINE') is None:
+                return None
+            vertex = self.vertex(start if entity[1][4] == '.T.' else end)
+            if vertex is None:
+                return None
+            points.append(vertex)
+        return _polygon_area(points)
+
+    def surface_area(self):
+        total = 0.0
+        faces = 0
+        for name, params in self.entities.values():
+            if name not in ('ADVANCED_FACE', 'FACE_SURFACE'):
+                continue
+            faces += 1
+            if self.get(params[2], 'PLANE') is None:
+                return None
+            outer, inner = None, []
+            for bound_ref in params[1]:
+                bound = self.get(bound_ref, 'FACE_OUTER_BOUND', 'FACE_BOUND')
+                if bound is None:
+                    return None
+                area = self.loop_area(bound[1][1])
+                if area is None:
+                    return None
+                if bound[0] == 'FACE_OUTER_BOUND':
+                    outer = area
+                else:
+                    inner.append(area)
+            if outer is None and inner:
+                # Without an explicit outer bound the largest loop is the boundary
+                inner.sort()
+                outer = inner.pop()
+            total += (outer or 0.0) - sum(inner)
+        return total if faces else None
+
+    def segments(self, arc_steps=24):
+        """Edges as 3D polylines; circular edges are sampled, everything else drawn as a chord"""
+        for _, start, end, geometry, _ in self.edges():
+            a, b = self.vertex(start), self.vertex(end)
+            circle = self.circle(geometry)
+            if circle and a and b:
+                (origin, axis, x_axis), radius = circle
+                y_axis = _cross(axis, x_axis)
+
+                def angle(point):
+                    offset = _sub(point, origin)
+                    return math.atan2(sum(o * y for o, y in zip(offset, y_axis)), sum(o * x for o, x in zip(offset, x_axis)))
+
+                begin, finish = angle(a), angle(b)
+                sweep = (finish - begin) % (2 * math.pi) or 2 * math.pi
+                steps = max(2, int(arc_steps * sweep / (2 * math.pi)))
+                yield [
+                    tuple(origin[i] + radius * (math.cos(begin + sweep * k / steps) * x_axis[i]
+                                                + math.sin(begin + sweep * k / steps) * y_axis[i]) for i in range(3))
+                    for k in range(steps + 1)
+                ]
+            elif a and b:
+                yield [a, b]
+
+
+def render_preview(model, size=PREVIEW_SIZE):
+    """Isometric wireframe of the model's edges as PNG bytes, or None when there is nothing to draw"""
+    cos30, sin30 = math.cos(math.pi / 6), 0.5
+    lines = [[((x - y) * cos30, (x + y) * sin30 - z) for x, y, z in polyline] for polyline in model.segments()]
+    if not lines:
+        return None
+    xs = [x for line in lines for x, _ in line]
+    ys = [y for line in lines for _, y in line]
+    span = max(max(xs) - min(xs), max(ys) - min(ys)) or 1.0
+    margin = size * 0.06
+    factor = (size - 2 * margin) / span
+    offset_x = (size - (max(xs) - min(xs)) * factor) / 2
+    offset_y = (size - (max(ys) - min(ys)) * factor) / 2
+
+    image = Image.new('RGB', (size, size), 'white')
+    draw = ImageDraw.Draw(image)
+    for line in lines:
+        draw.line([((x - min(xs)) * factor + offset_x, (y - min(ys)) * factor + offset_y) for x, y in line],
+                  fill=(40, 70, 120), width=1)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def analyse(path):
+    """Metrics and preview of the STEP file at ``path``; raises StepError if it has no geometry"""
+    model = Model()
+    with open(path, encoding='latin-1') as handle:
+        for record in iter_records(handle):
+            model.add(record)
+    if model.lower[0] == math.inf:
+        raise StepError('No CARTESIAN_POINT entities found; not a STEP geometry file?')
+
+    scale = model.scale or 1.0
+    area = model.surface_area()
+    return {
+        'bbox_x': (model.upper[0] - model.lower[0]) * scale,
+        'bbox_y': (model.upper[1] - model.lower[1]) * scale,
+        'bbox_z': (model.upper[2] - model.lower[2]) * scale,
+        'part_count': model.solids or model.products or None,
+        'surface_area': area * scale * scale if area is not None else None,
+        'preview': render_preview(model),
+    }
@@ -0,0 +1,102 @@
+"""Content-addressed storage for order design files.
+
+Files are stored once under ``blobs/<aa>/<sha256><ext>`` regardless of the
+name they were uploaded with, so a resubmitted STEP or draft file costs no
+extra disk. The digest is computed while the content is written to a temp
+file next to its final location; a file whose name already exists is simply
+dropped. Each stored file has a ``StoredBlob`` row whose ``ref_count`` the
+order signals keep up to date; ``gc_order_files`` deletes unreferenced blobs.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+from django.utils import timezone
+
+BLOB_PREFIX = 'blobs/'
+
+
+def blob_name(sha256, filename):
+    _, ext = os.path.splitext(filename or '')
+    return f'{BLOB_PREFIX}{sha256[:2]}/{sha256}{ext.lower()[:16]}'
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for piece in iter(lambda: handle.read(64 * 1024), b''):
+            digest.update(piece)
+    return digest.hexdigest()
+
+
+def order_file_storage():
+    return storages['order_files']
+
+
+def find_blob(sha256, filename, size):
+    """Name of an already stored file with this digest, extension and size, or None (the upload hash pre-check)"""
+    name = blob_name(sha256, filename)
+    # Touching updated_at keeps the blob out of the GC grace window until the upload is attached
+    if not _touch(name, size=size) or not order_file_storage().exists(name):
+        return None
+    return name
+
+
+def _touch(name, **filters):
+    from .models import StoredBlob  # models imports this module for the field storage
+    return StoredBlob.objects.filter(name=name, **filters).update(updated_at=timezone.now())
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The final name depends on the content, which _save has not read yet
+        return name
+
+    def _save(self, name, content):
+        from .models import StoredBlob
+        sha256 = getattr(content, 'sha256', None)
+        if hasattr(content, 'temporary_file_path'):
+            source = content.temporary_file_path()
+            if sha256 is None:
+                sha256 = file_sha256(source)
+            size = os.path.getsize(source)
+        else:
+            source, sha256, size = self._spool(content)
+
+        final_name = blob_name(sha256, name)
+        final_path = self.path(final_name)
+        if os.path.exists(final_path):
+            if not hasattr(content, 'temporary_file_path'):
+                os.remove(source)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            file_move_safe(source, final_path, allow_overwrite=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(final_path, self.file_permissions_mode)
+
+        if not _touch(final_name):
+            # ignore_conflicts: a concurrent save of the same content may have inserted it first
+            StoredBlob.objects.bulk_create([StoredBlob(name=final_name, sha256=sha256, size=size)], ignore_conflicts=True)
+        return final_name
+
+    def _spool(self, content):
+        """Stream ``content`` into a temp file under blobs/, hashing as it goes"""
+        directory = self.path(BLOB_PREFIX)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as spool:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    spool.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path, digest.hexdigest(), size
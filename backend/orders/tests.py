@@ -1,3 +1,1098 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from accounts.authentication import revoke_tokens, token_version
+from accounts.models import User
+from accounts.serializers import CustomTokenObtainPairSerializer
+from . import events, geometry
+from .caching import get_version
+from .models import Machine, Order, OrderChange, OrderEvent, OrderGeometry, OrderMessage, PublishedEvent, SearchTerm, StoredBlob, Supplier, Upload
+from .renditions import rendition_names
+from .specs import parse_bed_size, parse_force, parse_length, parse_power
+from .storage import file_sha256
+from .transitions import TransitionError, transition
+
+
+def client_for(user):
+    client = APIClient()
+    token = CustomTokenObtainPairSerializer.get_token(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+class OrderTestCase(TestCase):
+    """Users, a machine and bearer-token clients like the ones ``bench_api`` drives"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass', role='admin', is_staff=True)
+        self.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='pass', role='client')
+        self.supplier = Supplier.objects.create(name='Supplier')
+        self.machine = Machine.objects.create(supplier=self.supplier, name='Laser 1', make='Test')
+        self.admin_api = client_for(self.admin)
+        self.client_api = client_for(self.client_user)
+
+    def make_order(self, status='under_review', **fields):
+        values = {
+            'client': self.client_user,
+            'part_id': f'PART-{Order.objects.count() + 1}',
+            'product_description': 'Test part',
+            'd2_draft_design': 'draft_designs/test.pdf',
+            'quantity': 10,
+            'material_thickness': '2',
+            'material_type': 'Mild Steel',
+            'material_grade': 'S235',
+            'surface_treatment': 'None',
+            'packing_standard': 'Standard',
+            'target_price': 1000,
+            'status': status,
+        }
+        values.update(fields)
+        return Order.objects.create(**values)
+
+    def settle(self):
+        """Age every logged change past the settle window"""
+        OrderChange.objects.update(timestamp=timezone.now() - timedelta(hours=1))
+
+
+class ChangesSinceTests(OrderTestCase):
+    def changes(self, since, api=None):
+        response = (api or self.admin_api).get('/api/orders/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cursor_stops_before_the_settle_window(self):
+        settled = self.make_order()
+        self.settle()
+        cursor = self.admin_api.get('/api/orders/')['X-Orders-Cursor']
+        self.assertEqual(int(cursor), OrderChange.objects.filter(order_id=settled.pk).last().pk)
+
+        recent = self.make_order()
+        data = self.changes(cursor)
+        self.assertEqual([order['id'] for order in data['orders']], [recent.pk])
+        # Not settled yet: sent now, and again until the cursor passes it
+        self.assertEqual(data['cursor'], int(cursor))
+        self.assertEqual([order['id'] for order in self.changes(cursor)['orders']], [recent.pk])
+
+        self.settle()
+        data = self.changes(cursor)
+        self.assertEqual([order['id'] for order in data['orders']], [recent.pk])
+        self.assertGreater(data['cursor'], int(cursor))
+        self.assertEqual(self.changes(data['cursor'])['orders'], [])
+
+    def test_pages_with_has_more(self):
+        orders = [self.make_order() for _ in range(3)]
+        self.settle()
+        cursor = OrderChange.objects.order_by('id').first().pk - 1
+        seen = []
+        with mock.patch('orders.views.CHANGES_PAGE_SIZE', 2):
+            data = self.changes(cursor)
+            self.assertTrue(data['has_more'])
+            seen += [order['id'] for order in data['orders']]
+            data = self.changes(data['cursor'])
+            self.assertFalse(data['has_more'])
+            seen += [order['id'] for order in data['orders']]
+        self.assertEqual(sorted(seen), [order.pk for order in orders])
+
+    def test_deleted_orders_are_tombstones(self):
+        order = self.make_order()
+        self.settle()
+        cursor = OrderChange.objects.last().pk
+        order_id = order.pk
+        order.delete()
+        data = self.changes(cursor)
+        self.assertEqual(data['orders'], [])
+        self.assertEqual(data['deleted'], [order_id])
+
+    def test_clients_only_see_their_own_changes(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass', role='client')
+        self.make_order()
+        self.settle()
+        cursor = OrderChange.objects.last().pk
+        self.make_order(client=other)
+        self.assertEqual(self.changes(cursor, self.client_api)['orders'], [])
+
+    def test_pruned_cursor_is_gone(self):
+        self.make_order()
+        self.make_order()
+        cursor = OrderChange.objects.first().pk - 1
+        OrderChange.objects.filter(pk=OrderChange.objects.first().pk).delete()
+        response = self.admin_api.get('/api/orders/', {'since': cursor})
+        self.assertEqual(response.status_code, 410)
+
+    def test_cursor_must_be_an_integer(self):
+        self.assertEqual(self.admin_api.get('/api/orders/', {'since': 'x'}).status_code, 400)
+
+
+class EventTests(OrderTestCase):
+    def stream_user(self, **params):
+        return async_to_sync(events._authenticate)(RequestFactory().get('/api/events/', params))
+
+    def test_ticket_opens_the_stream(self):
+        user = self.stream_user(ticket=events.issue_ticket(self.client_user))
+        self.assertEqual((user.pk, user.role), (self.client_user.pk, 'client'))
+
+    def test_access_token_is_not_accepted_in_the_url(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.client_user).access_token
+        self.assertIsNone(self.stream_user(token=str(token)))
+
+    def test_expired_tampered_and_revoked_tickets_are_refused(self):
+        ticket = events.issue_ticket(self.client_user)
+        with override_settings(ORDER_EVENTS_TICKET_SECONDS=-1):
+            self.assertIsNone(events.redeem_ticket(ticket))
+        self.assertIsNone(events.redeem_ticket(ticket[:-1] + ('A' if ticket[-1] != 'A' else 'B')))
+        with self.captureOnCommitCallbacks(execute=True):
+            revoke_tokens(self.client_user)
+        self.assertIsNone(events.redeem_ticket(ticket))
+
+    async def test_asgi_issues_tickets(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.client_user).access_token
+        response = await AsyncClient().post('/api/events/ticket/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        user = await sync_to_async(events.redeem_ticket)(response.json()['ticket'])
+        self.assertEqual(user.pk, self.client_user.pk)
+
+    def test_wsgi_has_no_tickets(self):
+        self.assertEqual(self.client_api.post('/api/events/ticket/').status_code, 501)
+
+    def approve(self, order):
+        with mock.patch.object(events, '_broker', events.DatabaseBroker()), self.captureOnCommitCallbacks(execute=True):
+            self.admin_api.post(f'/api/orders/{order.pk}/approve_order/', {'price_estimate': 900}, format='json')
+
+    @override_settings(ORDER_EVENTS_ENABLED=True)
+    def test_events_are_published_on_commit(self):
+        order = self.make_order()
+        self.approve(order)
+        self.assertEqual(PublishedEvent.objects.get().payload['order_id'], order.pk)
+
+    @override_settings(ORDER_EVENTS_ENABLED=False)
+    def test_nothing_is_published_without_streams(self):
+        self.approve(self.make_order())
+        self.assertFalse(PublishedEvent.objects.exists())
+
+    def test_publishing_prunes_old_rows(self):
+        old = PublishedEvent.objects.create(channels='admin', payload={})
+        PublishedEvent.objects.filter(pk=old.pk).update(timestamp=timezone.now() - timedelta(hours=1))
+        broker = events.DatabaseBroker()
+        broker.publish(['admin'], {'event': 'test'})
+        self.assertEqual(list(PublishedEvent.objects.values_list('payload', flat=True)), [{'event': 'test'}])
+        # At most once per PRUNE_INTERVAL_SECONDS
+        PublishedEvent.objects.update(timestamp=timezone.now() - timedelta(hours=1))
+        broker.publish(['admin'], {'event': 'test'})
+        self.assertEqual(PublishedEvent.objects.count(), 2)
+
+
+class LatestCounterOfferTests(OrderTestCase):
+    def latest_offer(self, order, api=None):
+        orders = (api or self.admin_api).get('/api/orders/').data
+        return next(item for item in orders if item['id'] == order.pk)['latest_counter_offer']
+
+    def offer(self, api, order, amount):
+        response = api.post(f'/api/orders/{order.pk}/send_counter_offer/', {'amount': amount}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_shows_the_newest_offer(self):
+        order = self.make_order()
+        self.assertIsNone(self.latest_offer(order))
+        self.offer(self.client_api, order, '950.00')
+        self.assertEqual(self.latest_offer(order, self.client_api)['amount'], '950.00')
+        self.offer(self.admin_api, order, '975.00')
+        latest = self.latest_offer(order)
+        self.assertEqual((latest['amount'], latest['sender_role']), ('975.00', 'admin'))
+        self.assertIsNotNone(latest['timestamp'])
+
+    def test_chat_messages_leave_the_offer_alone(self):
+        order = self.make_order()
+        self.offer(self.admin_api, order, '975.00')
+        self.client_api.post(f'/api/orders/{order.pk}/messages/', {'message': 'Can you do 900?'}, format='json')
+        self.assertEqual(self.latest_offer(order)['amount'], '975.00')
+
+    def test_accepting_agrees_the_latest_amount(self):
+        order = self.make_order()
+        self.offer(self.client_api, order, '950.00')
+        self.offer(self.admin_api, order, '975.00')
+        response = self.client_api.post(f'/api/orders/{order.pk}/accept_counter_offer/')
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual((order.status, str(order.agreed_price)), ('awaiting_payment', '975.00'))
+
+    def test_nothing_to_accept_without_an_offer(self):
+        order = self.make_order('negotiation')
+        response = self.client_api.post(f'/api/orders/{order.pk}/accept_counter_offer/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'negotiation')
+
+
+class StatsTests(OrderTestCase):
+    def stats(self, api=None):
+        response = (api or self.admin_api).get('/api/orders/stats/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counts_totals_and_workload(self):
+        submitted = timezone.now() - timedelta(days=2)
+        completed = self.make_order('completed', machine=self.machine, agreed_price=1000, actual_cost=800)
+        Order.objects.filter(pk=completed.pk).update(date_submitted=submitted, date_completed=submitted + timedelta(days=1))
+        self.make_order('in_production', machine=self.machine, agreed_price=500)
+        self.make_order()
+
+        stats = self.stats()
+        self.assertEqual(stats['total'], 3)
+        self.assertEqual(stats['by_status']['completed']['count'], 1)
+        self.assertEqual(stats['by_status']['rejected']['count'], 0)
+        self.assertEqual(Decimal(stats['agreed_price_total']), 1500)
+        self.assertEqual(Decimal(stats['actual_cost_total']), 800)
+        self.assertEqual(stats['average_turnaround_seconds'], 86400)
+        self.assertEqual(stats['machine_workload'], [{
+            'machine': self.machine.pk, 'machine_name': 'Laser 1', 'supplier': self.supplier.pk,
+            'total_orders': 2, 'active_orders': 1,
+        }])
+        self.assertEqual(stats['supplier_workload'][0]['total_orders'], 2)
+
+    def test_clients_only_count_their_orders(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass', role='client')
+        self.make_order()
+        self.make_order(client=other)
+        self.assertEqual(self.stats(self.client_api)['total'], 1)
+        self.assertEqual(self.stats()['total'], 2)
+
+    def test_cached_until_the_next_order_write(self):
+        self.make_order()
+        self.assertEqual(self.stats()['total'], 1)
+        token_version(self.admin.pk)
+        # Cache hit: only the change cursor is read
+        with self.assertNumQueries(1):
+            self.assertEqual(self.stats()['total'], 1)
+        self.make_order()
+        self.assertEqual(self.stats()['total'], 2)
+
+    def test_no_orders(self):
+        stats = self.stats()
+        self.assertEqual((stats['total'], stats['agreed_price_total'], stats['average_turnaround_seconds']), (0, None, None))
+
+
+class MessagePagingTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self.make_order()
+        self.messages = [
+            OrderMessage.objects.create(order=self.order, sender=self.client_user, message=f'Message {number}')
+            for number in range(5)
+        ]
+        self.url = f'/api/orders/{self.order.pk}/messages/'
+
+    def page(self, **params):
+        response = self.client_api.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [message['id'] for message in response.data], response['X-Has-More'] == 'true'
+
+    def ids(self, *indexes):
+        return [self.messages[index].pk for index in indexes]
+
+    def test_pages_backwards_from_the_newest(self):
+        self.assertEqual(self.page(limit=2), (self.ids(3, 4), True))
+        self.assertEqual(self.page(limit=2, before_id=self.messages[3].pk), (self.ids(1, 2), True))
+        self.assertEqual(self.page(limit=2, before_id=self.messages[1].pk), (self.ids(0), False))
+
+    def test_fetches_newer_messages_after_a_cursor(self):
+        self.assertEqual(self.page(after_id=self.messages[1].pk, limit=2), (self.ids(2, 3), True))
+        self.assertEqual(self.page(after_id=self.messages[4].pk), ([], False))
+
+    def test_equal_timestamps_are_ordered_by_id(self):
+        OrderMessage.objects.filter(order=self.order).update(timestamp=timezone.now())
+        self.assertEqual(self.page(limit=2, before_id=self.messages[3].pk), (self.ids(1, 2), True))
+        self.assertEqual(self.page(after_id=self.messages[2].pk), (self.ids(3, 4), False))
+
+    def test_without_parameters_returns_the_whole_thread(self):
+        response = self.client_api.get(self.url)
+        self.assertEqual([message['id'] for message in response.data], self.ids(0, 1, 2, 3, 4))
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client_api.get(self.url, {'after_id': 'x'}).status_code, 400)
+        self.assertEqual(self.client_api.get(self.url, {'limit': 0}).status_code, 400)
+
+
+class ReferenceCacheTests(OrderTestCase):
+    def names(self, url, field='name'):
+        token_version(self.admin.pk)
+        response = self.admin_api.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [item[field] for item in response.data]
+
+    def test_lists_are_served_from_the_cache(self):
+        self.names('/api/machines/')
+        self.names('/api/suppliers/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('/api/machines/'), ['Laser 1'])
+            self.assertEqual(self.names('/api/suppliers/'), ['Supplier'])
+
+    def test_machine_writes_invalidate_the_machine_list(self):
+        self.names('/api/machines/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.machine.name = 'Laser 1 (renamed)'
+            self.machine.save()
+        self.assertEqual(self.names('/api/machines/'), ['Laser 1 (renamed)'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.machine.delete()
+        self.assertEqual(self.names('/api/machines/'), [])
+
+    def test_supplier_writes_invalidate_both_lists(self):
+        self.names('/api/machines/')
+        self.names('/api/suppliers/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.supplier.name = 'Renamed Supplier'
+            self.supplier.save()
+        self.assertEqual(self.names('/api/machines/', 'supplier_name'), ['Renamed Supplier'])
+        self.assertEqual(self.names('/api/suppliers/'), ['Renamed Supplier'])
+
+    def test_uncommitted_writes_keep_the_cache(self):
+        self.names('/api/machines/')
+        with self.captureOnCommitCallbacks(execute=False):
+            Machine.objects.create(supplier=self.supplier, name='Laser 2')
+        with self.assertNumQueries(0):
+            self.names('/api/machines/')
+
+
+STEP_FILE = b"""ISO-10303-21;
+HEADER;
+FILE_NAME('part.step','',(''),(''),'','','');
+ENDSEC;
+DATA;
+#1=CARTESIAN_POINT('',(0.,0.,0.));
+#2=CARTESIAN_POINT('',(10.,20.,5.));
+#3=MANIFOLD_SOLID_BREP('',#4);
+#5=(LENGTH_UNIT()NAMED_UNIT(*)SI_UNIT(.MILLI.,.METRE.));
+ENDSEC;
+END-ISO-10303-21;
+"""
+
+
+class GeometryTests(OrderTestCase):
+    def run_worker(self):
+        call_command('process_geometry', once=True, stdout=open(os.devnull, 'w'))
+
+    def test_analyses_queued_step_files(self):
+        order = self.make_order(step_file=ContentFile(STEP_FILE, name='part.step'))
+        self.assertEqual(order.geometry.status, 'pending')
+        self.run_worker()
+        geometry = OrderGeometry.objects.get(order=order)
+        self.assertEqual(geometry.status, 'done')
+        self.assertEqual((geometry.bbox_x, geometry.bbox_y, geometry.bbox_z, geometry.part_count), (10, 20, 5, 1))
+
+    def test_results_reach_delta_sync_and_etags(self):
+        order = self.make_order(step_file=ContentFile(STEP_FILE, name='part.step'))
+        self.settle()
+        cursor = OrderChange.objects.last().pk
+        etag = self.admin_api.get(f'/api/orders/{order.pk}/')['ETag']
+        self.run_worker()
+        changes = self.admin_api.get('/api/orders/', {'since': cursor}).data
+        self.assertEqual(changes['orders'][0]['geometry']['status'], 'done')
+        self.assertEqual(self.admin_api.get(f'/api/orders/{order.pk}/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_unparseable_files_fail_and_are_reported(self):
+        order = self.make_order(step_file=ContentFile(b'not a step file', name='part.step'))
+        changes = OrderChange.objects.count()
+        self.run_worker()
+        geometry = OrderGeometry.objects.get(order=order)
+        self.assertEqual(geometry.status, 'failed')
+        self.assertIn('StepError', geometry.error)
+        self.assertEqual(OrderChange.objects.count(), changes + 1)
+
+    def test_same_content_is_analysed_once(self):
+        self.make_order(step_file=ContentFile(STEP_FILE, name='a.step'))
+        self.run_worker()
+        order = self.make_order(step_file=ContentFile(STEP_FILE, name='b.step'))
+        with mock.patch('orders.step.analyse') as analyse:
+            self.run_worker()
+        analyse.assert_not_called()
+        self.assertEqual(OrderGeometry.objects.get(order=order).bbox_y, 20)
+
+    def test_file_replaced_during_analysis_is_requeued(self):
+        order = self.make_order(step_file=ContentFile(STEP_FILE, name='part.step'))
+        job = geometry.claim_next()
+        order.step_file = ContentFile(STEP_FILE.replace(b'20.', b'30.'), name='part.step')
+        order.save()
+        geometry.process(job)
+        self.assertEqual(OrderGeometry.objects.get(order=order).status, 'pending')
+
+
+class MachinePhotoTests(OrderTestCase):
+    def photo(self, name, image_format):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(buffer, format=image_format)
+        return ContentFile(buffer.getvalue(), name=name)
+
+    def thumbnails(self):
+        token_version(self.admin.pk)
+        return self.admin_api.get('/api/machines/').data[0]['photo_thumbnails']
+
+    def test_saved_photos_get_renditions(self):
+        self.assertIsNone(self.thumbnails())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.machine.photo = self.photo('cnc.jpg', 'JPEG')
+            self.machine.save()
+        thumbnails = self.thumbnails()
+        self.assertEqual(sorted(thumbnails), ['large', 'medium', 'small'])
+        self.assertEqual(thumbnails['small']['width'], 160)
+        self.assertIn('/renditions/cnc.jpg/w160.webp', thumbnails['small']['webp'])
+        with Image.open(os.path.join(settings.MEDIA_ROOT, self.machine.photo.name.rsplit('/', 1)[0],
+                                     'renditions', 'cnc.jpg', 'w480.jpeg')) as image:
+            self.assertEqual(image.size, (480, 320))
+
+    def test_photos_sharing_a_stem_keep_their_own_renditions(self):
+        other = Machine.objects.create(supplier=self.supplier, name='Laser 2')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.machine.photo = self.photo('cnc.jpg', 'JPEG')
+            self.machine.save()
+            other.photo = self.photo('cnc.png', 'PNG')
+            other.save()
+        names = {rendition_names(machine.photo.name)['small']['webp'] for machine in (self.machine, other)}
+        self.assertEqual(len(names), 2)
+        for name in names:
+            self.assertTrue(default_storage.exists(name))
+
+    def test_unreadable_photos_fall_back_to_the_original(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.machine.photo = ContentFile(b'not an image', name='broken.jpg')
+            self.machine.save()
+        token_version(self.admin.pk)
+        machine = self.admin_api.get('/api/machines/').data[0]
+        self.assertIsNone(machine['photo_thumbnails'])
+        self.assertIn('broken', machine['photo_url'])
+
+
+class SpecParsingTests(SimpleTestCase):
+    def test_bed_sizes(self):
+        self.assertEqual(parse_bed_size('3000 x 1500 mm'), (3000, 1500))
+        self.assertEqual(parse_bed_size('1.5m x 3m'), (3000, 1500))
+        self.assertEqual(parse_bed_size('3000*1500'), (3000, 1500))
+        self.assertEqual(parse_bed_size('large'), (None, None))
+
+    def test_commas_before_three_digits_separate_thousands(self):
+        self.assertEqual(parse_bed_size('3,000 x 1,500 mm'), (3000, 1500))
+        self.assertEqual(parse_power('12,000 W'), 12000)
+        self.assertEqual(parse_length('4,000.5 mm'), 4000.5)
+
+    def test_other_commas_are_decimal_separators(self):
+        self.assertEqual(parse_bed_size('3,0 x 1,5 m'), (3000, 1500))
+        self.assertEqual(parse_power('2,5 kW'), 2500)
+        self.assertEqual(parse_length('1,2345 m'), 1234.5)
+
+    def test_bare_numbers_use_the_field_defaults(self):
+        self.assertEqual(parse_power('6'), 6000)
+        self.assertEqual(parse_length('3.1'), 3100)
+        self.assertEqual(parse_force('100T'), 100)
+
+
+@override_settings(PRODUCTION_HOURS_PER_DAY=24)
+class SchedulingTests(OrderTestCase):
+    def approve(self, order, hours, machine=None, **data):
+        machine = machine or self.machine
+        response = self.admin_api.post(f'/api/orders/{order.pk}/approve_order/', {
+            'machine_id': machine.pk, 'estimated_hours': hours, **data,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        return order
+
+    def act(self, order, action):
+        self.assertEqual(self.admin_api.post(f'/api/orders/{order.pk}/{action}/').status_code, 200)
+
+    def slots(self, *orders):
+        for order in orders:
+            order.refresh_from_db()
+        return [(order.scheduled_start, order.scheduled_end) for order in orders]
+
+    def accept(self, *orders):
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(status='accepted')
+
+    def test_approved_orders_queue_back_to_back(self):
+        first = self.approve(self.make_order(), 10)
+        second = self.approve(self.make_order(), 5)
+        self.assertAlmostEqual(first.scheduled_start, timezone.now(), delta=timedelta(minutes=1))
+        self.assertEqual(first.scheduled_end - first.scheduled_start, timedelta(hours=10))
+        self.assertEqual(second.scheduled_start, first.scheduled_end)
+        self.assertEqual(second.scheduled_end - second.scheduled_start, timedelta(hours=5))
+        self.assertEqual(second.expected_completion_date, second.scheduled_end.date())
+
+    def test_run_time_is_estimated_from_quantity_and_machine_type(self):
+        order = self.approve(self.make_order(quantity=60, material_thickness='6'), '')
+        # Laser: 0.5 h setup plus 2 min per part, doubled for 6 mm against the 3 mm reference
+        self.assertEqual(order.estimated_hours, 4.5)
+
+    def test_starting_production_moves_the_order_to_the_front(self):
+        first = self.approve(self.make_order(), 10)
+        second = self.approve(self.make_order(), 5)
+        self.accept(first, second)
+        self.act(second, 'start_production')
+        (first_start, first_end), (second_start, second_end) = self.slots(first, second)
+        self.assertAlmostEqual(second_start, timezone.now(), delta=timedelta(minutes=1))
+        self.assertEqual(first_start, second_end)
+        self.assertEqual(first_end - first_start, timedelta(hours=10))
+
+    def test_finishing_early_pulls_the_queue_forward(self):
+        first = self.approve(self.make_order(), 10)
+        second = self.approve(self.make_order(), 5)
+        self.accept(first, second)
+        self.act(first, 'start_production')
+        self.act(first, 'complete_order')
+        (_, first_end), (second_start, second_end) = self.slots(first, second)
+        self.assertAlmostEqual(second_start, timezone.now(), delta=timedelta(minutes=1))
+        self.assertEqual(second_end - second_start, timedelta(hours=5))
+        self.assertLessEqual(first_end, second_start)
+
+    def test_rejecting_closes_the_gap(self):
+        first = self.approve(self.make_order(), 10)
+        second = self.approve(self.make_order(), 5)
+        response = self.admin_api.post(f'/api/orders/{first.pk}/reject_order/', {'rejection_reason': 'No'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        (first_start, _), (second_start, _) = self.slots(first, second)
+        self.assertIsNone(first_start)
+        self.assertAlmostEqual(second_start, timezone.now(), delta=timedelta(minutes=1))
+
+    def test_assigning_another_machine_moves_the_slot(self):
+        laser = Machine.objects.create(supplier=self.supplier, name='Laser 2')
+        first = self.approve(self.make_order(), 10)
+        second = self.approve(self.make_order(), 5)
+        response = self.admin_api.post(f'/api/orders/{first.pk}/assign_machine/', {'machine_id': laser.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        (first_start, _), (second_start, _) = self.slots(first, second)
+        self.assertAlmostEqual(first_start, timezone.now(), delta=timedelta(minutes=1))
+        self.assertAlmostEqual(second_start, timezone.now(), delta=timedelta(minutes=1))
+
+    def test_approval_without_a_machine_uses_the_least_loaded_one(self):
+        self.approve(self.make_order(), 72)
+        Machine.objects.create(supplier=self.supplier, name='Laser 2')
+        order = self.make_order()
+        response = self.admin_api.post(f'/api/orders/{order.pk}/approve_order/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertLessEqual(order.expected_completion_date, (timezone.now() + timedelta(days=1)).date())
+
+    def test_queue_reports_conflicts_and_reschedule_repairs_them(self):
+        yesterday = (timezone.now() - timedelta(days=1)).date()
+        first = self.approve(self.make_order(), 10)
+        second = self.approve(self.make_order(), 5, expected_completion_date=yesterday.isoformat())
+        Order.objects.filter(pk=first.pk).update(scheduled_start=None, scheduled_end=None)
+
+        response = self.admin_api.get(f'/api/machines/{self.machine.pk}/queue/')
+        self.assertEqual(response.status_code, 200)
+        conflicts = {order['id']: order['conflicts'] for order in response.data['orders']}
+        self.assertEqual(conflicts, {first.pk: ['unscheduled'], second.pk: ['late']})
+
+        call_command('reschedule_orders', stdout=open(os.devnull, 'w'))
+        # The slot-less order goes behind the queue it dropped out of
+        (first_start, first_end), (second_start, second_end) = self.slots(first, second)
+        self.assertAlmostEqual(second_start, timezone.now(), delta=timedelta(minutes=1))
+        self.assertEqual(first_start, second_end)
+        self.assertEqual(first_end - first_start, timedelta(hours=10))
+
+
+class BulkImportTests(OrderTestCase):
+    def archive(self, members):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name, content in members.items():
+                archive.writestr(name, content)
+        return SimpleUploadedFile('files.zip', buffer.getvalue(), content_type='application/zip')
+
+    def manifest(self, *rows):
+        fields = ['part_id', 'product_description', 'quantity', 'material_thickness', 'material_type',
+                  'material_grade', 'surface_treatment', 'packing_standard', 'target_price', 'd2_draft_design', 'step_file']
+        lines = [','.join(fields)]
+        for part_id, drawing, step_file in rows:
+            lines.append(f'{part_id},Bracket,5,2,Mild Steel,S235,None,Standard,100,{drawing},{step_file}')
+        return SimpleUploadedFile('orders.csv', '\n'.join(lines).encode(), content_type='text/csv')
+
+    def test_imports_valid_rows_and_reports_the_rest(self):
+        self.make_order(part_id='TAKEN')
+        response = self.client_api.post('/api/orders/bulk_import/', {
+            'manifest': self.manifest(
+                ('A-1', 'drawing.pdf', 'part.step'),
+                ('A-2', 'drawing.pdf', ''),
+                ('TAKEN', 'drawing.pdf', ''),
+                ('A-3', 'missing.pdf', ''),
+            ),
+            'files': self.archive({'drawing.pdf': b'%PDF-1.4', 'part.step': STEP_FILE}),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row['row'] for row in response.data['created']], [1, 2])
+        self.assertEqual({row['row']: list(row['errors']) for row in response.data['errors']}, {3: ['part_id'], 4: ['d2_draft_design']})
+
+        orders = Order.objects.filter(part_id__in=['A-1', 'A-2']).order_by('part_id')
+        self.assertEqual([order.client_id for order in orders], [self.client_user.pk] * 2)
+        # The shared drawing is stored once and referenced by both orders
+        self.assertEqual(orders[0].d2_draft_design.name, orders[1].d2_draft_design.name)
+        self.assertEqual(StoredBlob.objects.get(name=orders[0].d2_draft_design.name).ref_count, 2)
+        self.assertEqual(OrderGeometry.objects.get(order=orders[0]).status, 'pending')
+        self.assertEqual(OrderChange.objects.filter(order_id__in=[order.pk for order in orders]).count(), 2)
+
+    def test_queries_do_not_grow_with_the_rows(self):
+        def run(prefix, count):
+            rows = [(f'{prefix}-{number}', 'drawing.pdf', '') for number in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client_api.post('/api/orders/bulk_import/', {
+                    'manifest': self.manifest(*rows), 'files': self.archive({'drawing.pdf': b'%PDF-1.4'}),
+                }, format='multipart')
+            self.assertEqual(len(response.data['created']), count)
+            return len(queries)
+
+        run('W', 1)  # Stores the drawing
+        self.assertEqual(run('B', 3), run('C', 30))
+
+    def test_unusable_manifests_are_rejected(self):
+        response = self.client_api.post('/api/orders/bulk_import/', {
+            'manifest': SimpleUploadedFile('orders.json', b'{"orders": 5}'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        response = self.client_api.post('/api/orders/bulk_import/', {
+            'manifest': self.manifest(('A-1', 'drawing.pdf', '')),
+            'files': SimpleUploadedFile('files.zip', b'not a zip'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.filter(part_id='A-1').exists())
+
+
+class BulkActionTests(OrderTestCase):
+    def bulk(self, action, ids, **data):
+        return self.admin_api.post(f'/api/orders/{action}/', {'ids': ids, **data}, format='json')
+
+    def test_approve_updates_eligible_orders_and_reports_the_rest(self):
+        orders = [self.make_order() for _ in range(3)]
+        closed = self.make_order('rejected')
+        response = self.bulk('bulk_approve', [order.pk for order in orders] + [closed.pk, 999999],
+                             machine_id=self.machine.pk, estimated_hours=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], [order.pk for order in orders])
+        self.assertEqual({error['id'] for error in response.data['errors']}, {closed.pk, 999999})
+        approved = list(Order.objects.filter(pk__in=response.data['updated']).order_by('scheduled_start'))
+        self.assertEqual({order.status for order in approved}, {'awaiting_payment'})
+        # Queued back to back on the machine in the order the ids were given
+        self.assertEqual([order.pk for order in approved], [order.pk for order in orders])
+        self.assertEqual(approved[1].scheduled_start, approved[0].scheduled_end)
+        self.assertEqual(OrderEvent.objects.filter(order__in=approved, event='approve_order').count(), 3)
+
+    def test_query_count_does_not_grow_with_the_ids(self):
+        def run(count):
+            ids = [self.make_order().pk for _ in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(len(self.bulk('bulk_reject', ids, rejection_reason='No capacity').data['updated']), count)
+            return len(queries)
+
+        token_version(self.admin.pk)
+        self.assertEqual(run(2), run(20))
+
+    def test_start_production_skips_orders_without_a_machine(self):
+        ready = self.make_order('accepted', machine=self.machine)
+        unassigned = self.make_order('accepted')
+        response = self.bulk('bulk_start_production', [ready.pk, unassigned.pk])
+        self.assertEqual(response.data['updated'], [ready.pk])
+        self.assertEqual(response.data['errors'], [{'id': unassigned.pk, 'error': 'A machine must be assigned before starting production.'}])
+        ready.refresh_from_db()
+        self.assertEqual(ready.status, 'in_production')
+
+    def test_bulk_actions_are_for_admins(self):
+        order = self.make_order()
+        response = self.client_api.post('/api/orders/bulk_reject/', {'ids': [order.pk], 'rejection_reason': 'x'}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.bulk('bulk_reject', [order.pk]).status_code, 400)
+        self.assertEqual(self.bulk('bulk_reject', [], rejection_reason='x').status_code, 400)
+
+
+@mock.patch('orders.exports.CHUNK_SIZE', 2)
+class ExportTests(OrderTestCase):
+    def export(self, path='export', **params):
+        response = self.admin_api.get(f'/api/orders/{path}/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def csv_rows(self, path='export', **params):
+        return list(csv.reader(io.StringIO(self.export(path, **params).decode('utf-8-sig'))))
+
+    def test_csv_has_every_filtered_order_across_pages(self):
+        orders = [self.make_order(machine=self.machine) for _ in range(5)]
+        self.make_order('rejected')
+        header, *rows = self.csv_rows(status='under_review')
+        self.assertEqual(header[:3], ['Order ID', 'Part ID', 'Status'])
+        self.assertEqual([int(row[0]) for row in rows], [order.pk for order in orders])
+        self.assertEqual(rows[0][header.index('Machine')], 'Laser 1')
+
+    def test_formulas_are_neutralised_in_csv_only(self):
+        self.make_order(product_description='=cmd|calc', material_grade='-2mm chamfer')
+        header, row = self.csv_rows()
+        self.assertEqual(row[header.index('Description')], "'=cmd|calc")
+        self.assertEqual(row[header.index('Grade')], "'-2mm chamfer")
+
+        with zipfile.ZipFile(io.BytesIO(self.export(filetype='xlsx'))) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn('>=cmd|calc</t>', sheet)
+        self.assertIn('>-2mm chamfer</t>', sheet)
+        self.assertNotIn("'=cmd", sheet)
+
+    def test_offer_history(self):
+        order = self.make_order('negotiation')
+        OrderMessage.objects.create(order=order, sender=self.admin, message='Can do 900', is_admin=True, type='counter_offer', amount=900)
+        OrderMessage.objects.create(order=order, sender=self.client_user, message='Hello')
+        header, *rows = self.csv_rows('export_offers')
+        self.assertEqual([row[header.index('Message')] for row in rows], ['Can do 900'])
+
+    def test_exports_are_for_admins(self):
+        self.assertEqual(self.client_api.get('/api/orders/export/').status_code, 403)
+        self.assertEqual(self.admin_api.get('/api/orders/export/', {'filetype': 'pdf'}).status_code, 400)
+
+
+class SearchTests(OrderTestCase):
+    def search(self, q, api=None, **params):
+        response = (api or self.admin_api).get('/api/orders/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids(self, q, api=None, **params):
+        return [result['order']['id'] for result in self.search(q, api, **params)['results']]
+
+    def test_part_ids_rank_above_descriptions(self):
+        described = self.make_order(product_description='Wall bracket, powder coated')
+        named = self.make_order(part_id='BRACKET-7')
+        self.make_order(product_description='Hinge plate')
+        self.assertEqual(self.ids('bracket'), [named.pk, described.pk])
+
+    def test_every_term_must_match_and_long_terms_match_prefixes(self):
+        both = self.make_order(product_description='Stainless bracket')
+        hinge = self.make_order(product_description='Stainless hinge')
+        self.assertEqual(self.ids('stainless brack'), [both.pk])
+        self.assertEqual(sorted(self.ids('stain')), [both.pk, hinge.pk])
+        # Terms shorter than PREFIX_MIN only match whole words
+        self.assertEqual(self.ids('st'), [])
+
+    def test_messages_match_with_highlighted_excerpts(self):
+        order = self.make_order()
+        OrderMessage.objects.create(order=order, sender=self.client_user, message='Please use <b>anodised</b> finish')
+        result, = self.search('anodised')['results']
+        self.assertEqual(result['order']['id'], order.pk)
+        self.assertEqual(result['messages'][0]['excerpt'], 'Please use &lt;b&gt;<mark>anodised</mark>&lt;/b&gt; finish')
+
+    def test_edits_are_reindexed(self):
+        order = self.make_order(product_description='Bracket')
+        order.product_description = 'Hinge'
+        order.save()
+        self.assertEqual(self.ids('bracket'), [])
+        self.assertEqual(self.ids('hinge'), [order.pk])
+        self.assertEqual(self.search('hinge')['results'][0]['highlights'], {'product_description': '<mark>Hinge</mark>'})
+
+    def test_clients_only_find_their_own_orders(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass', role='client')
+        mine = self.make_order(product_description='Bracket')
+        self.make_order(product_description='Bracket', client=other)
+        self.assertEqual(self.ids('bracket', self.client_api), [mine.pk])
+        self.assertEqual(len(self.ids('bracket')), 2)
+
+    def test_pages_and_filters(self):
+        orders = [self.make_order(product_description='Bracket') for _ in range(3)]
+        self.make_order('rejected', product_description='Bracket')
+        first = self.search('bracket', page_size=2, status='under_review')
+        self.assertEqual(first['count'], 3)
+        self.assertIsNotNone(first['next'])
+        second = self.search('bracket', page_size=2, page=2, status='under_review')
+        self.assertEqual(
+            sorted(result['order']['id'] for result in first['results'] + second['results']),
+            [order.pk for order in orders],
+        )
+        self.assertEqual(self.admin_api.get('/api/orders/search/', {'q': '  '}).status_code, 400)
+
+    def test_rebuilt_index_gives_the_same_results(self):
+        order = self.make_order(product_description='Bracket')
+        OrderMessage.objects.create(order=order, sender=self.client_user, message='Needs deburring')
+        SearchTerm.objects.all().delete()
+        self.assertEqual(self.ids('deburring'), [])
+        call_command('rebuild_search_index', stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.ids('deburring'), [order.pk])
+        self.assertEqual(self.ids('bracket'), [order.pk])
+
+
+class TransitionTests(OrderTestCase):
+    def test_losing_a_race_is_a_conflict(self):
+        order = self.make_order()
+        # Another request moves the order on after this one loaded it
+        Order.objects.filter(pk=order.pk).update(status='negotiation')
+        with self.assertRaises(TransitionError) as raised:
+            transition(order, 'approve_order', self.admin)
+        self.assertEqual(raised.exception.status, 409)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'negotiation')
+
+    def test_expected_field_changed_is_a_conflict(self):
+        order = self.make_order('accepted', machine=self.machine)
+        Order.objects.filter(pk=order.pk).update(machine=None)
+        with self.assertRaises(TransitionError) as raised:
+            transition(order, 'start_production', self.admin, expect=['machine_id'])
+        self.assertEqual(raised.exception.status, 409)
+
+    def test_losing_to_the_same_transition_is_a_no_op(self):
+        order = self.make_order()
+        Order.objects.filter(pk=order.pk).update(status='awaiting_payment')
+        self.assertFalse(transition(order, 'approve_order', self.admin))
+        self.assertEqual(order.status, 'awaiting_payment')
+
+    def test_repeated_action_says_nothing_changed(self):
+        order = self.make_order()
+        url = f'/api/orders/{order.pk}/approve_order/'
+        self.assertEqual(self.admin_api.post(url, {'price_estimate': 900}, format='json').data['message'],
+                         'Order approved successfully')
+        response = self.admin_api.post(url, {'price_estimate': 900}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['message'], 'Order is already awaiting payment; nothing was changed.')
+        self.assertEqual(order.events.count(), 1)
+
+    def test_invalid_source_is_rejected(self):
+        order = self.make_order('completed')
+        response = self.admin_api.post(f'/api/orders/{order.pk}/reject_order/', {'rejection_reason': 'x'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_write_losing_a_race_is_a_conflict(self):
+        order = self.make_order()
+        assign = mock.patch('orders.scheduling.assign', side_effect=lambda *args, **kwargs: (
+            Order.objects.filter(pk=order.pk).update(status='rejected')))
+        with assign:
+            response = self.admin_api.post('/api/orders/bulk_assign_machine/',
+                                           {'ids': [order.pk], 'machine_id': self.machine.pk}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertIsNone(Order.objects.get(pk=order.pk).machine_id)
+
+    def test_patch_cannot_change_the_status(self):
+        order = self.make_order()
+        response = self.admin_api.patch(f'/api/orders/{order.pk}/', {'status': 'completed', 'admin_notes': 'Checked'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.admin_notes), ('under_review', 'Checked'))
+
+    def test_repeated_machine_assignment_says_nothing_changed(self):
+        order = self.make_order('accepted')
+        url = f'/api/orders/{order.pk}/assign_machine/'
+        response = self.admin_api.post(url, {'machine_id': self.machine.pk}, format='json')
+        self.assertEqual(response.data['message'], 'Machine assigned successfully')
+        response = self.admin_api.post(url, {'machine_id': self.machine.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['message'], 'Order is already assigned to Laser 1; nothing was changed.')
+        self.assertEqual(order.events.count(), 1)
+
+    def test_machine_assignment_losing_a_race_is_a_conflict(self):
+        order = self.make_order('accepted')
+        other = Machine.objects.create(supplier=self.supplier, name='Laser 2')
+        # Another request assigns a machine after this one loaded the order
+        Order.objects.filter(pk=order.pk).update(machine=other)
+        with self.assertRaises(TransitionError) as raised:
+            transition(order, 'assign_machine', self.admin, lambda order, now: setattr(order, 'machine', self.machine),
+                       expect=['machine_id'])
+        self.assertEqual(raised.exception.status, 409)
+        self.assertEqual(Order.objects.get(pk=order.pk).machine_id, other.pk)
+
+    def test_closed_orders_cannot_get_a_machine(self):
+        order = self.make_order('completed')
+        response = self.admin_api.post(f'/api/orders/{order.pk}/assign_machine/', {'machine_id': self.machine.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(Order.objects.get(pk=order.pk).machine_id)
+
+
+class StoredBlobTests(OrderTestCase):
+    def test_ref_count_follows_orders_and_gc_deletes_unreferenced(self):
+        first = self.make_order(d2_draft_design=ContentFile(b'same drawing', name='a.pdf'))
+        second = self.make_order(d2_draft_design=ContentFile(b'same drawing', name='b.pdf'))
+        self.assertEqual(first.d2_draft_design.name, second.d2_draft_design.name)
+        blob = StoredBlob.objects.get(name=first.d2_draft_design.name)
+        self.assertEqual(blob.ref_count, 2)
+        path = first.d2_draft_design.path
+
+        first.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        call_command('gc_order_files', grace_hours=0, stdout=open(os.devnull, 'w'))
+        self.assertTrue(os.path.exists(path))
+
+        second.delete()
+        self.assertEqual(StoredBlob.objects.get(pk=blob.pk).ref_count, 0)
+        call_command('gc_order_files', grace_hours=0, stdout=open(os.devnull, 'w'))
+        self.assertFalse(StoredBlob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_gc_keeps_recent_blobs(self):
+        order = self.make_order(d2_draft_design=ContentFile(b'drawing', name='a.pdf'))
+        name = order.d2_draft_design.name
+        order.delete()
+        call_command('gc_order_files', stdout=open(os.devnull, 'w'))
+        self.assertTrue(StoredBlob.objects.filter(name=name).exists())
+
+    def test_recount_fixes_drift(self):
+        order = self.make_order(d2_draft_design=ContentFile(b'drawing', name='a.pdf'))
+        StoredBlob.objects.update(ref_count=0)
+        call_command('gc_order_files', recount=True, grace_hours=0, stdout=open(os.devnull, 'w'))
+        self.assertEqual(StoredBlob.objects.get(name=order.d2_draft_design.name).ref_count, 1)
+
+
+class ChunkedUploadTests(OrderTestCase):
+    content = b'0123456789'
+
+    def start(self, content=None):
+        content = content or self.content
+        path = os.path.join(self.media_root, 'content')
+        with open(path, 'wb') as handle:
+            handle.write(content)
+        response = self.client_api.post('/api/uploads/', {
+            'kind': 'd2_draft_design', 'filename': 'drawing.pdf', 'size': len(content), 'sha256': file_sha256(path),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def put(self, upload_id, offset, chunk):
+        return self.client_api.generic('PUT', f'/api/uploads/{upload_id}/', chunk,
+                                       content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_offset_mismatch_and_resume(self):
+        upload = self.start()
+        self.assertEqual(upload['offset'], 0)
+        self.assertEqual(self.put(upload['id'], 0, self.content[:4]).data['offset'], 4)
+
+        # A retried chunk the server already has
+        response = self.put(upload['id'], 0, self.content[:4])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '4')
+
+        # The client asks where to resume and sends the rest
+        self.assertEqual(self.client_api.get(f"/api/uploads/{upload['id']}/").data['offset'], 4)
+        self.assertEqual(self.put(upload['id'], 4, self.content[4:]).data['offset'], len(self.content))
+
+        response = self.client_api.post(f"/api/uploads/{upload['id']}/finalize/", {}, format='json')
+        self.assertEqual(response.data['status'], 'complete')
+        stored = Upload.objects.get(pk=upload['id']).stored_name
+        with open(os.path.join(self.media_root, stored), 'rb') as handle:
+            self.assertEqual(handle.read(), self.content)
+
+    def test_chunk_past_declared_size_is_rejected(self):
+        upload = self.start()
+        self.assertEqual(self.put(upload['id'], 0, self.content + b'x').status_code, 400)
+        self.assertEqual(Upload.objects.get(pk=upload['id']).offset, 0)
+
+    def test_finalize_needs_every_byte(self):
+        upload = self.start()
+        self.put(upload['id'], 0, self.content[:4])
+        response = self.client_api.post(f"/api/uploads/{upload['id']}/finalize/", {}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+    def test_another_clients_content_is_not_attached_by_hash(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass', role='client')
+        self.make_order(client=other, d2_draft_design=ContentFile(self.content, name='drawing.pdf'))
+        upload = self.start()
+        self.assertEqual(upload['status'], 'pending')
+        self.assertEqual(upload['offset'], 0)
+
+
+class ConditionalGetTests(OrderTestCase):
+    def round_trip(self, url, change):
+        first = self.admin_api.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        self.assertEqual(self.admin_api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        changed = self.admin_api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_machines_list(self):
+        self.round_trip('/api/machines/', lambda: Machine.objects.create(supplier=self.supplier, name='Laser 2'))
+
+    def test_orders_list(self):
+        order = self.make_order()
+        self.settle()
+
+        def change():
+            order.admin_notes = 'changed'
+            order.save()
+        self.round_trip('/api/orders/', change)
+
+    def test_machine_etag_is_the_same_in_every_worker(self):
+        etag = self.admin_api.get('/api/machines/')['ETag']
+        # An expired memo, or a worker with its own local-memory cache
+        caches['reference'].clear()
+        self.assertEqual(self.admin_api.get('/api/machines/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Machine.objects.create(supplier=self.supplier, name='Laser 2')
+        caches['reference'].clear()
+        self.assertEqual(self.admin_api.get('/api/machines/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_differs_per_user(self):
+        self.make_order()
+        etag = self.admin_api.get('/api/orders/')['ETag']
+        self.assertEqual(self.client_api.get('/api/orders/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class QueryCountTests(OrderTestCase):
+    """Exact counts for the hot list endpoints; ``bench_api`` budgets are only ceilings
+
+    Token and reference versions are cached first, as they are for all but the first request.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.orders = [self.make_order(machine=self.machine) for _ in range(5)]
+        for order in self.orders[:2]:
+            OrderMessage.objects.create(order=order, sender=self.client_user, message='Hello')
+
+    def assertListQueries(self, count, api, url):
+        for user in (self.admin, self.client_user):
+            token_version(user.pk)
+        get_version('machines')
+        with self.assertNumQueries(count):
+            response = api.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_orders_list(self):
+        self.assertEqual(len(self.assertListQueries(3, self.admin_api, '/api/orders/').data), 5)
+        for cache in caches.all():
+            cache.clear()
+        self.make_order(machine=self.machine)
+        # Independent of the number of orders
+        self.assertEqual(len(self.assertListQueries(3, self.admin_api, '/api/orders/').data), 6)
+
+    def test_orders_list_page(self):
+        self.assertListQueries(3, self.admin_api, '/api/orders/?page_size=2')
+
+    def test_client_orders_list(self):
+        self.assertListQueries(3, self.client_api, '/api/orders/')
+
+    def test_messages_list(self):
+        order = self.orders[0]
+        for _ in range(5):
+            OrderMessage.objects.create(order=order, sender=self.admin, message='Reply', is_admin=True)
+        self.assertListQueries(2, self.client_api, f'/api/orders/{order.pk}/messages/')
+
+    def test_machines_list(self):
+        Machine.objects.create(supplier=self.supplier, name='Laser 2')
+        self.assertListQueries(1, self.admin_api, '/api/machines/')
@@ -0,0 +1,115 @@
+"""The order state machine.
+
+``TRANSITIONS`` declares, per action, the statuses an order may leave and
+the one it moves to. ``transition`` applies one to a loaded order as a
+single conditional ``UPDATE ... WHERE id = ? AND status = ?`` of only the
+fields the action changed, so two requests racing on the same order cannot
+both move it: the loser's write matches no row and is rolled back. An order
+already in the target status (a double submit, or the twin request that
+won) is a no-op. Each move is recorded as an ``OrderEvent``.
+
+A ``Transition`` without a target (``assign_machine``) keeps the status but
+is still guarded by it: the write only lands while the order is in a source
+status. Repeating one that changes nothing is a no-op as well.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .events import publish_order_event
+from .models import Order, OrderEvent
+from .signals import record_order_changes
+
+OPEN_STATUSES = ('under_review', 'negotiation', 'awaiting_payment', 'accepted', 'in_production')
+
+
+class Transition:
+    """``target`` None: the action keeps the order's status"""
+    def __init__(self, sources, target, error):
+        self.sources = sources
+        self.target = target
+        self.error = error
+
+
+TRANSITIONS = {
+    'approve_order': Transition(('under_review', 'negotiation'), 'awaiting_payment', 'Order cannot be approved at this stage'),
+    'reject_order': Transition(OPEN_STATUSES, 'rejected', 'Order cannot be rejected at this stage'),
+    'start_production': Transition(('accepted',), 'in_production', 'Order must be accepted before starting production'),
+    'complete_order': Transition(('in_production',), 'completed', 'Order must be in production before marking as completed'),
+    'confirm_price': Transition(('under_review',), 'accepted', 'Order cannot be confirmed at this stage.'),
+    'send_counter_offer': Transition(('under_review', 'negotiation'), 'negotiation', 'Negotiation not allowed at this stage.'),
+    'accept_counter_offer': Transition(('negotiation',), 'awaiting_payment', 'Order is not in negotiation.'),
+    'confirm_payment': Transition(('awaiting_payment',), 'accepted', 'Order is not awaiting payment.'),
+    'assign_machine': Transition(OPEN_STATUSES, None, 'A machine cannot be assigned to a closed order.'),
+}
+
+
+class TransitionError(Exception):
+    """The order cannot make the transition; ``status`` is the HTTP status to answer with"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class _Lost(Exception):
+    """Another request changed the order between our read and our write"""
+
+
+def _values(order):
+    return {field.attname: getattr(order, field.attname) for field in Order._meta.concrete_fields}
+
+
+def transition(order, event, actor=None, apply=None, expect=()):
+    """Make the ``event`` transition on ``order``; returns False if the order was already there.
+
+    For an action without a target, "already there" means ``apply`` changed nothing.
+
+    ``apply(order, now)`` sets the other fields the action changes (and may
+    write related rows, or raise ``TransitionError``) inside the transaction.
+    ``expect`` names fields whose loaded values the change was computed from:
+    the write only lands if they, too, are unchanged.
+    """
+    declared = TRANSITIONS[event]
+    source = order.status
+    target = declared.target or source
+    if source not in declared.sources:
+        if source == declared.target:
+            return False
+        raise TransitionError(declared.error)
+    before = _values(order)
+    try:
+        with transaction.atomic():
+            now = timezone.now()
+            order.status = target
+            if apply:
+                apply(order, now)
+            order.updated_at = now
+            changed = {name: value for name, value in _values(order).items() if value != before[name]}
+            if declared.target is None and changed.keys() <= {'updated_at'}:
+                order.updated_at = before['updated_at']
+                return False
+            conditions = {name: before[name] for name in expect}
+            if not Order.objects.filter(pk=order.pk, status=source, **conditions).update(**changed):
+                raise _Lost
+            OrderEvent.objects.create(order=order, event=event, from_status=source, to_status=target, actor=actor)
+            record_order_changes([order])
+    except _Lost:
+        order.refresh_from_db()
+        if declared.target and order.status == declared.target and declared.target not in declared.sources:
+            return False
+        if order.status in declared.sources:
+            raise TransitionError('Order was changed by another request; try again.', status=409)
+        raise TransitionError(declared.error)
+    publish_order_event(order, event)
+    return True
+
+
+def record_events(orders, event, previous, actor=None):
+    """``OrderEvent`` rows for the bulk-written ``orders`` whose status moved from ``previous[pk]``
+
+    Every order gets one for actions that keep the status.
+    """
+    keeps_status = TRANSITIONS[event].target is None
+    OrderEvent.objects.bulk_create([
+        OrderEvent(order=order, event=event, from_status=previous[order.pk], to_status=order.status, actor=actor)
+        for order in orders if keeps_status or order.status != previous[order.pk]
+    ])
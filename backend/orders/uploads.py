@@ -0,0 +1,164 @@
+"""Chunk storage for resumable uploads.
+
+Chunks are read from the request stream in small reads into a file of their
+own, so a chunk is never held in memory and no row lock is held while the
+client sends it, then appended to ``MEDIA_ROOT/uploads/partial/<id>.part``. On
+finalize the checksum is verified and the part file is handed to the target
+``Order`` field's storage, which moves it into place instead of copying.
+"""
+import os
+import shutil
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import Order, Upload
+from .storage import blob_name, file_sha256, find_blob
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class PartialFile(File):
+    """Lets FileSystemStorage move the part file into place (see ``temporary_file_path``)."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def max_upload_size():
+    return getattr(settings, 'ORDER_UPLOAD_MAX_BYTES', 1024 ** 3)
+
+
+def partial_path(upload):
+    return os.path.join(settings.MEDIA_ROOT, 'uploads', 'partial', f'{upload.pk}.part')
+
+
+def clean_filename(filename):
+    return get_valid_filename(os.path.basename(filename or '')) or 'upload'
+
+
+def owns_blob(user, name):
+    """Whether ``user``'s orders or completed uploads already use the stored file ``name``"""
+    return (
+        Upload.objects.filter(owner=user, status='complete', stored_name=name).exists()
+        or Order.objects.filter(Q(step_file=name) | Q(d2_draft_design=name), client=user).exists()
+    )
+
+
+def start(upload):
+    """Create the empty part file, or complete the upload at once when its content is already stored.
+
+    The shortcut only applies to files the owner already uses: knowing a
+    digest must not be enough to attach another client's file.
+    """
+    if upload.sha256:
+        stored_name = blob_name(upload.sha256, upload.filename)
+        if owns_blob(upload.owner, stored_name) and find_blob(upload.sha256, upload.filename, upload.size):
+            upload.offset = upload.size
+            upload.stored_name = stored_name
+            upload.status = 'complete'
+            upload.save(update_fields=['offset', 'stored_name', 'status', 'updated_at'])
+            return
+    path = partial_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+
+
+def append_chunk(upload_id, owner, stream, offset, length):
+    """Append ``length`` bytes from ``stream`` at ``offset``; returns the upload with its new offset.
+
+    The chunk is received into a file of its own first. Moving the offset is
+    then a conditional ``UPDATE ... WHERE offset = <offset>``, so of two PUTs
+    racing for the same offset only one lands and the other gets a 409; only
+    the winner copies its chunk into the part file, under that row lock. A
+    short read (client disconnect) keeps whatever arrived, and the client
+    resumes from the reported offset.
+    """
+    upload = Upload.objects.get(pk=upload_id, owner=owner)
+    if upload.status != 'pending':
+        raise UploadError('Upload is already complete', status=409)
+    if offset != upload.offset:
+        raise UploadError(f'Offset mismatch: expected {upload.offset}', status=409)
+    if length <= 0:
+        raise UploadError('Chunk is empty')
+    if offset + length > upload.size:
+        raise UploadError('Chunk runs past the declared upload size')
+
+    path = partial_path(upload)
+    chunk_path = f'{path}.{uuid.uuid4().hex}'
+    try:
+        with open(chunk_path, 'wb') as chunk:
+            remaining = length
+            while remaining:
+                piece = stream.read(min(READ_SIZE, remaining))
+                if not piece:
+                    break
+                chunk.write(piece)
+                remaining -= len(piece)
+        received = length - remaining
+        with transaction.atomic():
+            now = timezone.now()
+            moved = Upload.objects.filter(pk=upload.pk, status='pending', offset=offset).update(
+                offset=offset + received, updated_at=now,
+            )
+            if not moved:
+                upload.refresh_from_db(fields=['offset', 'status'])
+                if upload.status != 'pending':
+                    raise UploadError('Upload is already complete', status=409)
+                raise UploadError(f'Offset mismatch: expected {upload.offset}', status=409)
+            with open(path, 'r+b') as part, open(chunk_path, 'rb') as chunk:
+                part.truncate(offset)  # Drop bytes a failed earlier write left behind
+                part.seek(offset)
+                shutil.copyfileobj(chunk, part, READ_SIZE)
+    finally:
+        os.remove(chunk_path)
+    upload.offset = offset + received
+    upload.updated_at = now
+    return upload
+
+
+def finalize(upload_id, owner, sha256=''):
+    """Verify the checksum and move the part file into the order field's storage."""
+    with transaction.atomic():
+        upload = Upload.objects.select_for_update().get(pk=upload_id, owner=owner)
+        if upload.status == 'complete':
+            return upload
+        if upload.offset != upload.size:
+            raise UploadError(f'Upload is incomplete: {upload.offset} of {upload.size} bytes received', status=409)
+        expected = (sha256 or upload.sha256).lower()
+        if not expected:
+            raise UploadError('A sha256 checksum is required')
+        path = partial_path(upload)
+        actual = file_sha256(path)
+        if actual != expected:
+            raise UploadError(f'Checksum mismatch: received data hashes to {actual}')
+
+        field = Order._meta.get_field(upload.kind)
+        with open(path, 'rb') as part:
+            content = PartialFile(part)
+            content.sha256 = actual  # Spares content-addressed storage a second read
+            upload.stored_name = field.storage.save(field.generate_filename(None, upload.filename), content)
+        if os.path.exists(path):  # Content was already stored, or the storage copied instead of moving
+            os.remove(path)
+        upload.sha256 = actual
+        upload.status = 'complete'
+        upload.save(update_fields=['stored_name', 'sha256', 'status', 'updated_at'])
+    return upload
+
+
+def discard(upload):
+    if os.path.exists(partial_path(upload)):
+        os.remove(partial_path(upload))
+    upload.delete()
@@ -1,12 +1,16 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path
-from .views import OrderViewSet, SupplierViewSet, MachineViewSet, OrderMessageListCreateView
+from .views import OrderViewSet, SupplierViewSet, MachineViewSet, OrderMessageListCreateView, UploadViewSet
+from .events import event_ticket, order_event_stream
 
 router = DefaultRouter()
 router.register(r'orders', OrderViewSet, basename='order')
 router.register(r'suppliers', SupplierViewSet, basename='supplier')
 router.register(r'machines', MachineViewSet, basename='machine')
+router.register(r'uploads', UploadViewSet, basename='upload')
 
 urlpatterns = router.urls + [
     path('orders/<int:order_id>/messages/', OrderMessageListCreateView.as_view(), name='order-messages'),
+    path('events/ticket/', event_ticket, name='order-events-ticket'),
+    path('events/', order_event_stream, name='order-events'),
 ] 
\ No newline at end of file
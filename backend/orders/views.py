@@ -2,25 +2,121 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Count, Max, Q
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.handlers.asgi import ASGIRequest
 from datetime import datetime, timedelta
-from .models import Order, Machine, Supplier, OrderMessage
-from .serializers import OrderSerializer, OrderUpdateSerializer, SupplierSerializer, MachineSerializer, OrderMessageSerializer
+from .models import Order, Machine, Supplier, OrderMessage, OrderChange, Upload
+from .serializers import OrderSerializer, OrderUpdateSerializer, SupplierSerializer, MachineSerializer, OrderMessageSerializer, UploadSerializer, ScheduledOrderSerializer
 from rest_framework import generics
+from .events import publish_order_event, publish_order_events, publish_message_event
+from .pagination import OrderCursorPagination
+from .stats import acached_order_stats
+from .conditional import amachine_validators, conditional_get, latest, machine_validators, reference_validators
+from .caching import acached_collection, cached_collection
+from .asynchronous import AsyncViewMixin
+from . import uploads
+from .recommendations import recommend
+from . import scheduling
+from . import importing
+from . import exports
+from . import searching
+from .signals import record_order_changes
+from .transitions import TRANSITIONS, TransitionError, record_events, transition
 
 # Create your views here.
 
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().select_related('machine', 'machine__supplier', 'client')
+def estimated_hours(request):
+    """Optional admin override of an order's machine hours; raises ValueError when malformed"""
+    value = request.data.get('estimated_hours')
+    if value in (None, ''):
+        return None
+    try:
+        hours = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('estimated_hours must be a number')
+    if hours <= 0:
+        raise ValueError('estimated_hours must be positive')
+    return hours
+
+
+BULK_MAX_IDS = 1000
+SEARCH_PAGE_SIZE = 25
+CHANGES_PAGE_SIZE = 500  # Change-log rows per ?since= response
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+def bulk_ids(request):
+    """Distinct order ids from the ``ids`` list of a bulk action; raises ValueError when malformed"""
+    ids = request.data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        raise ValueError('ids must be a non-empty list of order ids')
+    if len(ids) > BULK_MAX_IDS:
+        raise ValueError(f'At most {BULK_MAX_IDS} orders can be updated at once')
+    try:
+        return list(dict.fromkeys(int(pk) for pk in ids))
+    except (TypeError, ValueError):
+        raise ValueError('ids must be integers')
+
+
+def transition_response(order, changed, message, unchanged=None):
+    """``message`` and the order, or, when a repeated action changed nothing, ``unchanged`` or a message saying so"""
+    if not changed:
+        message = unchanged or f'Order is already {order.get_status_display().lower()}; nothing was changed.'
+    return Response({'message': message, 'order': OrderSerializer(order).data})
+
+
+class LostRace(Exception):
+    """A bulk write found orders changed since they were read"""
+
+
+class OrderViewSet(AsyncViewMixin, viewsets.ModelViewSet):
+    queryset = Order.objects.all().select_related('machine', 'machine__supplier', 'client', 'geometry')
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderCursorPagination
 
     def get_queryset(self):
         user = self.request.user
         # Allow both Django is_staff and custom user.role == 'admin' to see all orders
         if user.is_staff or getattr(user, 'role', None) == 'admin':
-            return Order.objects.all().select_related('machine', 'machine__supplier', 'client')
-        return Order.objects.filter(client=user).select_related('machine', 'machine__supplier', 'client')
+            return Order.objects.all().select_related('machine', 'machine__supplier', 'client', 'geometry')
+        return Order.objects.filter(client=user).select_related('machine', 'machine__supplier', 'client', 'geometry')
+
+    def filter_queryset(self, queryset):
+        """Apply ?status=, ?client=, ?machine=, ?submitted_after= and ?submitted_before= to list, search and export calls"""
+        queryset = super().filter_queryset(queryset)
+        if self.action not in ('list', 'search', 'export', 'export_offers'):
+            return queryset
+        params = self.request.query_params
+        if params.get('status'):
+            queryset = queryset.filter(status__in=params['status'].split(','))
+        for param in ('client', 'machine'):
+            if params.get(param):
+                try:
+                    queryset = queryset.filter(**{f'{param}_id': int(params[param])})
+                except ValueError:
+                    raise ValidationError({param: 'Must be an integer id.'})
+        for param, lookup in (('submitted_after', 'gte'), ('submitted_before', 'lt')):
+            if params.get(param):
+                try:
+                    value = parse_datetime(params[param]) or parse_date(params[param])
+                except ValueError:
+                    value = None
+                if value is None:
+                    raise ValidationError({param: 'Must be an ISO 8601 date or datetime.'})
+                if not isinstance(value, datetime):
+                    value = datetime.combine(value, datetime.min.time())
+                if timezone.is_naive(value):
+                    value = timezone.make_aware(value)
+                queryset = queryset.filter(**{f'date_submitted__{lookup}': value})
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ['update', 'partial_update']:
@@ -28,7 +124,188 @@ class OrderViewSet(viewsets.ModelViewSet):
         return OrderSerializer
 
     def perform_create(self, serializer):
-        serializer.save(client=self.request.user)
+        order = serializer.save(client=self.request.user)
+        publish_order_event(order, 'order_created')
+
+    def perform_update(self, serializer):
+        order = serializer.instance
+        data = serializer.validated_data
+        with transaction.atomic():
+            if 'machine' in data and data['machine'] != order.machine:
+                # Keep the machine timelines in step with admin edits
+                scheduling.assign([order], data['machine'])
+            order = serializer.save()
+        publish_order_event(order, 'order_updated')
+
+    def perform_destroy(self, instance):
+        publish_order_event(instance, 'order_deleted')
+        instance.delete()
+
+    def visible_changes(self, user):
+        changes = OrderChange.objects.all()
+        if not (user.is_staff or getattr(user, 'role', None) == 'admin'):
+            changes = changes.filter(client_id=user.id)
+        return changes
+
+    def get_validators(self, request):
+        """Change-log state of the caller's orders plus the machine list stamp (for machine/supplier names).
+
+        Besides the newest change, the version counts the changes after the settled
+        cursor, so a change that commits after a newer one was logged still moves the ETag.
+        """
+        self.settled_cursor = OrderChange.settled_cursor()
+        changes = self.visible_changes(request.user)
+        recent = changes.filter(id__gt=self.settled_cursor).aggregate(count=Count('id'), last=Max('id'), changed_at=Max('timestamp'))
+        if not recent['count']:
+            recent['last'], recent['changed_at'] = changes.order_by('-id').values_list('id', 'timestamp').first() or (0, None)
+        return self.change_validators(recent, machine_validators())
+
+    async def aget_validators(self, request):
+        self.settled_cursor = await OrderChange.asettled_cursor()
+        changes = self.visible_changes(request.user)
+        recent = await changes.filter(id__gt=self.settled_cursor).aaggregate(count=Count('id'), last=Max('id'), changed_at=Max('timestamp'))
+        if not recent['count']:
+            recent['last'], recent['changed_at'] = await changes.order_by('-id').values_list('id', 'timestamp').afirst() or (0, None)
+        return self.change_validators(recent, await amachine_validators())
+
+    def change_validators(self, recent, machine_stamp):
+        machines, machines_modified = machine_stamp
+        return (self.settled_cursor, recent['count'], recent['last'], machines), latest(recent['changed_at'], machines_modified)
+
+    @conditional_get
+    async def retrieve(self, request, *args, **kwargs):
+        return Response(await self.aserialize(await self.aget_object()))
+
+    @conditional_get
+    async def list(self, request, *args, **kwargs):
+        """Full order list, or only what changed after ``?since=<cursor>``."""
+        since = request.query_params.get('since')
+        if since is not None:
+            return await self.changes_since(since)
+        # The validators read the cursor before the rows, so a concurrent write is re-sent rather than missed
+        cursor = self.settled_cursor
+        queryset = self.filter_queryset(self.get_queryset())
+        # CursorPagination reads its page synchronously
+        page = await sync_to_async(self.paginate_queryset)(queryset)
+        if page is not None:
+            response = self.get_paginated_response(await self.aserialize(page, many=True))
+        else:
+            response = Response(await self.alist_all(queryset))
+        response['X-Orders-Cursor'] = str(cursor)
+        return response
+
+    async def changes_since(self, since):
+        """Orders created or updated after the cursor, plus tombstones for deleted ones.
+
+        Reads at most ``CHANGES_PAGE_SIZE`` log rows; ``has_more`` asks for the next
+        page. The cursor stops short of the settle window (``OrderChange.settle_cutoff``),
+        so the newest changes are sent now and again after the cursor. A cursor older
+        than the retained log gets 410: reload the full list.
+        """
+        try:
+            since = int(since)
+        except (TypeError, ValueError):
+            return Response({'error': 'since must be an integer cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        if since < await OrderChange.aoldest_cursor():
+            return Response({'error': 'Cursor is older than the change log; reload the full list'}, status=status.HTTP_410_GONE)
+        changes = self.visible_changes(self.request.user).filter(id__gt=since)
+        cutoff = OrderChange.settle_cutoff()
+        rows = [row async for row in changes.filter(timestamp__lte=cutoff).values_list('id', 'order_id', 'deleted')[:CHANGES_PAGE_SIZE + 1]]
+        has_more = len(rows) > CHANGES_PAGE_SIZE
+        rows = rows[:CHANGES_PAGE_SIZE]
+        cursor = rows[-1][0] if rows else since
+        recent = changes.filter(timestamp__gt=cutoff)
+        if has_more:
+            recent = recent.filter(id__lte=cursor)
+        rows += [row async for row in recent.values_list('id', 'order_id', 'deleted')]
+        # Later log rows win, so an order updated then deleted is reported once as a tombstone
+        latest = {}
+        for _, order_id, deleted in sorted(rows):
+            latest[order_id] = deleted
+        updated_ids = [order_id for order_id, deleted in latest.items() if not deleted]
+        return Response({
+            'cursor': cursor,
+            'has_more': has_more,
+            'orders': await self.alist_all(self.get_queryset().filter(id__in=updated_ids)) if updated_ids else [],
+            'deleted': [order_id for order_id, deleted in latest.items() if deleted],
+        }, headers={'X-Orders-Cursor': str(cursor)})
+
+    def export_response(self, request, queryset, columns, filename):
+        user = request.user
+        if not (user.is_staff or getattr(user, 'role', None) == 'admin'):
+            return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+        filetype = request.query_params.get('filetype', 'csv')
+        if filetype not in exports.FILETYPES:
+            return Response({'error': 'filetype must be csv or xlsx'}, status=status.HTTP_400_BAD_REQUEST)
+        # Under ASGI a sync iterator would be collected into memory before sending
+        return exports.stream(queryset, columns, filetype, filename, asynchronous=isinstance(request._request, ASGIRequest))
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def export(self, request):
+        """Stream all orders (list filters apply) with client, machine and supplier as ?filetype=csv|xlsx"""
+        orders = self.filter_queryset(Order.objects.all())
+        return self.export_response(request, orders, exports.ORDER_COLUMNS, 'orders')
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def export_offers(self, request):
+        """Stream the counter offer and system message history of the filtered orders"""
+        orders = self.filter_queryset(Order.objects.all())
+        messages = OrderMessage.objects.filter(type__in=exports.NEGOTIATION_TYPES)
+        if orders.query.where:
+            messages = messages.filter(order__in=orders.values('pk'))
+        return self.export_response(request, messages, exports.OFFER_COLUMNS, 'negotiations')
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def search(self, request):
+        """Orders matching ``?q=`` in their part ID, description, material or messages, best first, with highlights.
+
+        Paged by ``?page=`` and ``?page_size=``; the list filters apply.
+        """
+        terms = searching.parse_query(request.query_params.get('q'))
+        if not terms:
+            return Response({'error': 'q must contain at least one word'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = int(request.query_params.get('page', 1))
+            page_size = min(int(request.query_params.get('page_size', SEARCH_PAGE_SIZE)), SEARCH_MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'page and page_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if page < 1 or page_size < 1:
+            return Response({'error': 'page and page_size must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+
+        total, ranked = searching.search(terms, self.filter_queryset(self.get_queryset()), (page - 1) * page_size, page_size)
+        order_ids = [order_id for order_id, _ in ranked]
+        orders = self.get_queryset().in_bulk(order_ids)
+        messages = searching.matching_messages(terms, order_ids) if order_ids else {}
+        results = []
+        for order_id, score in ranked:
+            order = orders.get(order_id)
+            if order is None:
+                continue
+            results.append({
+                'order': self.get_serializer(order).data,
+                'score': round(score, 3),
+                'highlights': searching.highlights(order, terms),
+                'messages': [{
+                    'id': message.id,
+                    'type': message.type,
+                    'timestamp': message.timestamp,
+                    'excerpt': searching.highlight(message.message, terms),
+                } for message in messages.get(order_id, [])],
+            })
+        url = request.build_absolute_uri()
+        return Response({
+            'count': total,
+            'next': replace_query_param(url, 'page', page + 1) if page * page_size < total else None,
+            'previous': (replace_query_param(url, 'page', page - 1) if page > 2 else remove_query_param(url, 'page')) if page > 1 else None,
+            'results': results,
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    async def stats(self, request):
+        """Dashboard counts, totals and workload for the orders visible to the caller"""
+        user = request.user
+        scope = 'all' if user.is_staff or getattr(user, 'role', None) == 'admin' else f'client:{user.id}'
+        return Response(await acached_order_stats(self.get_queryset(), scope))
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def approve_order(self, request, pk=None):
@@ -46,32 +323,41 @@ class OrderViewSet(viewsets.ModelViewSet):
         admin_notes = request.data.get('admin_notes', '')
         
         try:
-            # Admin accepts client's target price
-            if not price_estimate and order.target_price:
-                order.price_estimate = order.target_price
-                order.agreed_price = order.target_price  # Immediate agreement
-            # Admin counters with different price
-            elif price_estimate:
-                order.price_estimate = price_estimate
-                # Don't set agreed_price - client needs to accept this counter offer
-            order.status = 'awaiting_payment'
-            order.date_accepted = timezone.now()
-            order.admin_notes = admin_notes
+            hours = estimated_hours(request)
+            if price_estimate:
+                price_estimate = Order._meta.get_field('price_estimate').to_python(price_estimate)
             if expected_completion_date:
-                order.expected_completion_date = expected_completion_date
-            else:
-                order.expected_completion_date = timezone.now().date() + timedelta(days=14)
+                expected_completion_date = Order._meta.get_field('expected_completion_date').to_python(expected_completion_date)
+            machine = order.machine
             if machine_id:
                 try:
                     machine = Machine.objects.get(id=machine_id)
-                    order.machine = machine
                 except Machine.DoesNotExist:
                     return Response({'error': 'Machine not found or not available'}, status=status.HTTP_400_BAD_REQUEST)
-            order.save()
-            return Response({
-                'message': 'Order approved successfully',
-                'order': OrderSerializer(order).data
-            })
+
+            def approve(order, now):
+                # Admin accepts client's target price
+                if not price_estimate and order.target_price:
+                    order.price_estimate = order.target_price
+                    order.agreed_price = order.target_price  # Immediate agreement
+                # Admin counters with different price
+                elif price_estimate:
+                    order.price_estimate = price_estimate
+                    # Don't set agreed_price - client needs to accept this counter offer
+                order.date_accepted = now
+                order.admin_notes = admin_notes
+                scheduling.assign([order], machine, hours, now)
+                if expected_completion_date:
+                    order.expected_completion_date = expected_completion_date
+                elif order.scheduled_end:
+                    order.expected_completion_date = order.scheduled_end.date()
+                else:
+                    order.expected_completion_date = scheduling.earliest_completion(order, now).date()
+
+            changed = transition(order, 'approve_order', user, approve, expect=['machine_id'])
+            return transition_response(order, changed, 'Order approved successfully')
+        except TransitionError as exc:
+            return Response({'error': str(exc)}, status=exc.status)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -89,15 +375,16 @@ class OrderViewSet(viewsets.ModelViewSet):
         if not rejection_reason:
             return Response({'error': 'Rejection reason is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        order.status = 'rejected'
-        order.rejection_reason = rejection_reason
-        order.date_rejected = timezone.now()
-        order.save()
-        
-        return Response({
-            'message': 'Order rejected successfully',
-            'order': OrderSerializer(order).data
-        })
+        def reject(order, now):
+            scheduling.remove([order], now)
+            order.rejection_reason = rejection_reason
+            order.date_rejected = now
+
+        try:
+            changed = transition(order, 'reject_order', user, reject)
+        except TransitionError as exc:
+            return Response({'error': str(exc)}, status=exc.status)
+        return transition_response(order, changed, 'Order rejected successfully')
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def start_production(self, request, pk=None):
@@ -107,17 +394,18 @@ class OrderViewSet(viewsets.ModelViewSet):
         # Check if user is admin
         if not (user.is_staff or getattr(user, 'role', None) == 'admin'):
             return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
-        if order.status != 'accepted':
-            return Response({'error': 'Order must be accepted before starting production'}, status=status.HTTP_400_BAD_REQUEST)
-        if not order.machine:
-            return Response({'error': 'A machine must be assigned before starting production.'}, status=status.HTTP_400_BAD_REQUEST)
-        order.status = 'in_production'
-        order.date_production_started = timezone.now()
-        order.save()
-        return Response({
-            'message': 'Production started successfully',
-            'order': OrderSerializer(order).data
-        })
+
+        def start(order, now):
+            if not order.machine_id:
+                raise TransitionError('A machine must be assigned before starting production.')
+            order.date_production_started = now
+            scheduling.start([order], now)
+
+        try:
+            changed = transition(order, 'start_production', user, start, expect=['machine_id'])
+        except TransitionError as exc:
+            return Response({'error': str(exc)}, status=exc.status)
+        return transition_response(order, changed, 'Production started successfully')
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def complete_order(self, request, pk=None):
@@ -129,21 +417,24 @@ class OrderViewSet(viewsets.ModelViewSet):
         if not (user.is_staff or getattr(user, 'role', None) == 'admin'):
             return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
         
-        if order.status != 'in_production':
-            return Response({'error': 'Order must be in production before marking as completed'}, status=status.HTTP_400_BAD_REQUEST)
-        
         actual_cost = request.data.get('actual_cost')
+        try:
+            if actual_cost:
+                actual_cost = Order._meta.get_field('actual_cost').to_python(actual_cost)
+        except DjangoValidationError as exc:
+            return Response({'error': ' '.join(exc.messages)}, status=status.HTTP_400_BAD_REQUEST)
         
-        order.status = 'completed'
-        order.date_completed = timezone.now()
-        if actual_cost:
-            order.actual_cost = actual_cost
-        order.save()
-        
-        return Response({
-            'message': 'Order completed successfully',
-            'order': OrderSerializer(order).data
-        })
+        def complete(order, now):
+            order.date_completed = now
+            scheduling.complete(order, now)
+            if actual_cost:
+                order.actual_cost = actual_cost
+
+        try:
+            changed = transition(order, 'complete_order', user, complete, expect=['machine_id'])
+        except TransitionError as exc:
+            return Response({'error': str(exc)}, status=exc.status)
+        return transition_response(order, changed, 'Order completed successfully')
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def assign_machine(self, request, pk=None):
@@ -159,41 +450,251 @@ class OrderViewSet(viewsets.ModelViewSet):
         if not machine_id:
             return Response({'error': 'Machine ID is required'}, status=status.HTTP_400_BAD_REQUEST)
         
+        try:
+            hours = estimated_hours(request)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         try:
             machine = Machine.objects.get(id=machine_id)
-            order.machine = machine
-            order.save()
-            
-            return Response({
-                'message': 'Machine assigned successfully',
-                'order': OrderSerializer(order).data
-            })
         except Machine.DoesNotExist:
             return Response({'error': 'Machine not found or not available'}, status=status.HTTP_400_BAD_REQUEST)
 
+        def assign(order, now):
+            scheduling.assign([order], machine, hours, now)
+
+        try:
+            changed = transition(order, 'assign_machine', user, assign, expect=['machine_id'])
+        except TransitionError as exc:
+            return Response({'error': str(exc)}, status=exc.status)
+        return transition_response(
+            order, changed, 'Machine assigned successfully', f'Order is already assigned to {machine.name}; nothing was changed.')
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def recommended_machines(self, request, pk=None):
+        """Machines able to process this order, best fit and least loaded first"""
+        user = request.user
+        if not (user.is_staff or getattr(user, 'role', None) == 'admin'):
+            return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+        order = self.get_object()
+
+        machine_type = request.query_params.get('type') or None
+        if machine_type and machine_type not in dict(Machine.MACHINE_TYPE_CHOICES):
+            return Response({'error': f'Unknown machine type: {machine_type}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(recommend(order, machine_type=machine_type, limit=limit))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk_import(self, request):
+        """Create many orders from a CSV/JSON ``manifest`` (or an ``orders`` list) and a zip of ``files``"""
+        manifest = request.FILES.get('manifest') or request.data.get('orders')
+        if manifest is None:
+            return Response({'error': 'A manifest file or an orders list is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            rows = importing.read_manifest(manifest)
+            archive = importing.open_archive(request.FILES.get('files'))
+        except importing.ManifestError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        created, errors = importing.import_orders(request.user, rows, archive)
+        return Response({
+            'created': [{'row': number, 'id': order.pk, 'part_id': order.part_id} for number, order in sorted(created.items())],
+            'errors': [{'row': number, 'errors': problems} for number, problems in sorted(errors.items())],
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+    def run_bulk(self, request, update, fields, event):
+        """Apply ``update(orders, now)`` to the locked orders named by ``ids`` and save them in one statement.
+
+        ``update`` returns ``{order id: error}`` for the orders it left alone; the
+        orders it moves to another status get an ``OrderEvent``. The query count
+        does not grow with the number of orders.
+        """
+        user = request.user
+        if not (user.is_staff or getattr(user, 'role', None) == 'admin'):
+            return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            ids = bulk_ids(request)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        sources = TRANSITIONS[event].sources
+        try:
+            with transaction.atomic():
+                orders = list(Order.objects.select_for_update().select_related('machine').filter(pk__in=ids))
+                # Queue slots follow the order the ids were given in
+                position = {pk: index for index, pk in enumerate(ids)}
+                orders.sort(key=lambda order: position[order.pk])
+                errors = {pk: 'Order not found' for pk in ids if pk not in {order.pk for order in orders}}
+                now = timezone.now()
+                previous = {order.pk: order.status for order in orders}
+                skipped = update(orders, now)
+                errors.update(skipped)
+                orders = [order for order in orders if order.pk not in skipped]
+                for order in orders:
+                    order.updated_at = now
+                # Only orders still in a source status are written, as in transition()
+                if Order.objects.filter(status__in=sources).bulk_update(orders, fields + ['updated_at']) < len(orders):
+                    raise LostRace
+                record_order_changes(orders)
+                record_events(orders, event, previous, user)
+        except LostRace:
+            return Response({'error': 'Order was changed by another request; try again.'}, status=status.HTTP_409_CONFLICT)
+        publish_order_events(orders, event)
+        return Response({
+            'updated': [order.pk for order in orders],
+            'errors': [{'id': pk, 'error': error} for pk, error in errors.items()],
+        })
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk_approve(self, request):
+        """approve_order for many ``ids``: same price, notes, machine and completion date options"""
+        machine_id = request.data.get('machine_id')
+        admin_notes = request.data.get('admin_notes', '')
+        expected_completion_date = request.data.get('expected_completion_date')
+        price_estimate = request.data.get('price_estimate')
+        try:
+            hours = estimated_hours(request)
+            machine = Machine.objects.get(id=machine_id) if machine_id else None
+            if expected_completion_date:
+                expected_completion_date = parse_date(str(expected_completion_date))
+                if expected_completion_date is None:
+                    raise ValueError('expected_completion_date must be a YYYY-MM-DD date')
+            if price_estimate:
+                price_estimate = Order._meta.get_field('price_estimate').to_python(price_estimate)
+        except (ValueError, DjangoValidationError) as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except Machine.DoesNotExist:
+            return Response({'error': 'Machine not found or not available'}, status=status.HTTP_400_BAD_REQUEST)
+
+        def approve(orders, now):
+            approve_order = TRANSITIONS['approve_order']
+            skipped = {order.pk: approve_order.error for order in orders if order.status not in approve_order.sources}
+            orders = [order for order in orders if order.pk not in skipped]
+            for order in orders:
+                if not price_estimate and order.target_price:
+                    order.price_estimate = order.target_price
+                    order.agreed_price = order.target_price
+                elif price_estimate:
+                    order.price_estimate = price_estimate
+                order.status = approve_order.target
+                order.date_accepted = now
+                order.admin_notes = admin_notes
+            if machine:
+                scheduling.assign(orders, machine, hours, now)
+            else:
+                by_machine = {}
+                for order in orders:
+                    by_machine.setdefault(order.machine, []).append(order)
+                # One scheduling pass per machine the orders already sit on
+                for current, group in by_machine.items():
+                    if current is not None:
+                        scheduling.assign(group, current, hours, now)
+            unplaced = [order for order in orders if not expected_completion_date and not order.scheduled_end]
+            tails = scheduling.machine_tails() if unplaced else []
+            for order in orders:
+                if expected_completion_date:
+                    order.expected_completion_date = expected_completion_date
+                elif order.scheduled_end:
+                    order.expected_completion_date = order.scheduled_end.date()
+                else:
+                    order.expected_completion_date = scheduling.earliest_completion(order, now, tails).date()
+            return skipped
+
+        return self.run_bulk(request, approve, [
+            'status', 'date_accepted', 'admin_notes', 'price_estimate', 'agreed_price',
+            'expected_completion_date', 'machine', *scheduling.SCHEDULE_FIELDS,
+        ], 'approve_order')
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk_reject(self, request):
+        """reject_order for many ``ids`` with one ``rejection_reason``"""
+        rejection_reason = request.data.get('rejection_reason', '')
+        if not rejection_reason:
+            return Response({'error': 'Rejection reason is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        def reject(orders, now):
+            reject_order = TRANSITIONS['reject_order']
+            skipped = {order.pk: reject_order.error for order in orders if order.status not in reject_order.sources}
+            orders = [order for order in orders if order.pk not in skipped]
+            scheduling.remove(orders, now)
+            for order in orders:
+                order.status = reject_order.target
+                order.rejection_reason = rejection_reason
+                order.date_rejected = now
+            return skipped
+
+        return self.run_bulk(request, reject, ['status', 'rejection_reason', 'date_rejected', *scheduling.SCHEDULE_FIELDS], 'reject_order')
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk_assign_machine(self, request):
+        """assign_machine for many ``ids``"""
+        machine_id = request.data.get('machine_id')
+        if not machine_id:
+            return Response({'error': 'Machine ID is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            hours = estimated_hours(request)
+            machine = Machine.objects.get(id=machine_id)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except Machine.DoesNotExist:
+            return Response({'error': 'Machine not found or not available'}, status=status.HTTP_400_BAD_REQUEST)
+
+        def assign(orders, now):
+            assign_machine = TRANSITIONS['assign_machine']
+            skipped = {order.pk: assign_machine.error for order in orders if order.status not in assign_machine.sources}
+            scheduling.assign([order for order in orders if order.pk not in skipped], machine, hours, now)
+            return skipped
+
+        return self.run_bulk(request, assign, ['machine', *scheduling.SCHEDULE_FIELDS], 'assign_machine')
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk_start_production(self, request):
+        """start_production for many ``ids``; orders without a machine or not yet accepted are skipped"""
+        def start(orders, now):
+            start_production = TRANSITIONS['start_production']
+            skipped = {}
+            for order in orders:
+                if order.status not in start_production.sources:
+                    skipped[order.pk] = start_production.error
+                elif not order.machine:
+                    skipped[order.pk] = 'A machine must be assigned before starting production.'
+            orders = [order for order in orders if order.pk not in skipped]
+            for order in orders:
+                order.status = start_production.target
+                order.date_production_started = now
+            scheduling.start(orders, now)
+            return skipped
+
+        return self.run_bulk(request, start, ['status', 'date_production_started', *scheduling.SCHEDULE_FIELDS], 'start_production')
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def confirm_price(self, request, pk=None):
         """Client confirms the quoted price and accepts the order."""
         order = self.get_object()
         user = request.user
-        if getattr(user, 'role', None) != 'client' or order.client != user:
+        if getattr(user, 'role', None) != 'client' or order.client_id != user.id:
             return Response({'error': 'Only the client who created the order can confirm.'}, status=status.HTTP_403_FORBIDDEN)
-        if order.status not in ['under_review', 'accepted']:
-            return Response({'error': 'Order cannot be confirmed at this stage.'}, status=status.HTTP_400_BAD_REQUEST)
-        # Set agreed_price to the price_estimate when client confirms
-        if order.price_estimate:
-            order.agreed_price = order.price_estimate
-        order.status = 'accepted'
-        order.save()
-        # Optionally, create a system chat message
-        from .models import OrderMessage
-        OrderMessage.objects.create(
-            order=order,
-            sender=user,
-            message=f'Client confirmed the order at price ₹{order.price_estimate or "(not set)"}.',
-            is_admin=False
-        )
-        return Response({'message': 'Order confirmed at price.', 'order': OrderSerializer(order).data})
+
+        def confirm(order, now):
+            # Set agreed_price to the price_estimate when client confirms
+            if order.price_estimate:
+                order.agreed_price = order.price_estimate
+            # Optionally, create a system chat message
+            OrderMessage.objects.create(
+                order=order,
+                sender=user,
+                message=f'Client confirmed the order at price ₹{order.price_estimate or "(not set)"}.',
+                is_admin=False
+            )
+
+        try:
+            changed = transition(order, 'confirm_price', user, confirm, expect=['price_estimate'])
+        except TransitionError as exc:
+            return Response({'error': str(exc)}, status=exc.status)
+        return transition_response(order, changed, 'Order confirmed at price.')
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def send_counter_offer(self, request, pk=None):
@@ -204,22 +705,28 @@ class OrderViewSet(viewsets.ModelViewSet):
         message = request.data.get('message', '')
         if not amount:
             return Response({'error': 'Amount is required for counter offer.'}, status=status.HTTP_400_BAD_REQUEST)
-        # Only allow if order is under_review or negotiation
-        if order.status not in ['under_review', 'negotiation']:
-            return Response({'error': 'Negotiation not allowed at this stage.'}, status=status.HTTP_400_BAD_REQUEST)
-        # Create counter offer message
-        OrderMessage.objects.create(
-            order=order,
-            sender=user,
-            message=message or f'Counter offer: ₹{amount}',
-            is_admin=(user.is_staff or getattr(user, 'role', None) == 'admin'),
-            type='counter_offer',
-            amount=amount
-        )
-        # Move order to negotiation if not already
-        if order.status != 'negotiation':
-            order.status = 'negotiation'
-            order.save()
+        is_admin = user.is_staff or getattr(user, 'role', None) == 'admin'
+
+        def offer(order, now):
+            # Create counter offer message
+            offer = OrderMessage.objects.create(
+                order=order,
+                sender=user,
+                message=message or f'Counter offer: ₹{amount}',
+                is_admin=is_admin,
+                type='counter_offer',
+                amount=amount
+            )
+            # Keep the denormalized latest offer in step; the order moves to negotiation if not already
+            order.latest_offer_amount = offer.amount
+            order.latest_offer_sender_role = 'admin' if is_admin else 'client'
+            order.latest_offer_at = offer.timestamp
+
+        # Only allowed while the order is under_review or in negotiation
+        try:
+            transition(order, 'send_counter_offer', user, offer)
+        except TransitionError as exc:
+            return Response({'error': str(exc)}, status=exc.status)
         return Response({'message': 'Counter offer sent.'})
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
@@ -227,76 +734,237 @@ class OrderViewSet(viewsets.ModelViewSet):
         """Client accepts the latest counter offer, sets agreed_price, moves to awaiting_payment."""
         order = self.get_object()
         user = request.user
-        if getattr(user, 'role', None) != 'client' or order.client != user:
+        if getattr(user, 'role', None) != 'client' or order.client_id != user.id:
             return Response({'error': 'Only the client who created the order can accept.'}, status=status.HTTP_403_FORBIDDEN)
-        if order.status != 'negotiation':
-            return Response({'error': 'Order is not in negotiation.'}, status=status.HTTP_400_BAD_REQUEST)
-        # Find latest counter offer
-        last_offer = order.messages.filter(type='counter_offer').order_by('-timestamp').first()
-        if not last_offer:
-            return Response({'error': 'No counter offer to accept.'}, status=status.HTTP_400_BAD_REQUEST)
-        order.agreed_price = last_offer.amount
-        order.status = 'awaiting_payment'
-        order.save()
-        # System message
-        OrderMessage.objects.create(
-            order=order,
-            sender=user,
-            message=f'Client accepted the offer of ₹{last_offer.amount}.',
-            is_admin=False,
-            type='system'
-        )
-        return Response({'message': 'Counter offer accepted. Awaiting payment.', 'order': OrderSerializer(order).data})
+
+        def accept(order, now):
+            if order.latest_offer_amount is None:
+                raise TransitionError('No counter offer to accept.')
+            order.agreed_price = order.latest_offer_amount
+            # System message
+            OrderMessage.objects.create(
+                order=order,
+                sender=user,
+                message=f'Client accepted the offer of ₹{order.latest_offer_amount}.',
+                is_admin=False,
+                type='system'
+            )
+
+        try:
+            changed = transition(order, 'accept_counter_offer', user, accept, expect=['latest_offer_amount'])
+        except TransitionError as exc:
+            return Response({'error': str(exc)}, status=exc.status)
+        return transition_response(order, changed, 'Counter offer accepted. Awaiting payment.')
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def confirm_payment(self, request, pk=None):
         """Client confirms payment after agreement. Moves order to accepted."""
         order = self.get_object()
         user = request.user
-        if getattr(user, 'role', None) != 'client' or order.client != user:
+        if getattr(user, 'role', None) != 'client' or order.client_id != user.id:
             return Response({'error': 'Only the client who created the order can confirm payment.'}, status=status.HTTP_403_FORBIDDEN)
-        if order.status != 'awaiting_payment':
-            return Response({'error': 'Order is not awaiting payment.'}, status=status.HTTP_400_BAD_REQUEST)
-        order.payment_confirmed = True
-        order.status = 'accepted'
-        order.save()
-        # System message
-        OrderMessage.objects.create(
-            order=order,
-            sender=user,
-            message=f'Client confirmed payment for agreed price ₹{order.agreed_price}.',
-            is_admin=False,
-            type='system'
-        )
-        return Response({'message': 'Payment confirmed. Order accepted.', 'order': OrderSerializer(order).data})
+
+        def pay(order, now):
+            order.payment_confirmed = True
+            # System message
+            OrderMessage.objects.create(
+                order=order,
+                sender=user,
+                message=f'Client confirmed payment for agreed price ₹{order.agreed_price}.',
+                is_admin=False,
+                type='system'
+            )
+
+        try:
+            changed = transition(order, 'confirm_payment', user, pay)
+        except TransitionError as exc:
+            return Response({'error': str(exc)}, status=exc.status)
+        return transition_response(order, changed, 'Payment confirmed. Order accepted.')
 
 class SupplierViewSet(viewsets.ModelViewSet):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class MachineViewSet(viewsets.ModelViewSet):
+    def get_validators(self, request):
+        return reference_validators('suppliers')
+
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        return Response(cached_collection('suppliers', request, self.serialize_all))
+
+    def serialize_all(self):
+        return self.get_serializer(self.get_queryset(), many=True).data
+
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+class MachineViewSet(AsyncViewMixin, viewsets.ModelViewSet):
     queryset = Machine.objects.all().select_related('supplier')
     serializer_class = MachineSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_validators(self, request):
+        return machine_validators()
+
+    async def aget_validators(self, request):
+        return await amachine_validators()
+
+    async def serialize_all(self):
+        return await self.alist_all(self.get_queryset())
+
+    @conditional_get
+    async def list(self, request, *args, **kwargs):
+        return Response(await acached_collection('machines', request, self.serialize_all))
+
+    @conditional_get
+    async def retrieve(self, request, *args, **kwargs):
+        return Response(await self.aserialize(await self.aget_object()))
+
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
-    def available(self, request):
+    @conditional_get
+    async def available(self, request):
         """Get all machines (no is_available filter)"""
-        machines = Machine.objects.all().select_related('supplier')
-        serializer = self.get_serializer(machines, many=True)
-        return Response(serializer.data)
+        return Response(await acached_collection('machines', request, self.serialize_all))
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def queue(self, request, pk=None):
+        """The machine's production timeline: running and queued orders with their slots and conflicts"""
+        user = request.user
+        if not (user.is_staff or getattr(user, 'role', None) == 'admin'):
+            return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+        machine = self.get_object()
+        now = timezone.now()
+        orders = scheduling.queue(machine.pk, now)
+        ends = [order.scheduled_end for order in orders if order.scheduled_end]
+        return Response({
+            'machine': machine.pk,
+            'machine_name': machine.name,
+            'available_from': max([now, *ends]),
+            'orders': ScheduledOrderSerializer(orders, many=True).data,
+        })
 
-class OrderMessageListCreateView(generics.ListCreateAPIView):
+class OrderMessageListCreateView(AsyncViewMixin, generics.ListCreateAPIView):
     serializer_class = OrderMessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    page_size = 50
+    max_page_size = 200
 
     def get_queryset(self):
         order_id = self.kwargs['order_id']
         return OrderMessage.objects.filter(order_id=order_id).select_related('sender')
 
+    async def aget_validators(self, request):
+        stamp = await OrderMessage.objects.filter(order_id=self.kwargs['order_id']).aaggregate(
+            last_id=Max('id'), count=Count('id'), updated=Max('timestamp'),
+        )
+        return (stamp['last_id'], stamp['count']), stamp['updated']
+
+    async def get(self, request, *args, **kwargs):
+        return await self.list(request, *args, **kwargs)
+
+    @conditional_get
+    async def list(self, request, *args, **kwargs):
+        """Whole thread, or a page of it via ?after_id= (newer), ?before_id= (older) and ?limit="""
+        params = request.query_params
+        if not any(param in params for param in ('after_id', 'before_id', 'limit')):
+            return Response(await self.alist_all(self.get_queryset()))
+        try:
+            limit = min(int(params.get('limit', self.page_size)), self.max_page_size)
+            after_id = int(params['after_id']) if 'after_id' in params else None
+            before_id = int(params['before_id']) if 'before_id' in params else None
+        except ValueError:
+            return Response({'error': 'after_id, before_id and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.get_queryset()
+        if after_id is not None:
+            queryset = queryset.filter(await self.keyset_filter(queryset, after_id, 'gt')).order_by('timestamp', 'id')
+            page = [message async for message in queryset[:limit + 1]]
+            has_more = len(page) > limit
+            page = page[:limit]
+        else:
+            # Newest messages first so the page ends at the cursor, then back to thread order
+            if before_id is not None:
+                queryset = queryset.filter(await self.keyset_filter(queryset, before_id, 'lt'))
+            page = [message async for message in queryset.order_by('-timestamp', '-id')[:limit + 1]]
+            has_more = len(page) > limit
+            page = page[:limit][::-1]
+        return Response(await self.aserialize(page, many=True), headers={'X-Has-More': 'true' if has_more else 'false'})
+
+    @staticmethod
+    async def keyset_filter(queryset, message_id, lookup):
+        """Rows strictly after/before ``message_id`` in (timestamp, id) order"""
+        anchor = await queryset.filter(id=message_id).values_list('timestamp', flat=True).afirst()
+        if anchor is None:
+            return Q(**{f'id__{lookup}': message_id})
+        return Q(**{f'timestamp__{lookup}': anchor}) | Q(timestamp=anchor, **{f'id__{lookup}': message_id})
+
     def perform_create(self, serializer):
         order_id = self.kwargs['order_id']
         order = Order.objects.get(id=order_id)
         is_admin = self.request.user.role == 'admin' if hasattr(self.request.user, 'role') else self.request.user.is_staff
-        serializer.save(order=order, sender=self.request.user, is_admin=is_admin)
+        message = serializer.save(order=order, sender=self.request.user, is_admin=is_admin)
+        publish_message_event(message)
+
+class UploadViewSet(viewsets.GenericViewSet):
+    """Resumable chunked upload: POST to start, PUT chunks with Upload-Offset, then POST finalize/.
+
+    GET/HEAD report the current offset so an interrupted client can resume.
+    """
+    serializer_class = UploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Upload.objects.filter(owner=self.request.user)
+
+    def progress_headers(self, upload):
+        return {'Upload-Offset': str(upload.offset), 'Upload-Length': str(upload.size)}
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.save(owner=request.user, filename=uploads.clean_filename(serializer.validated_data['filename']))
+        uploads.start(upload)
+        return Response(self.get_serializer(upload).data, status=status.HTTP_201_CREATED,
+                        headers=self.progress_headers(upload))
+
+    def retrieve(self, request, pk=None):
+        upload = self.get_object()
+        return Response(self.get_serializer(upload).data, headers=self.progress_headers(upload))
+
+    def update(self, request, pk=None):
+        """Append the raw request body at the Upload-Offset header"""
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers.get('Content-Length') or 0)
+        except (KeyError, ValueError):
+            return Response({'error': 'Upload-Offset and Content-Length headers are required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            upload = uploads.append_chunk(pk, request.user, request.stream, offset, length)
+        except Upload.DoesNotExist:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        except uploads.UploadError as exc:
+            upload = self.get_object()
+            return Response({'error': exc.message}, status=exc.status, headers=self.progress_headers(upload))
+        return Response(self.get_serializer(upload).data, headers=self.progress_headers(upload))
+
+    def destroy(self, request, pk=None):
+        upload = self.get_object()
+        if upload.status == 'complete':
+            return Response({'error': 'Completed uploads cannot be discarded'}, status=status.HTTP_409_CONFLICT)
+        uploads.discard(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """Verify the sha256 checksum and store the file; the id can then go into an order's *_upload field"""
+        self.get_object()
+        try:
+            upload = uploads.finalize(pk, request.user, request.data.get('sha256', ''))
+        except uploads.UploadError as exc:
+            return Response({'error': exc.message}, status=exc.status)
+        return Response(self.get_serializer(upload).data)
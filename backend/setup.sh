@@ -35,6 +35,12 @@ EOF
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
-# Start Gunicorn
+# Start Gunicorn: SERVER_MODE=asgi serves backend.asgi with uvicorn workers,
+# so async views wait on the database without blocking their worker
+WORKERS=${GUNICORN_WORKERS:-3}
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    echo "Starting Gunicorn (ASGI, uvicorn workers)..."
+    exec poetry run gunicorn backend.asgi:application -k uvicorn_worker.UvicornWorker -b 0.0.0.0:8000 --workers=$WORKERS --timeout=120
+fi
 echo "Starting Gunicorn..."
-exec poetry run gunicorn backend.wsgi:application -b 0.0.0.0:8000 --workers=3 --timeout=120 
\ No newline at end of file
+exec poetry run gunicorn backend.wsgi:application -b 0.0.0.0:8000 --workers=$WORKERS --timeout=120 
\ No newline at end of file
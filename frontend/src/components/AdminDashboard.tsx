@@ -1,15 +1,15 @@
 
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
-import { Package, LogOut, ClipboardList, Factory, Settings } from "lucide-react";
+import { Package, LogOut, ClipboardList, Factory, Settings, Download } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
 import DashboardStats from "@/components/DashboardStats";
 import OrderManagement from "@/components/OrderManagement";
 import AdminSupplierManagement from "@/components/AdminSupplierManagement";
 import Navbar from "@/components/Navbar";
-import { getOrders, updateOrder, getOrderMessages } from "../lib/api";
+import { createOrderSync, updateOrder, getOrderMessages, exportOrders } from "../lib/api";
 
 interface User {
   id: string;
@@ -36,6 +36,8 @@ interface AdminDashboardProps {
 
 const AdminDashboard = ({ user, onLogout }: AdminDashboardProps) => {
   const [orders, setOrders] = useState<any[]>([]);
+  // Full list once, then only the orders changed since the last call
+  const syncOrders = useRef(createOrderSync());
   const { toast } = useToast();
   const [latestCounterOffers, setLatestCounterOffers] = useState<{ [orderId: number]: { amount: number, sender: string } | null }>({});
 
@@ -90,7 +92,7 @@ const AdminDashboard = ({ user, onLogout }: AdminDashboardProps) => {
 
   const loadOrders = async () => {
     try {
-      const ordersData = await getOrders();
+      const ordersData = await syncOrders.current();
       setOrders(ordersData.map(mapOrderForOrderManagement));
     } catch (error) {
       console.error('Error loading orders:', error);
@@ -102,6 +104,19 @@ const AdminDashboard = ({ user, onLogout }: AdminDashboardProps) => {
     }
   };
 
+  const handleExport = async (dataset: 'orders' | 'offers', filetype: 'csv' | 'xlsx') => {
+    try {
+      await exportOrders(dataset, filetype);
+    } catch (error) {
+      console.error('Error exporting orders:', error);
+      toast({
+        title: "Error",
+        description: "Failed to export orders",
+        variant: "destructive"
+      });
+    }
+  };
+
   const handleOrderAction = async (orderId: number, action: string) => {
     // Reload orders after any action to get updated data
     await loadOrders();
@@ -157,10 +172,24 @@ const AdminDashboard = ({ user, onLogout }: AdminDashboardProps) => {
           <TabsContent value="orders">
             <Card className="font-manrope">
               <CardHeader>
-                <CardTitle>Order Management</CardTitle>
-                <CardDescription>
-                  Manage order lifecycle from pending review to completion
-                </CardDescription>
+                <div className="flex items-start justify-between gap-4">
+                  <div>
+                    <CardTitle>Order Management</CardTitle>
+                    <CardDescription>
+                      Manage order lifecycle from pending review to completion
+                    </CardDescription>
+                  </div>
+                  <div className="flex gap-2">
+                    <Button variant="outline" size="sm" onClick={() => handleExport('orders', 'xlsx')}>
+                      <Download className="h-4 w-4 mr-2" />
+                      Orders (XLSX)
+                    </Button>
+                    <Button variant="outline" size="sm" onClick={() => handleExport('offers', 'csv')}>
+                      <Download className="h-4 w-4 mr-2" />
+                      Negotiations (CSV)
+                    </Button>
+                  </div>
+                </div>
               </CardHeader>
               <CardContent>
                 <OrderManagement 
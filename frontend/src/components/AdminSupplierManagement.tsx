@@ -225,7 +225,21 @@ const AdminSupplierManagement = () => {
                       <div key={machine.id} className="w-60 rounded-xl border border-gray-200 bg-white shadow-sm hover:shadow-md transition-shadow p-0 flex flex-col items-stretch">
                         {/* Photo placeholder or image */}
                         <div className="w-full h-36 bg-gray-100 flex items-center justify-center rounded-t-xl overflow-hidden">
-                          {machine.photo_url ? (
+                          {machine.photo_thumbnails ? (
+                            <picture className="w-full h-full">
+                              {(['webp', 'jpeg'] as const).map(format => (
+                                <source
+                                  key={format}
+                                  type={`image/${format}`}
+                                  sizes="240px"
+                                  srcSet={Object.values(machine.photo_thumbnails as Record<string, any>)
+                                    .map((rendition: any) => `${rendition[format]} ${rendition.width}w`)
+                                    .join(', ')}
+                                />
+                              ))}
+                              <img src={machine.photo_thumbnails.medium.jpeg} alt={machine.name} loading="lazy" className="object-cover w-full h-full" />
+                            </picture>
+                          ) : machine.photo_url ? (
                             <img src={machine.photo_url} alt={machine.name} className="object-cover w-full h-full" />
                           ) : (
                             <span className="text-gray-300 text-4xl">+</span>
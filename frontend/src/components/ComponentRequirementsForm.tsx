@@ -8,7 +8,7 @@ import { Textarea } from "@/components/ui/textarea";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { Upload, FileCheck, CreditCard, AlertCircle } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
-import { createOrder } from "../lib/api";
+import { createOrder, uploadOrderFile } from "../lib/api";
 
 interface User {
   id: string;
@@ -172,9 +172,9 @@ const ComponentRequirementsForm = ({ user, onNavigateToHistory }: ComponentRequi
     try {
       const backendForm = new FormData();
       backendForm.append("part_id", formData.partId);
-      backendForm.append("d2_draft_design", formData.d2DraftDesign);
+      backendForm.append("d2_draft_design_upload", await uploadOrderFile(formData.d2DraftDesign, "d2_draft_design"));
       backendForm.append("product_description", formData.productDescription);
-      if (formData.stepFile) backendForm.append("step_file", formData.stepFile);
+      if (formData.stepFile) backendForm.append("step_file_upload", await uploadOrderFile(formData.stepFile, "step_file"));
       backendForm.append("quantity", formData.quantity || "1");
       backendForm.append("material_type", formData.material);
       backendForm.append("material_thickness", formData.materialThickness);
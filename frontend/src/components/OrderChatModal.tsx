@@ -3,6 +3,7 @@ import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogDescription } f
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { getOrderMessages, sendOrderMessage, sendCounterOffer, acceptCounterOffer, confirmOrderPayment } from "../lib/api";
+import { useOrderEvents } from "@/hooks/use-order-events";
 
 interface OrderChatModalProps {
   orderId: number;
@@ -36,16 +37,23 @@ const OrderChatModal = ({ orderId, isOpen, onClose, currentUser }: OrderChatModa
   const [paying, setPaying] = useState(false);
   const [agreed, setAgreed] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const lastMessageIdRef = useRef<number | null>(null);
 
   useEffect(() => {
     if (isOpen) {
+      lastMessageIdRef.current = null;
       fetchMessages();
       fetchOrderStatus();
-      const interval = setInterval(fetchMessages, 4000);
-      return () => clearInterval(interval);
     }
   }, [isOpen, orderId]);
 
+  // New messages of this order are pushed by the server (polled every 4 seconds where it can't push)
+  useOrderEvents((event) => {
+    if (!event || event.event === 'stream_opened' || (event.event === 'message_created' && event.order_id === orderId)) {
+      fetchMessages();
+    }
+  }, 4000, isOpen);
+
   useEffect(() => {
     // Scroll to bottom when messages change
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -54,8 +62,15 @@ const OrderChatModal = ({ orderId, isOpen, onClose, currentUser }: OrderChatModa
   const fetchMessages = async () => {
     setLoading(true);
     try {
-      const data = await getOrderMessages(orderId);
-      setMessages(data);
+      // After the first load only ask for messages newer than the last one we have
+      const lastId = lastMessageIdRef.current;
+      const data: Message[] = lastId === null
+        ? await getOrderMessages(orderId)
+        : await getOrderMessages(orderId, { after_id: lastId });
+      if (data.length > 0) {
+        lastMessageIdRef.current = data[data.length - 1].id;
+      }
+      setMessages(prev => (lastId === null ? data : [...prev, ...data]));
     } catch (err) {
       // Optionally handle error
     }
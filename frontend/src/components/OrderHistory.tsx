@@ -5,8 +5,9 @@ import { Badge } from "@/components/ui/badge";
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
 import { ArrowLeft, Clock, CheckCircle, Play, Package, XCircle, FileText, DollarSign, Calendar, ChevronDown, ChevronUp, Lock } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
-import { getOrders, acceptCounterOffer, confirmOrderPayment, rejectOrder, sendCounterOffer, getOrderMessages } from "../lib/api";
+import { createOrderSync, acceptCounterOffer, confirmOrderPayment, rejectOrder, sendCounterOffer } from "../lib/api";
 import OrderChatModal from "./OrderChatModal";
+import { useOrderEvents } from "@/hooks/use-order-events";
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from "@/components/ui/dialog";
 
 interface Order {
@@ -49,6 +50,8 @@ interface OrderHistoryProps {
 
 const OrderHistory = ({ user, onBack }: OrderHistoryProps) => {
   const [orders, setOrders] = useState<Order[]>([]);
+  // Full list once, then only the orders changed since the last call
+  const syncOrders = useRef(createOrderSync());
   const [loading, setLoading] = useState(true);
   const { toast } = useToast();
   const [chatOrderId, setChatOrderId] = useState<number | null>(null);
@@ -56,7 +59,6 @@ const OrderHistory = ({ user, onBack }: OrderHistoryProps) => {
   const [clientCounterOffer, setClientCounterOffer] = useState("");
   const [showPaymentModal, setShowPaymentModal] = useState<number | null>(null);
   const [cardDetails, setCardDetails] = useState({ number: '', expiry: '', cvc: '' });
-  const pollingRef = useRef<NodeJS.Timeout | null>(null);
   const [latestCounterOffers, setLatestCounterOffers] = useState<{ [orderId: number]: { amount: number, sender: string, sender_role:string, admin_notes?: string } | null }>({});
   const [expandedOrders, setExpandedOrders] = useState<{ [orderId: number]: boolean }>({});
   const ORDERS_PER_PAGE = 5;
@@ -64,40 +66,33 @@ const OrderHistory = ({ user, onBack }: OrderHistoryProps) => {
 
   useEffect(() => {
     loadOrders();
-    pollingRef.current = setInterval(() => {
-      loadOrders();
-    }, 1000);
-    return () => {
-      if (pollingRef.current) clearInterval(pollingRef.current);
-    };
   }, []);
 
+  // Refresh when the server pushes an order event (every second where it can't push)
+  useOrderEvents(() => loadOrders());
+
   // Fetch latest counter offer for each order in negotiation
   useEffect(() => {
-    const fetchCounterOffers = async () => {
-      const offers: { [orderId: number]: { amount: number, sender: string, sender_role: string, admin_notes?: string } | null } = {};
-      for (const order of orders) {
-        if (["negotiation", "quotation_sent", "awaiting_payment"].includes(order.status)) {
-          const messages = await getOrderMessages(order.id);
-          const lastOffer = messages.filter((m: any) => m.type === 'counter_offer').sort((a: any, b: any) => new Date(b.timestamp).getTime() - new Date(a.timestamp).getTime())[0];
-          offers[order.id] = lastOffer
-            ? {
-                amount: lastOffer.amount,
-                sender: lastOffer.sender || '',
-                sender_role: lastOffer.sender_role || 'client',
-                admin_notes: lastOffer.admin_notes || ''
-              }
-            : null;
-        }
+    const offers: { [orderId: number]: { amount: number, sender: string, sender_role: string, admin_notes?: string } | null } = {};
+    for (const order of orders) {
+      if (["negotiation", "quotation_sent", "awaiting_payment"].includes(order.status)) {
+        const lastOffer = (order as any).latest_counter_offer;
+        offers[order.id] = lastOffer
+          ? {
+              amount: lastOffer.amount,
+              sender: '',
+              sender_role: lastOffer.sender_role || 'client',
+              admin_notes: ''
+            }
+          : null;
       }
-      setLatestCounterOffers(offers);
-    };
-    fetchCounterOffers();
+    }
+    setLatestCounterOffers(offers);
   }, [orders]);
 
   const loadOrders = async () => {
     try {
-      const ordersData = await getOrders();
+      const ordersData = await syncOrders.current();
       setOrders(ordersData);
     } catch (error) {
       console.error('Error loading orders:', error);
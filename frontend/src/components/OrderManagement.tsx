@@ -1,5 +1,5 @@
 
-import { useState, useEffect, useRef } from "react";
+import { useState, useEffect } from "react";
 import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
 import { Badge } from "@/components/ui/badge";
@@ -11,9 +11,9 @@ import { Textarea } from "@/components/ui/textarea";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { CheckCircle, XCircle, Play, Package, Clock, AlertCircle, FileText, DollarSign, ChevronDown, ChevronUp, Calendar } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
-import { approveOrder, rejectOrder, startProduction, completeOrder, assignMachine, getAvailableMachines, sendCounterOffer } from "../lib/api";
+import { approveOrder, rejectOrder, startProduction, completeOrder, assignMachine, getAvailableMachines, sendCounterOffer, searchOrders } from "../lib/api";
 import OrderChatModal from "./OrderChatModal";
-import { getOrderMessages } from "../lib/api";
+import { useOrderEvents } from "@/hooks/use-order-events";
 
 interface Order {
   id: number;
@@ -42,6 +42,18 @@ interface Order {
   material_thickness?: string; // Added material_thickness to the interface
   surface_treatment?: string; // Added surface_treatment to the interface
   packing_standard?: string; // Added packing_standard to the interface
+  geometry?: OrderGeometry | null;
+}
+
+interface OrderGeometry {
+  status: 'pending' | 'processing' | 'done' | 'failed';
+  bbox_x: number | null;
+  bbox_y: number | null;
+  bbox_z: number | null;
+  part_count: number | null;
+  surface_area: number | null;
+  preview_url: string | null;
+  error: string;
 }
 
 interface Machine {
@@ -71,7 +83,6 @@ const OrderManagement = ({ orders, onOrderAction, currentUser, reloadOrders }: O
   const [loading, setLoading] = useState(false);
   const { toast } = useToast();
   const [chatOrderId, setChatOrderId] = useState<number | null>(null);
-  const pollingRef = useRef<NodeJS.Timeout | null>(null);
   const [showProductionModal, setShowProductionModal] = useState<number | null>(null);
   const [productionMachineId, setProductionMachineId] = useState<number | null>(null);
   const [productionDate, setProductionDate] = useState<string>("");
@@ -79,6 +90,27 @@ const OrderManagement = ({ orders, onOrderAction, currentUser, reloadOrders }: O
   const ORDERS_PER_PAGE = 5;
   const [pagination, setPagination] = useState<{ [tab: string]: number }>({});
   const [latestCounterOffers, setLatestCounterOffers] = useState<{ [orderId: number]: { sender: 'client' | 'admin'; amount: number; admin_notes?: string } }>({});
+  const [searchQuery, setSearchQuery] = useState("");
+  // Ids of the server-side search matches, best first; null when not searching
+  const [searchMatches, setSearchMatches] = useState<number[] | null>(null);
+
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!query) {
+      setSearchMatches(null);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const data = await searchOrders(query, { page_size: 100 });
+        setSearchMatches(data.results.map((result: any) => result.order.id));
+        setPagination({});
+      } catch (error) {
+        console.error('Error searching orders:', error);
+      }
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
 
   // Function to validate date is not in the past
   const validateDateNotInPast = (dateString: string): boolean => {
@@ -104,37 +136,27 @@ const OrderManagement = ({ orders, onOrderAction, currentUser, reloadOrders }: O
 
   useEffect(() => {
     loadMachines();
-    // Poll for orders and machines every 1 second
-    pollingRef.current = setInterval(() => {
-      reloadOrders();
-      loadMachines();
-    }, 1000);
-    return () => {
-      if (pollingRef.current) clearInterval(pollingRef.current);
-    };
   }, []);
 
+  // Refresh when the server pushes an order event (every second where it can't push)
+  useOrderEvents(() => {
+    reloadOrders();
+    loadMachines();
+  });
+
   useEffect(() => {
-    const fetchCounterOffers = async () => {
-      const offers: { [orderId: number]: { sender: 'client' | 'admin'; amount: number; admin_notes?: string } } = {};
-      for (const order of orders) {
-        if (["negotiation", "quotation_sent", "awaiting_payment"].includes(order.status)) {
-          const messages = await getOrderMessages(order.id);
-          const lastOffer = messages
-            .filter((m: any) => m.type === 'counter_offer')
-            .sort((a: any, b: any) => new Date(b.timestamp).getTime() - new Date(a.timestamp).getTime())[0];
-          if (lastOffer) {
-            offers[order.id] = {
-              sender: lastOffer.sender_role === 'admin' ? 'admin' : 'client',
-              amount: lastOffer.amount,
-              admin_notes: lastOffer.admin_notes,
-            };
-          }
-        }
+    // The order list carries the latest counter offer, so no per-order message fetch is needed
+    const offers: { [orderId: number]: { sender: 'client' | 'admin'; amount: number; admin_notes?: string } } = {};
+    for (const order of orders) {
+      const lastOffer = (order as any).latest_counter_offer;
+      if (["negotiation", "quotation_sent", "awaiting_payment"].includes(order.status) && lastOffer) {
+        offers[order.id] = {
+          sender: lastOffer.sender_role === 'admin' ? 'admin' : 'client',
+          amount: lastOffer.amount,
+        };
       }
-      setLatestCounterOffers(offers);
-    };
-    fetchCounterOffers();
+    }
+    setLatestCounterOffers(offers);
   }, [orders]);
 
   const loadMachines = async () => {
@@ -572,6 +594,12 @@ const OrderManagement = ({ orders, onOrderAction, currentUser, reloadOrders }: O
   };
 
   const filterOrdersByStatus = (status: string) => {
+    if (searchMatches) {
+      const byId = new Map(orders.map(order => [order.id, order]));
+      return searchMatches
+        .map(id => byId.get(id))
+        .filter((order): order is Order => !!order && order.status === status);
+    }
     if (status === 'quotation_sent') {
       return orders.filter(order => order.status === 'quotation_sent');
     }
@@ -591,6 +619,13 @@ const OrderManagement = ({ orders, onOrderAction, currentUser, reloadOrders }: O
 
   return (
     <>
+      <div className="mb-4">
+        <Input
+          placeholder="Search part ID, description, material or messages..."
+          value={searchQuery}
+          onChange={(e) => setSearchQuery(e.target.value)}
+        />
+      </div>
       <Tabs defaultValue="under_review" className="w-full">
         <TabsList className="grid w-full grid-cols-7">
           <TabsTrigger value="under_review" className="flex items-center justify-center">
@@ -708,6 +743,31 @@ const OrderManagement = ({ orders, onOrderAction, currentUser, reloadOrders }: O
                         </div>
                       </div>
                         
+                      {order.geometry && (
+                        <div className="flex gap-4 items-center text-sm pt-2">
+                          {order.geometry.preview_url && (
+                            <img src={order.geometry.preview_url} alt="STEP preview" className="h-24 w-24 border rounded" />
+                          )}
+                          {order.geometry.status === 'done' ? (
+                            <div className="space-y-1">
+                              {order.geometry.bbox_x !== null && (
+                                <p><span className="font-medium">Bounding Box:</span> {order.geometry.bbox_x.toFixed(1)} × {order.geometry.bbox_y?.toFixed(1)} × {order.geometry.bbox_z?.toFixed(1)} mm</p>
+                              )}
+                              {order.geometry.part_count !== null && (
+                                <p><span className="font-medium">Parts:</span> {order.geometry.part_count}</p>
+                              )}
+                              {order.geometry.surface_area !== null && (
+                                <p><span className="font-medium">Surface Area:</span> {(order.geometry.surface_area / 100).toFixed(1)} cm²</p>
+                              )}
+                            </div>
+                          ) : (
+                            <p className="text-gray-500">
+                              {order.geometry.status === 'failed' ? `STEP analysis failed: ${order.geometry.error}` : 'Analysing STEP file…'}
+                            </p>
+                          )}
+                        </div>
+                      )}
+
                       {getActionButton(order) && (
                         <div className="flex gap-2 pt-2">
                           {getActionButton(order)}
@@ -0,0 +1,25 @@
+import * as React from "react"
+import { subscribeOrderEvents } from "@/lib/api"
+
+// Calls `onEvent` for each order or message event the server pushes. Where the
+// event stream is unavailable (WSGI deployments) it polls instead, calling
+// `onEvent(null)` every `pollMs`.
+export function useOrderEvents(onEvent: (event: any | null) => void, pollMs = 1000, enabled = true) {
+  const handler = React.useRef(onEvent)
+  handler.current = onEvent
+
+  React.useEffect(() => {
+    if (!enabled) return
+    let timer: ReturnType<typeof setInterval> | null = null
+    const unsubscribe = subscribeOrderEvents(
+      (event) => handler.current(event),
+      () => {
+        if (timer === null) timer = setInterval(() => handler.current(null), pollMs)
+      },
+    )
+    return () => {
+      unsubscribe()
+      if (timer !== null) clearInterval(timer)
+    }
+  }, [pollMs, enabled])
+}
@@ -42,6 +42,85 @@ export const getOrders = async () => {
   return res.data;
 };
 
+// Keeps a local copy of the caller's orders in step with the server: the full
+// list once, then only what changed after the cursor (`?since=`). Each call
+// resolves to the current list, newest first.
+export const createOrderSync = () => {
+  let cursor: string | null = null;
+  let orders = new Map<number, any>();
+
+  const loadAll = async () => {
+    const res = await axios.get(`${API_BASE}orders/`);
+    orders = new Map(res.data.map((order: any) => [order.id, order]));
+    cursor = res.headers['x-orders-cursor'];
+  };
+
+  return async () => {
+    if (cursor == null) {
+      await loadAll();
+    } else {
+      try {
+        let hasMore = true;
+        while (hasMore) {
+          const res = await axios.get(`${API_BASE}orders/`, { params: { since: cursor } });
+          for (const order of res.data.orders) orders.set(order.id, order);
+          for (const id of res.data.deleted) orders.delete(id);
+          hasMore = res.data.has_more && String(res.data.cursor) !== cursor;
+          cursor = String(res.data.cursor);
+        }
+      } catch (err: any) {
+        // The cursor is older than the server's change log
+        if (err.response?.status !== 410) throw err;
+        await loadAll();
+      }
+    }
+    return Array.from(orders.values()).sort(
+      (a, b) => new Date(b.date_submitted).getTime() - new Date(a.date_submitted).getTime() || b.id - a.id
+    );
+  };
+};
+
+// Order and message events pushed by the server (/api/events/, ASGI deployments).
+// `onEvent` gets each event, plus a `stream_opened` one on every (re)connect so
+// nothing announced while the stream was down is missed. `onClosed` runs when
+// the stream cannot be used (a WSGI server answers 501, or the session ended).
+// The stream is opened with a short-lived ticket rather than the access token,
+// so a stream that drops after its ticket expired reconnects with a new one.
+export const subscribeOrderEvents = (onEvent: (event: any) => void, onClosed: () => void) => {
+  let source: EventSource | null = null;
+  let stopped = false;
+
+  const open = async () => {
+    let ticket: string;
+    try {
+      ticket = (await axios.post(`${API_BASE}events/ticket/`)).data.ticket;
+    } catch {
+      if (!stopped) onClosed();
+      return;
+    }
+    if (stopped) return;
+    let opened = false;
+    const current = new EventSource(`${API_BASE}events/?ticket=${encodeURIComponent(ticket)}`);
+    source = current;
+    current.onopen = () => {
+      opened = true;
+      onEvent({ event: 'stream_opened' });
+    };
+    current.onmessage = (message) => onEvent(JSON.parse(message.data));
+    current.onerror = () => {
+      if (current.readyState !== EventSource.CLOSED || stopped) return;
+      if (opened) open();
+      else onClosed();
+    };
+  };
+
+  open();
+  return () => {
+    stopped = true;
+    source?.close();
+  };
+};
+
 export const createOrder = async (orderData: FormData) => {
   const res = await axios.post(`${API_BASE}orders/`, orderData, {
     headers: { 'Content-Type': 'multipart/form-data' }
@@ -49,6 +128,46 @@ export const createOrder = async (orderData: FormData) => {
   return res.data;
 };
 
+// Chunked, resumable upload of an order design file; resolves to the upload id
+// to send as `step_file_upload` / `d2_draft_design_upload` when creating the order.
+const UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024;
+
+const sha256Hex = async (file: File) => {
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest)).map((b) => b.toString(16).padStart(2, '0')).join('');
+};
+
+export const uploadOrderFile = async (
+  file: File,
+  kind: 'step_file' | 'd2_draft_design',
+  onProgress?: (sent: number, total: number) => void,
+) => {
+  const sha256 = await sha256Hex(file);
+  const init = await axios.post(`${API_BASE}uploads/`, { kind, filename: file.name, size: file.size, sha256 });
+  const id: string = init.data.id;
+  // This account already stored this content (hash pre-check): nothing to transfer
+  if (init.data.status === 'complete') return id;
+  let offset: number = init.data.offset;
+  let retries = 0;
+  while (offset < file.size) {
+    try {
+      const res = await axios.put(`${API_BASE}uploads/${id}/`, file.slice(offset, offset + UPLOAD_CHUNK_SIZE), {
+        headers: { 'Content-Type': 'application/octet-stream', 'Upload-Offset': String(offset) },
+      });
+      offset = res.data.offset;
+      retries = 0;
+    } catch (err: any) {
+      // Resume from whatever the server actually has
+      if (++retries > 3) throw err;
+      const status = await axios.get(`${API_BASE}uploads/${id}/`);
+      offset = status.data.offset;
+    }
+    onProgress?.(offset, file.size);
+  }
+  await axios.post(`${API_BASE}uploads/${id}/finalize/`, { sha256 });
+  return id;
+};
+
 export const updateOrder = async (id: number, data: any) => {
   const res = await axios.patch(`${API_BASE}orders/${id}/`, data);
   return res.data;
@@ -100,6 +219,32 @@ export const confirmOrderAtPrice = async (orderId: number) => {
   return res.data;
 };
 
+// Ranked full-text search over part IDs, descriptions, materials and chat messages
+export const searchOrders = async (q: string, params?: { page?: number; page_size?: number; status?: string }) => {
+  const res = await axios.get(`${API_BASE}orders/search/`, { params: { ...params, q } });
+  return res.data;
+};
+
+// Streams a CSV/XLSX export and saves it under the server's filename
+export const exportOrders = async (
+  dataset: 'orders' | 'offers',
+  filetype: 'csv' | 'xlsx' = 'csv',
+  params?: Record<string, string>
+) => {
+  const path = dataset === 'offers' ? 'export_offers' : 'export';
+  const res = await axios.get(`${API_BASE}orders/${path}/`, {
+    params: { ...params, filetype },
+    responseType: 'blob',
+  });
+  const match = /filename="([^"]+)"/.exec(res.headers['content-disposition'] || '');
+  const url = URL.createObjectURL(res.data);
+  const link = document.createElement('a');
+  link.href = url;
+  link.download = match ? match[1] : `${dataset}.${filetype}`;
+  link.click();
+  URL.revokeObjectURL(url);
+};
+
 // Suppliers and Machines
 export const getSuppliers = async () => {
   const res = await axios.get(`${API_BASE}suppliers/`);
@@ -208,8 +353,12 @@ axios.interceptors.response.use(
   }
 );
 
-export const getOrderMessages = async (orderId: number) => {
-  const res = await axios.get(`${API_BASE}orders/${orderId}/messages/`);
+export const getOrderMessages = async (orderId: number, params?: {
+  after_id?: number;
+  before_id?: number;
+  limit?: number;
+}) => {
+  const res = await axios.get(`${API_BASE}orders/${orderId}/messages/`, { params });
   return res.data;
 };
 